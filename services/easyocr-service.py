@@ -10,14 +10,19 @@ import base64
 from io import BytesIO
 from PIL import Image
 
-try:
-    import easyocr
-    EASYOCR_AVAILABLE = True
-    # Initialize EasyOCR reader once (supports Tamil and English)
-    reader = easyocr.Reader(['ta', 'en'], gpu=False)  # 'ta' is Tamil language code
-except ImportError:
-    EASYOCR_AVAILABLE = False
-    reader = None
+import importlib.util
+
+# Importing easyocr loads torch, so defer it until the first image is processed
+EASYOCR_AVAILABLE = importlib.util.find_spec("easyocr") is not None
+reader = None
+
+def get_reader():
+    """Initialize the EasyOCR reader on first use (supports Tamil and English)"""
+    global reader
+    if reader is None:
+        import easyocr
+        reader = easyocr.Reader(['ta', 'en'], gpu=False)  # 'ta' is Tamil language code
+    return reader
 
 def extract_text_from_image(image_path):
     """Extract text from image using EasyOCR"""
@@ -26,20 +31,23 @@ def extract_text_from_image(image_path):
     
     try:
         # Read text from image
-        results = reader.readtext(image_path)
+        results = get_reader().readtext(image_path)
         
         # Combine all detected text
         text_parts = []
+        lines = []
         for (bbox, text, confidence) in results:
             if confidence > 0.3:  # Filter low confidence results
                 text_parts.append(text)
+                lines.append({"text": text, "confidence": round(float(confidence), 3)})
         
         full_text = '\n'.join(text_parts)
         
         return {
             "success": True,
             "text": full_text,
-            "confidence": sum([conf for _, _, conf in results]) / len(results) if results else 0
+            "confidence": sum([conf for _, _, conf in results]) / len(results) if results else 0,
+            "lines": lines
         }
     except Exception as e:
         return {
@@ -4,15 +4,33 @@ Python FastAPI Server for PDF Upload and Extraction
 Handles PDF uploads, text extraction, and returns results to frontend
 """
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+import time
+
+_process_started = time.time()
+
+import asyncio
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 import uvicorn
 import json
-import tempfile
+from io import BytesIO
 import os
-from typing import Optional
+import threading
+import queue
+import tempfile
+import uuid
+import hmac
+from typing import List, Optional
 import sys
+import importlib.util
 
 # Import our PDF extraction functions
 try:
@@ -20,11 +38,9 @@ try:
     PYMUPDF_AVAILABLE = True
 except ImportError:
     PYMUPDF_AVAILABLE = False
-    try:
-        import pdfplumber
-        PDFPLUMBER_AVAILABLE = True
-    except ImportError:
-        PDFPLUMBER_AVAILABLE = False
+
+# pdfplumber is only a fallback; import it when it is first used
+PDFPLUMBER_AVAILABLE = importlib.util.find_spec("pdfplumber") is not None
 
 # Import OCR functions from pdf-extractor
 import sys
@@ -39,6 +55,8 @@ try:
     spec = importlib.util.spec_from_file_location("pdf_extractor", pdf_extractor_path)
     if spec and spec.loader:
         pdf_extractor = importlib.util.module_from_spec(spec)
+        # Register the module so OCR pool workers can resolve its functions
+        sys.modules["pdf_extractor"] = pdf_extractor
         spec.loader.exec_module(pdf_extractor)
         ocr_functions = pdf_extractor
         ocr_available = True
@@ -46,7 +64,552 @@ except Exception as e:
     print(f"Warning: Could not import OCR functions: {e}")
     pass
 
-app = FastAPI(title="PDF Extraction API", version="1.0.0")
+# ---------------------------------------------------------------------------
+# Extraction process pool and admission control
+#
+# PyMuPDF rendering and OCR inference are CPU-bound and would block the event
+# loop, so /extract, /extract-batch, /extract/stream and /jobs hand them to a
+# process pool. Workers
+# load the OCR_PRELOAD engines once and keep them, and publish their engine
+# and image memo state for /health (see worker_engine_status). At most
+# EXTRACT_PROCESSES + EXTRACT_QUEUE_DEPTH extractions are admitted at a time;
+# beyond that requests fail fast with 503 and Retry-After instead of queueing
+# until everyone times out.
+#
+#   EXTRACT_PROCESSES    extraction worker processes (default: min(2, CPUs);
+#                        0 runs extractions in threads instead)
+#   EXTRACT_QUEUE_DEPTH  extractions allowed to wait for a worker (default 8)
+# ---------------------------------------------------------------------------
+
+EXTRACT_PROCESSES = int(os.environ.get("EXTRACT_PROCESSES", str(min(2, os.cpu_count() or 1))))
+EXTRACT_QUEUE_DEPTH = int(os.environ.get("EXTRACT_QUEUE_DEPTH", "8"))
+
+extract_pool = None
+# Manager dict the pool's workers publish their state to, keyed by pid
+worker_status = None
+extract_in_flight = 0
+# Jobs reserve slots from their worker threads, so the count is locked
+admission_lock = threading.Lock()
+# Moving average of extraction time, used to suggest Retry-After
+extract_seconds_avg = None
+
+def uses_extract_pool():
+    """Whether extractions run in worker processes rather than threads"""
+    return EXTRACT_PROCESSES > 0 and "fork" in multiprocessing.get_all_start_methods()
+
+def get_extract_pool():
+    """Return the extraction process pool, or None to run in threads"""
+    global extract_pool, worker_status
+    if not uses_extract_pool():
+        return None
+    if extract_pool is None:
+        if worker_status is None:
+            worker_status = get_record_manager().dict()
+        else:
+            # The previous pool's workers are gone
+            worker_status.clear()
+        # fork so workers inherit the already-loaded pdf_extractor module
+        extract_pool = ProcessPoolExecutor(
+            max_workers=EXTRACT_PROCESSES,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=ocr_functions.init_extraction_worker,
+            initargs=(worker_status,)
+        )
+    return extract_pool
+
+# Seconds a warmup waits for every extraction worker to be free to take it
+WARMUP_BARRIER_SECONDS = 30.0
+
+def warm_extraction_workers(names):
+    """Load OCR engines in every extraction worker; returns {pid: engine status}"""
+    pool = get_extract_pool()
+    barrier = get_record_manager().Barrier(EXTRACT_PROCESSES)
+    futures = [
+        pool.submit(ocr_functions.warmup_in_worker, names, barrier, WARMUP_BARRIER_SECONDS)
+        for _ in range(EXTRACT_PROCESSES)
+    ]
+    return dict(future.result() for future in futures)
+
+def worker_engine_status():
+    """OCR engine and image memo state of the extraction workers
+
+    Returns (engines, image_memo) shaped like engine_status() and
+    image_memo_stats() of one process, with counters summed over the workers
+    and "loaded_workers" counting the workers that hold each engine. Before
+    the pool has started, the server process's own (unloaded) state.
+    """
+    boards = list(worker_status.values()) if worker_status is not None else []
+    if not boards:
+        boards = [{"engines": ocr_functions.engine_status(), "image_memo": ocr_functions.image_memo_stats()}]
+    engines = {}
+    image_memo = None
+    for board in boards:
+        for name, status in board["engines"].items():
+            merged = engines.setdefault(name, dict(status, loaded=False, loaded_workers=0, loads=0, unloads=0,
+                                                   load_seconds=None, idle_seconds=None, error=None))
+            merged["loaded"] = merged["loaded"] or status["loaded"]
+            merged["loaded_workers"] += int(status["loaded"])
+            merged["loads"] += status["loads"]
+            merged["unloads"] += status["unloads"]
+            if status["load_seconds"] is not None:
+                merged["load_seconds"] = max(merged["load_seconds"] or 0.0, status["load_seconds"])
+            if status["idle_seconds"] is not None:
+                merged["idle_seconds"] = min(merged["idle_seconds"] or status["idle_seconds"], status["idle_seconds"])
+            merged["error"] = merged["error"] or status["error"]
+        memo = board["image_memo"]
+        if image_memo is None:
+            image_memo = dict(memo)
+        else:
+            for counter in ("hits", "misses", "evictions", "entries"):
+                image_memo[counter] += memo[counter]
+    return engines, image_memo
+
+def extraction_capacity():
+    return max(EXTRACT_PROCESSES, 1) + EXTRACT_QUEUE_DEPTH
+
+def retry_after_seconds():
+    """Estimate when a slot will free up from the average extraction time"""
+    workers = max(EXTRACT_PROCESSES, 1)
+    waiting = max(extract_in_flight - workers + 1, 1)
+    return max(1, math.ceil((extract_seconds_avg or 5.0) * waiting / workers))
+
+def try_reserve_slots(slots=1):
+    """Reserve extraction slots if there is room; returns True on success"""
+    global extract_in_flight
+    with admission_lock:
+        if extract_in_flight + slots > extraction_capacity():
+            return False
+        extract_in_flight += slots
+        return True
+
+def release_slots(slots=1):
+    global extract_in_flight
+    with admission_lock:
+        extract_in_flight -= slots
+
+def busy_error():
+    return HTTPException(
+        status_code=503,
+        detail="Server is busy extracting other PDFs, try again later",
+        headers={"Retry-After": str(retry_after_seconds())}
+    )
+
+@asynccontextmanager
+async def admission(slots=1):
+    """Reserve extraction slots for a request, or reject it with 503"""
+    if not try_reserve_slots(slots):
+        raise busy_error()
+    try:
+        yield
+    finally:
+        release_slots(slots)
+
+async def run_extraction(pdf_source, use_ocr=False, ocr_workers=None, use_cache=True,
+                         normalize=False, split_languages=False, profile_id=None):
+    """Run extract_text_from_pdf without blocking the event loop
+
+    pdf_source is a path or the PDF bytes; small uploads are passed to the
+    worker process as bytes, spooled large ones (see spool_upload) by path.
+
+    Cache lookups happen here in the server process; only misses are sent to
+    the extraction pool. Normalization is applied afterwards, to the raw
+    result from either. With a profile_id the extraction bypasses the cache
+    and is profiled (see pdf_extractor.extract_text_profiled).
+    """
+    if not (ocr_available and ocr_functions):
+        return await run_in_threadpool(extract_text_from_pdf, pdf_source, use_ocr, ocr_workers, use_cache)
+    result = await _run_extraction(pdf_source, use_ocr, ocr_workers, use_cache, profile_id)
+    if normalize and result.get("success"):
+        await run_in_threadpool(ocr_functions.normalize_result, result, split_languages)
+    return result
+
+async def _run_extraction(pdf_source, use_ocr, ocr_workers, use_cache, profile_id=None):
+    """run_extraction without normalization"""
+    global extract_pool, extract_seconds_avg
+    
+    cache_key = None
+    if use_cache and not profile_id:
+        cache_key, cached = await run_in_threadpool(ocr_functions.cache_lookup, pdf_source, use_ocr)
+        if cached is not None:
+            ocr_functions.count_extraction(cached)
+            return cached
+    
+    started = time.perf_counter()
+    pool = get_extract_pool()
+    if pool is None and profile_id:
+        result = await run_in_threadpool(ocr_functions.extract_text_profiled, pdf_source, use_ocr, profile_id)
+    elif pool is None:
+        result = await run_in_threadpool(ocr_functions.extract_text_from_pdf, pdf_source, use_ocr, ocr_workers, False)
+    else:
+        try:
+            result, worker_metrics = await asyncio.get_running_loop().run_in_executor(
+                pool, ocr_functions.extract_text_in_worker, pdf_source, use_ocr, ocr_workers, False, profile_id
+            )
+            ocr_functions.merge_metrics(worker_metrics)
+        except BrokenProcessPool:
+            # A worker died (usually out of memory); start a fresh pool next time
+            extract_pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+    
+    seconds = time.perf_counter() - started
+    if not profile_id:
+        # Profiled runs are slower and in-process; keep them out of the estimate
+        extract_seconds_avg = seconds if extract_seconds_avg is None else 0.8 * extract_seconds_avg + 0.2 * seconds
+    if cache_key:
+        await run_in_threadpool(ocr_functions.cache_put, cache_key, result)
+    return result
+
+async def run_answer_key(pdf_source, use_cache=True):
+    """Run extract_answer_key in the extraction pool (see run_extraction)"""
+    global extract_pool
+    pool = get_extract_pool()
+    if pool is None:
+        return await run_in_threadpool(ocr_functions.extract_answer_key, pdf_source, use_cache)
+    try:
+        result, worker_metrics = await asyncio.get_running_loop().run_in_executor(
+            pool, ocr_functions.extract_answer_key_in_worker, pdf_source, use_cache
+        )
+    except BrokenProcessPool:
+        extract_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    ocr_functions.merge_metrics(worker_metrics)
+    return result
+
+# ---------------------------------------------------------------------------
+# Record streams
+#
+# /extract/stream and /jobs need every page record as it is produced, not one
+# result at the end, so iter_extract_records runs in an extraction worker and
+# puts its records on a multiprocessing manager queue that the server reads.
+# Each stream holds an admission slot until its worker is done, also when the
+# client goes away early. The same manager holds the workers' status board
+# and warmup barriers.
+# ---------------------------------------------------------------------------
+
+# How often a reader waiting for records checks whether its worker died
+STREAM_POLL_SECONDS = 1.0
+
+record_manager = None
+record_manager_lock = threading.Lock()
+# Stands in for the process pool when EXTRACT_PROCESSES=0; admission bounds it
+stream_threads = ThreadPoolExecutor(max_workers=extraction_capacity(), thread_name_prefix="extract-stream")
+
+def get_record_manager():
+    global record_manager
+    with record_manager_lock:
+        if record_manager is None:
+            record_manager = multiprocessing.get_context("fork").Manager()
+        return record_manager
+
+def start_record_stream(pdf_source, on_done=None, **options):
+    """Run iter_extract_records(pdf_source, **options) in the extraction pool
+
+    The caller must already hold an admission slot; it is released (and
+    on_done called) when the worker finishes. Returns (record_queue, future)
+    for iter_stream_records.
+    """
+    pool = get_extract_pool()
+    try:
+        if pool is None:
+            record_queue = queue.Queue()
+            future = stream_threads.submit(ocr_functions.stream_records_in_worker, record_queue, pdf_source, **options)
+        else:
+            record_queue = get_record_manager().Queue()
+            future = pool.submit(ocr_functions.stream_records_in_worker, record_queue, pdf_source, **options)
+    except BaseException:
+        release_slots()
+        if on_done is not None:
+            on_done()
+        raise
+    
+    def finished(future):
+        global extract_pool
+        try:
+            if not future.cancelled() and future.exception() is None:
+                # Drained in the worker (or, with threads, from this process): put them back
+                ocr_functions.merge_metrics(future.result())
+            elif not future.cancelled() and isinstance(future.exception(), BrokenProcessPool) and extract_pool is pool:
+                # A worker died (usually out of memory); start a fresh pool next time
+                extract_pool = None
+                pool.shutdown(wait=False, cancel_futures=True)
+        finally:
+            release_slots()
+            if on_done is not None:
+                on_done()
+    
+    future.add_done_callback(finished)
+    return record_queue, future
+
+def iter_stream_records(record_queue, future):
+    """Yield the records of a start_record_stream stream until it ends"""
+    while True:
+        try:
+            record = record_queue.get(timeout=STREAM_POLL_SECONDS)
+        except queue.Empty:
+            if not future.done():
+                continue
+            # The worker ended without its end marker
+            error = None if future.cancelled() else future.exception()
+            yield {"type": "error", "error": f"Extraction worker failed: {error or 'cancelled'}"}
+            return
+        if record is None:
+            return
+        yield record
+
+# ---------------------------------------------------------------------------
+# Upload spooling
+#
+# Uploads are copied in chunks rather than read whole. Small ones stay in
+# memory and are extracted from bytes; once an upload passes
+# UPLOAD_MEMORY_THRESHOLD it is spooled to a temp file that the extraction
+# worker opens by path, so a large scan is never held in (or pickled between)
+# process memory.
+#
+#   UPLOAD_MEMORY_THRESHOLD  bytes kept in memory per upload (default: 16 MB)
+#   PDF_MAX_UPLOAD_BYTES     larger uploads get 413 (default: 512 MB, 0 = unlimited)
+# ---------------------------------------------------------------------------
+
+UPLOAD_MEMORY_THRESHOLD = int(os.environ.get("UPLOAD_MEMORY_THRESHOLD", str(16 * 1024 * 1024)))
+PDF_MAX_UPLOAD_BYTES = int(os.environ.get("PDF_MAX_UPLOAD_BYTES", str(512 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+async def spool_upload(upload):
+    """Read an upload in chunks; returns (pdf_source, size)
+
+    pdf_source is the bytes for small uploads, otherwise the path of a temp
+    file that the caller must remove with discard_upload().
+    """
+    started = time.perf_counter()
+    buffer = BytesIO()
+    spool = None
+    size = 0
+    try:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if PDF_MAX_UPLOAD_BYTES and size > PDF_MAX_UPLOAD_BYTES:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"{upload.filename} is larger than {PDF_MAX_UPLOAD_BYTES} bytes (PDF_MAX_UPLOAD_BYTES)"
+                )
+            if spool is None and size > UPLOAD_MEMORY_THRESHOLD:
+                spool = tempfile.NamedTemporaryFile(prefix="pdf-upload-", suffix=".pdf", delete=False)
+                spool.write(buffer.getbuffer())
+                buffer = None
+            if spool is None:
+                buffer.write(chunk)
+            else:
+                spool.write(chunk)
+    except BaseException:
+        if spool is not None:
+            spool.close()
+            discard_upload(spool.name)
+        raise
+    record_seconds("pdf_upload_read_seconds", time.perf_counter() - started)
+    if spool is None:
+        return buffer.getvalue(), size
+    spool.close()
+    return spool.name, size
+
+def discard_upload(pdf_source):
+    """Remove a spooled upload's temp file (no-op for in-memory uploads)"""
+    if isinstance(pdf_source, str):
+        try:
+            os.unlink(pdf_source)
+        except OSError:
+            pass
+
+def limit_status(result):
+    """HTTP status for a failed extraction: 413 when a per-request limit was hit"""
+    return 413 if result.get("limit_exceeded") else 500
+
+# ---------------------------------------------------------------------------
+# Asynchronous extraction jobs
+#
+# POST /jobs spools the uploads (see spool_upload) and queues a job; a fixed set
+# of worker threads takes jobs in FIFO order. Each file waits for an admission
+# slot and is extracted in the extraction pool (see start_record_stream). Jobs live in this process's memory, so
+# run a single uvicorn worker (as the Procfile does) when using this API.
+#
+#   JOB_WORKERS      jobs extracted at the same time (default 1)
+#   JOB_QUEUE_DEPTH  queued jobs accepted before POST /jobs returns 503 (default 20)
+#   JOB_RESULT_TTL   seconds a finished job is kept for GET /jobs/{id} (default 3600)
+# ---------------------------------------------------------------------------
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "1"))
+JOB_QUEUE_DEPTH = int(os.environ.get("JOB_QUEUE_DEPTH", "20"))
+JOB_RESULT_TTL = float(os.environ.get("JOB_RESULT_TTL", "3600"))
+
+# How often a job waiting for an extraction slot checks again
+JOB_SLOT_POLL_SECONDS = 0.5
+
+jobs = {}
+jobs_lock = threading.Lock()
+job_queue = queue.Queue(maxsize=JOB_QUEUE_DEPTH)
+job_threads = []
+
+def start_job_workers():
+    for index in range(JOB_WORKERS):
+        thread = threading.Thread(target=job_worker, name=f"extract-job-{index}", daemon=True)
+        thread.start()
+        job_threads.append(thread)
+
+def stop_job_workers():
+    for _ in job_threads:
+        try:
+            job_queue.put_nowait(None)
+        except queue.Full:
+            pass
+    job_threads.clear()
+
+def purge_finished_jobs():
+    """Forget finished jobs older than JOB_RESULT_TTL"""
+    cutoff = time.time() - JOB_RESULT_TTL
+    with jobs_lock:
+        for job_id in [job_id for job_id, job in jobs.items() if (job.get("finished_at") or time.time()) < cutoff]:
+            del jobs[job_id]
+
+def run_job(job):
+    """Extract every file of a job, updating its progress page by page"""
+    with jobs_lock:
+        job["status"] = "running"
+        job["started_at"] = time.time()
+    
+    # Normalization runs once on the joined text, not on every page record
+    options = dict(job["options"])
+    normalize = options.pop("normalize", False)
+    split_languages = options.pop("split_languages", False)
+    
+    results = []
+    pages_done = 0
+    for entry in job["files"]:
+        started = time.perf_counter()
+        result = {"file_name": entry["file_name"], "file_size": entry["file_size"], "success": False}
+        page_texts = []
+        try:
+            # Jobs wait for an extraction slot instead of failing with 503
+            while not try_reserve_slots():
+                time.sleep(JOB_SLOT_POLL_SECONDS)
+            record_queue, future = start_record_stream(entry["content"], **options)
+            for record in iter_stream_records(record_queue, future):
+                if record["type"] == "page":
+                    page_texts.append(record["text"])
+                    with jobs_lock:
+                        job["pages_completed"] = pages_done + len(page_texts)
+                elif record["type"] == "summary":
+                    record.pop("type")
+                    result.update(record)
+                    result.setdefault("text", '\n'.join(text for text in page_texts if text))
+                    if normalize:
+                        ocr_functions.normalize_result(result, split_languages)
+                else:
+                    result["error"] = record.get("error", "Extraction failed")
+        except Exception as e:
+            result["error"] = f"Error processing PDF: {str(e)}"
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        results.append(result)
+        
+        # Cache hits and failures report no pages; count the whole file as done
+        pages_done += entry["pages"] if entry["pages"] is not None else len(page_texts)
+        with jobs_lock:
+            job["pages_completed"] = pages_done
+    
+    with jobs_lock:
+        job["results"] = results
+        job["status"] = "completed" if any(r["success"] for r in results) else "failed"
+        job["finished_at"] = time.time()
+
+def job_worker():
+    while True:
+        job_id = job_queue.get()
+        if job_id is None:
+            return
+        job = jobs.get(job_id)
+        if job is None:
+            continue
+        try:
+            run_job(job)
+        except Exception as e:
+            with jobs_lock:
+                job["status"] = "failed"
+                job["error"] = str(e)
+                job["finished_at"] = time.time()
+        finally:
+            # Results are kept; the uploaded PDFs are not needed any more
+            for entry in job["files"]:
+                discard_upload(entry.pop("content", None))
+
+def job_view(job):
+    """Public status of a job, with ETA from the pages done so far"""
+    now = time.time()
+    view = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "files": [f["file_name"] for f in job["files"]],
+        "pages_completed": job["pages_completed"],
+        "total_pages": job["total_pages"],
+        "created_at": job["created_at"],
+        "eta_seconds": None
+    }
+    if job["status"] == "queued":
+        view["queue_position"] = 1 + sum(
+            1 for other in jobs.values()
+            if other["status"] == "queued" and other["created_at"] < job["created_at"]
+        )
+    if job["started_at"]:
+        elapsed = (job.get("finished_at") or now) - job["started_at"]
+        view["elapsed_seconds"] = round(elapsed, 1)
+        if job["status"] == "running" and job["pages_completed"] and job["total_pages"]:
+            remaining = max(job["total_pages"] - job["pages_completed"], 0)
+            view["eta_seconds"] = round(elapsed / job["pages_completed"] * remaining, 1)
+    if job["total_pages"]:
+        view["progress"] = round(100 * min(job["pages_completed"], job["total_pages"]) / job["total_pages"], 1)
+    if job["status"] in ("completed", "failed"):
+        view["eta_seconds"] = 0
+        view["results"] = job.get("results", [])
+        if job.get("error"):
+            view["error"] = job["error"]
+    return view
+
+# Seconds from process start until the app was ready to serve (set in lifespan)
+startup_seconds = None
+
+@asynccontextmanager
+async def lifespan(app):
+    """Apply the OCR preload policy, then report the cold-start time
+
+    OCR engines are loaded lazily on first use. OCR_PRELOAD lists engines to
+    load at boot, in the extraction workers (started here for it) or, with
+    EXTRACT_PROCESSES=0, in this process; with OCR_PRELOAD_BLOCKING=false
+    (default) that happens in a background thread so the server starts
+    accepting requests immediately.
+    """
+    global startup_seconds
+    names = ocr_functions.parse_engine_names(os.environ.get("OCR_PRELOAD", "")) if ocr_available and ocr_functions else []
+    if names:
+        blocking = os.environ.get("OCR_PRELOAD_BLOCKING", "false").lower() == "true"
+        if uses_extract_pool():
+            preload = lambda: warm_extraction_workers(names)
+        else:
+            preload = ocr_functions.preload_engines
+        if blocking:
+            preload()
+        else:
+            threading.Thread(target=preload, name="ocr-preload", daemon=True).start()
+    start_job_workers()
+    startup_seconds = round(time.time() - _process_started, 3)
+    yield
+    stop_job_workers()
+    if extract_pool is not None:
+        extract_pool.shutdown(wait=False, cancel_futures=True)
+    if record_manager is not None:
+        record_manager.shutdown()
+
+app = FastAPI(title="PDF Extraction API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -63,10 +626,65 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def extract_text_with_pymupdf(pdf_path):
+# ---------------------------------------------------------------------------
+# Metrics
+#
+# Stage timings and counters are recorded by pdf_extractor (see its Metrics
+# section); extraction workers hand theirs back with each result. This
+# process adds the upload read and response serialization times and the
+# requests in flight, and /metrics exports everything for Prometheus.
+# ---------------------------------------------------------------------------
+
+requests_in_flight = 0
+
+def record_seconds(name, seconds):
+    if ocr_functions:
+        ocr_functions.observe_metric(name, seconds)
+
+def json_response(content, status_code=200):
+    """JSONResponse, timing its serialization"""
+    started = time.perf_counter()
+    response = JSONResponse(status_code=status_code, content=content)
+    record_seconds("pdf_json_serialize_seconds", time.perf_counter() - started)
+    return response
+
+@app.middleware("http")
+async def count_in_flight(request: Request, call_next):
+    global requests_in_flight
+    if request.url.path == "/metrics":
+        return await call_next(request)
+    requests_in_flight += 1
+    try:
+        return await call_next(request)
+    finally:
+        requests_in_flight -= 1
+
+# ---------------------------------------------------------------------------
+# Profiling
+#
+# `profile=true` on /extract runs that one request under cProfile (see
+# pdf_extractor.extract_text_profiled) and returns a profile_id; the stored
+# profile is fetched from /profiles/{profile_id}. Both need the
+# X-Admin-Token header to match PROFILE_ADMIN_TOKEN, and profiling is off
+# while that is unset.
+#
+#   PROFILE_ADMIN_TOKEN  token that allows profiling (default: unset)
+# ---------------------------------------------------------------------------
+
+PROFILE_ADMIN_TOKEN = os.environ.get("PROFILE_ADMIN_TOKEN", "")
+
+def require_admin(token):
+    if not (ocr_available and ocr_functions):
+        raise HTTPException(status_code=503, detail="Profiling not available")
+    if not PROFILE_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Profiling is disabled (PROFILE_ADMIN_TOKEN is not set)")
+    if not token or not hmac.compare_digest(token.encode("utf-8"), PROFILE_ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+def extract_text_with_pymupdf(pdf_source):
     """Extract text using PyMuPDF (fitz) - fastest and best for Unicode"""
     try:
-        doc = fitz.open(pdf_path)
+        doc = fitz.open(pdf_source) if isinstance(pdf_source, str) else fitz.open(stream=pdf_source, filetype="pdf")
         text_parts = []
         
         for page_num in range(len(doc)):
@@ -75,13 +693,14 @@ def extract_text_with_pymupdf(pdf_path):
             if text:
                 text_parts.append(text)
         
+        page_count = len(doc)
         doc.close()
         full_text = '\n'.join(text_parts)
         
         return {
             "success": True,
             "text": full_text,
-            "pages": len(doc),
+            "pages": page_count,
             "method": "pymupdf"
         }
     except Exception as e:
@@ -91,11 +710,13 @@ def extract_text_with_pymupdf(pdf_path):
             "text": ""
         }
 
-def extract_text_with_pdfplumber(pdf_path):
+def extract_text_with_pdfplumber(pdf_source):
     """Extract text using pdfplumber - good for structured content"""
     try:
+        import pdfplumber
         text_parts = []
-        with pdfplumber.open(pdf_path) as pdf:
+        with pdfplumber.open(pdf_source if isinstance(pdf_source, str) else BytesIO(pdf_source)) as pdf:
+            page_count = len(pdf.pages)
             for page in pdf.pages:
                 text = page.extract_text()
                 if text:
@@ -106,7 +727,7 @@ def extract_text_with_pdfplumber(pdf_path):
         return {
             "success": True,
             "text": full_text,
-            "pages": len(pdf.pages),
+            "pages": page_count,
             "method": "pdfplumber"
         }
     except Exception as e:
@@ -116,30 +737,33 @@ def extract_text_with_pdfplumber(pdf_path):
             "text": ""
         }
 
-def extract_text_from_pdf(pdf_path, use_ocr=False):
-    """Extract text from PDF using best available method, with OCR fallback for Tamil"""
-    if not os.path.exists(pdf_path):
+def extract_text_from_pdf(pdf_source, use_ocr=False, ocr_workers=None, use_cache=True):
+    """Extract text from PDF using best available method, with OCR fallback for Tamil
+
+    pdf_source is a path or the PDF bytes.
+    """
+    if isinstance(pdf_source, str) and not os.path.exists(pdf_source):
         return {
             "success": False,
-            "error": f"PDF file not found: {pdf_path}",
+            "error": f"PDF file not found: {pdf_source}",
             "text": ""
         }
     
     # Use OCR-enabled extraction if available
     if ocr_available and ocr_functions:
-        return ocr_functions.extract_text_from_pdf(pdf_path, use_ocr=use_ocr)
+        return ocr_functions.extract_text_from_pdf(pdf_source, use_ocr=use_ocr, ocr_workers=ocr_workers, use_cache=use_cache)
     
     # Fallback to basic extraction
     if PYMUPDF_AVAILABLE:
-        result = extract_text_with_pymupdf(pdf_path)
+        result = extract_text_with_pymupdf(pdf_source)
         if result["success"]:
             return result
         if PDFPLUMBER_AVAILABLE:
-            return extract_text_with_pdfplumber(pdf_path)
+            return extract_text_with_pdfplumber(pdf_source)
         return result
     
     if PDFPLUMBER_AVAILABLE:
-        return extract_text_with_pdfplumber(pdf_path)
+        return extract_text_with_pdfplumber(pdf_source)
     
     return {
         "success": False,
@@ -163,11 +787,16 @@ async def health():
         "tesseract": False,
         "easyocr": False
     }
+    engines = {}
+    cache = None
+    image_memo = None
     
     if ocr_available and ocr_functions:
         try:
             ocr_status["tesseract"] = ocr_functions.TESSERACT_AVAILABLE
             ocr_status["easyocr"] = ocr_functions.EASYOCR_AVAILABLE
+            engines, image_memo = worker_engine_status()
+            cache = ocr_functions.cache_stats()
         except:
             pass
     
@@ -177,152 +806,418 @@ async def health():
         "pymupdf_available": PYMUPDF_AVAILABLE,
         "pdfplumber_available": PDFPLUMBER_AVAILABLE,
         "ocr_available": ocr_available,
-        "ocr_methods": ocr_status
+        "ocr_methods": ocr_status,
+        "ocr_engines": engines,
+        "cache": cache,
+        "image_memo": image_memo,
+        "extraction": {
+            "processes": EXTRACT_PROCESSES,
+            "in_flight": extract_in_flight,
+            "capacity": extraction_capacity(),
+            "avg_seconds": round(extract_seconds_avg, 3) if extract_seconds_avg is not None else None
+        },
+        "startup_seconds": startup_seconds,
+        "uptime_seconds": round(time.time() - _process_started, 1)
+    }
+
+@app.get("/metrics")
+def metrics():
+    """Stage timing histograms and counters in the Prometheus text format"""
+    if not (ocr_available and ocr_functions):
+        raise HTTPException(status_code=503, detail="Metrics not available")
+    gauges = {
+        "pdf_requests_in_flight": ("HTTP requests being served", requests_in_flight),
+        "pdf_extractions_in_flight": ("Extractions admitted to the worker pool", extract_in_flight),
+        "pdf_jobs_queued": ("Extraction jobs waiting for a worker", job_queue.qsize())
+    }
+    return PlainTextResponse(ocr_functions.render_metrics(gauges), media_type="text/plain; version=0.0.4")
+
+@app.get("/profiles/{profile_id}")
+def get_profile(profile_id: str, x_admin_token: Optional[str] = Header(None)):
+    """A stored profile: per-page trace and the most expensive functions"""
+    require_admin(x_admin_token)
+    profile = ocr_functions.load_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+@app.get("/profiles/{profile_id}/pstats")
+def get_profile_pstats(profile_id: str, x_admin_token: Optional[str] = Header(None)):
+    """The raw cProfile data of a stored profile (open with pstats or snakeviz)"""
+    require_admin(x_admin_token)
+    path = ocr_functions.profile_path(profile_id, ".prof")
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
+@app.get("/cache")
+def cache_status():
+    """Extraction result cache hit/miss counters and size"""
+    if not (ocr_available and ocr_functions):
+        raise HTTPException(status_code=503, detail="Extraction cache not available")
+    return ocr_functions.cache_stats()
+
+@app.post("/warmup")
+def warmup(engines: str = Form("all")):
+    """
+    Load OCR engines ahead of the first OCR request, in every extraction worker
+    engines: Comma-separated engine names ("easyocr", "tesseract") or "all"
+    """
+    if not (ocr_available and ocr_functions):
+        raise HTTPException(status_code=503, detail="OCR functions not available")
+    
+    names = ocr_functions.parse_engine_names(engines)
+    if not names:
+        raise HTTPException(status_code=400, detail=f"Unknown OCR engines: {engines}")
+    
+    started = time.perf_counter()
+    if not uses_extract_pool():
+        return {
+            "success": True,
+            "engines": ocr_functions.warmup_engines(names),
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+    # Requests are served by the extraction workers, so that is where to load
+    workers = warm_extraction_workers(names)
+    return {
+        "success": True,
+        "engines": worker_engine_status()[0],
+        "workers": {str(pid): status for pid, status in workers.items()},
+        "seconds": round(time.perf_counter() - started, 3)
     }
 
 @app.post("/extract")
 async def extract_pdf(
     file: UploadFile = File(...),
     return_text: bool = Form(True),
-    use_ocr: bool = Form(False)
+    use_ocr: bool = Form(False),
+    ocr_workers: Optional[int] = Form(None),
+    use_cache: bool = Form(True),
+    normalize: bool = Form(False),
+    split_languages: bool = Form(False),
+    profile: bool = Form(False),
+    x_admin_token: Optional[str] = Header(None)
 ):
     """
     Extract text from uploaded PDF file
     use_ocr: If True, use OCR for better Tamil text extraction (slower but more accurate)
+    ocr_workers: Processes to OCR pages with in parallel (default OCR_WORKERS, 0 = all cores)
+    use_cache: If False, re-extract even if this PDF was seen before
+    normalize: Also return "normalized_text" (fixed Tamil glyphs, superscripts, math symbols)
+    split_languages: With normalize, also return "normalized_lines" as [{"english", "tamil"}]
+    profile: Profile this extraction (needs X-Admin-Token); the response carries "profile_id"
     """
     if file.content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="File must be a PDF")
+    profile_id = None
+    if profile:
+        require_admin(x_admin_token)
+        profile_id = ocr_functions.new_profile_id()
     
-    # Save uploaded file to temporary location
-    temp_file = None
+    pdf_source = None
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-            content = await file.read()
-            tmp.write(content)
-            temp_file = tmp.name
+        # Small uploads are extracted straight from memory, large ones from a spool file
+        pdf_source, file_size = await spool_upload(file)
         
         # Extract text (with OCR if requested or if Tamil detected)
-        result = extract_text_from_pdf(temp_file, use_ocr=use_ocr)
+        async with admission():
+            result = await run_extraction(pdf_source, use_ocr=use_ocr, ocr_workers=ocr_workers, use_cache=use_cache,
+                                          normalize=normalize, split_languages=split_languages, profile_id=profile_id)
         
         if not result["success"]:
-            raise HTTPException(status_code=500, detail=result.get("error", "PDF extraction failed"))
+            headers = {"X-Profile-Id": result["profile_id"]} if result.get("profile_id") else None
+            raise HTTPException(status_code=limit_status(result), detail=result.get("error", "PDF extraction failed"), headers=headers)
         
         response_data = {
             "success": True,
             "method": result["method"],
             "pages": result["pages"],
             "file_name": file.filename,
-            "file_size": len(content)
+            "file_size": file_size
         }
+        for key in ("cached", "ocr_pages", "ocr_workers", "page_details", "normalize_seconds", "profile_id"):
+            if key in result:
+                response_data[key] = result[key]
         
         if return_text:
             response_data["text"] = result["text"]
+            for key in ("normalized_text", "normalized_lines"):
+                if key in result:
+                    response_data[key] = result[key]
         
-        return JSONResponse(content=response_data)
+        return json_response(response_data)
     
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
-    
     finally:
-        # Clean up temp file
-        if temp_file and os.path.exists(temp_file):
-            try:
-                os.unlink(temp_file)
-            except:
-                pass
+        discard_upload(pdf_source)
 
-@app.post("/extract-batch")
-async def extract_batch_pdfs(
-    question_pdf: UploadFile = File(...),
-    answer_pdf: UploadFile = File(...),
-    use_ocr: bool = Form(False)
+@app.post("/extract/stream")
+async def extract_pdf_stream(
+    file: UploadFile = File(...),
+    use_ocr: bool = Form(False),
+    ocr_workers: Optional[int] = Form(None),
+    use_cache: bool = Form(True),
+    format: str = Form("ndjson"),
+    normalize: bool = Form(False),
+    split_languages: bool = Form(False)
 ):
     """
-    Extract text from both question and answer PDFs
-    Returns both extracted texts
-    use_ocr: If True, use OCR for better Tamil text extraction
+    Extract text from uploaded PDF file, streaming each page as it is ready
+    format: "ndjson" (one JSON object per line) or "sse" (Server-Sent Events)
+    
+    Emits {"type": "page", "page", "method", "reason", "text", "chars", "seconds"}
+    per page, then a {"type": "summary", ...} record (with "text" only on a cache hit).
+    With normalize, each page also carries "normalized_text".
     """
-    results = {
-        "question": None,
-        "answer": None
-    }
+    if file.content_type != "application/pdf":
+        raise HTTPException(status_code=400, detail="File must be a PDF")
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'sse'")
+    if not (ocr_available and ocr_functions):
+        raise HTTPException(status_code=503, detail="Streaming extraction not available")
+    
+    pdf_source, file_size = await spool_upload(file)
+    if not try_reserve_slots():
+        discard_upload(pdf_source)
+        raise busy_error()
+    # From here the slot and the upload belong to the worker (see start_record_stream)
+    record_queue, future = start_record_stream(
+        pdf_source, on_done=lambda: discard_upload(pdf_source),
+        use_ocr=use_ocr, ocr_workers=ocr_workers, use_cache=use_cache,
+        normalize=normalize, split_languages=split_languages
+    )
     
-    temp_files = []
+    def stream():
+        # Runs in Starlette's threadpool, so waiting for records does not block the event loop
+        try:
+            for record in iter_stream_records(record_queue, future):
+                if record.get("type") == "summary":
+                    record["file_name"] = file.filename
+                    record["file_size"] = file_size
+                line = json.dumps(record, ensure_ascii=False)
+                if format == "sse":
+                    yield f"event: {record.get('type', 'message')}\ndata: {line}\n\n"
+                else:
+                    yield line + "\n"
+        finally:
+            # Client gone before the worker started: don't run it at all
+            future.cancel()
     
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    # Disable proxy buffering so pages reach the client as they are produced
+    return StreamingResponse(stream(), media_type=media_type, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/jobs", status_code=202)
+async def create_job(
+    files: List[UploadFile] = File(...),
+    use_ocr: bool = Form(False),
+    ocr_workers: Optional[int] = Form(None),
+    use_cache: bool = Form(True),
+    normalize: bool = Form(False),
+    split_languages: bool = Form(False)
+):
+    """
+    Queue PDFs for extraction and return a job id immediately
+    Poll GET /jobs/{job_id} for progress, ETA and finally the results
+    """
+    if not (ocr_available and ocr_functions):
+        raise HTTPException(status_code=503, detail="Extraction jobs not available")
+    for upload in files:
+        if upload.content_type != "application/pdf":
+            raise HTTPException(status_code=400, detail=f"File must be a PDF: {upload.filename}")
+    if job_queue.full():
+        raise HTTPException(status_code=503, detail="Job queue is full, try again later", headers={"Retry-After": "30"})
+    
+    purge_finished_jobs()
+    job_id = uuid.uuid4().hex
+    job_files = []
     try:
-        # Process question PDF
-        if question_pdf.content_type != "application/pdf":
-            raise HTTPException(status_code=400, detail="Question file must be a PDF")
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-            content = await question_pdf.read()
-            tmp.write(content)
-            temp_file_q = tmp.name
-            temp_files.append(temp_file_q)
-        
-        # Extract with OCR if requested (better for Tamil)
-        q_result = extract_text_from_pdf(temp_file_q, use_ocr=use_ocr)
-        if q_result["success"]:
-            results["question"] = {
-                "success": True,
-                "text": q_result["text"],
-                "method": q_result["method"],
-                "pages": q_result["pages"],
-                "file_name": question_pdf.filename
-            }
-        else:
-            results["question"] = {
-                "success": False,
-                "error": q_result.get("error", "Extraction failed")
-            }
+        for upload in files:
+            pdf_source, file_size = await spool_upload(upload)
+            entry = {"content": pdf_source, "file_name": upload.filename, "file_size": file_size}
+            job_files.append(entry)
+            # Opening the PDF is CPU work; keep it off the event loop
+            entry["pages"] = await run_in_threadpool(ocr_functions.get_page_count, pdf_source)
+    except BaseException:
+        for entry in job_files:
+            discard_upload(entry["content"])
+        raise
+    
+    job = {
+        "id": job_id,
+        "status": "queued",
+        "files": job_files,
+        "options": {
+            "use_ocr": use_ocr,
+            "ocr_workers": ocr_workers,
+            "use_cache": use_cache,
+            "normalize": normalize,
+            "split_languages": split_languages
+        },
+        "pages_completed": 0,
+        "total_pages": sum(f["pages"] or 0 for f in job_files),
+        "created_at": time.time(),
+        "started_at": None
+    }
+    with jobs_lock:
+        jobs[job_id] = job
+    try:
+        job_queue.put_nowait(job_id)
+    except queue.Full:
+        with jobs_lock:
+            del jobs[job_id]
+        for entry in job_files:
+            discard_upload(entry["content"])
+        raise HTTPException(status_code=503, detail="Job queue is full, try again later", headers={"Retry-After": "30"})
+    
+    with jobs_lock:
+        return json_response(job_view(job), status_code=202)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status, pages completed, total pages, ETA and (when finished) results"""
+    with jobs_lock:
+        job = jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job_view(job)
+
+# Answer-key entries returned in place of the extracted text
+ANSWER_KEY_FIELDS = ("answers", "answer_count", "method", "sources", "pages", "ocr_cells",
+                     "unread", "unread_pages", "conflicts", "cached")
+
+async def extract_batch_file(upload, field, semaphore, use_ocr, ocr_workers, use_cache,
+                             normalize=False, split_languages=False, answer_key=False):
+    """Extract one file of a batch; failures are reported, never raised
+
+    With answer_key, the answer_pdf is read as a {question: option} map
+    (pdf_extractor.extract_answer_key) instead of as text; if no key can be
+    read it is extracted as text as usual, with "answer_key_error" set.
+    """
+    started = time.perf_counter()
+    entry = {"field": field, "file_name": upload.filename}
+    pdf_source = None
+    try:
+        if upload.content_type != "application/pdf":
+            raise ValueError("File must be a PDF")
         
-        # Process answer PDF
-        if answer_pdf.content_type != "application/pdf":
-            raise HTTPException(status_code=400, detail="Answer file must be a PDF")
+        pdf_source, entry["file_size"] = await spool_upload(upload)
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-            content = await answer_pdf.read()
-            tmp.write(content)
-            temp_file_a = tmp.name
-            temp_files.append(temp_file_a)
+        key_result = None
+        if answer_key and field == "answer_pdf" and ocr_available and ocr_functions:
+            async with semaphore:
+                key_result = await run_answer_key(pdf_source, use_cache=use_cache)
+            if not key_result["success"] and not key_result.get("limit_exceeded"):
+                entry["answer_key_error"] = key_result.get("error", "No answer key found")
+                key_result = None
         
-        # Extract with OCR if requested (better for Tamil)
-        a_result = extract_text_from_pdf(temp_file_a, use_ocr=use_ocr)
-        if a_result["success"]:
-            results["answer"] = {
-                "success": True,
-                "text": a_result["text"],
-                "method": a_result["method"],
-                "pages": a_result["pages"],
-                "file_name": answer_pdf.filename
-            }
+        if key_result is not None:
+            if key_result["success"]:
+                entry["success"] = True
+                entry.update((name, key_result[name]) for name in ANSWER_KEY_FIELDS if name in key_result)
+            else:
+                entry.update({"success": False, "error": key_result["error"], "limit_exceeded": True})
         else:
-            results["answer"] = {
-                "success": False,
-                "error": a_result.get("error", "Extraction failed")
-            }
-        
-        return JSONResponse(content=results)
-    
-    except HTTPException:
-        raise
+            async with semaphore:
+                result = await run_extraction(pdf_source, use_ocr=use_ocr, ocr_workers=ocr_workers, use_cache=use_cache,
+                                              normalize=normalize, split_languages=split_languages)
+            
+            if result["success"]:
+                entry.update({
+                    "success": True,
+                    "text": result["text"],
+                    "method": result["method"],
+                    "pages": result["pages"],
+                    "page_details": result.get("page_details"),
+                    "cached": result.get("cached", False)
+                })
+                for key in ("normalized_text", "normalized_lines", "normalize_seconds"):
+                    if key in result:
+                        entry[key] = result[key]
+            else:
+                entry.update({"success": False, "error": result.get("error", "Extraction failed")})
+                if result.get("limit_exceeded"):
+                    entry["limit_exceeded"] = True
+    except HTTPException as e:
+        entry.update({"success": False, "error": e.detail, "limit_exceeded": e.status_code == 413})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing PDFs: {str(e)}")
-    
+        entry.update({"success": False, "error": str(e) or e.__class__.__name__})
     finally:
-        # Clean up temp files
-        for temp_file in temp_files:
-            if os.path.exists(temp_file):
-                try:
-                    os.unlink(temp_file)
-                except:
-                    pass
+        discard_upload(pdf_source)
+    
+    entry["seconds"] = round(time.perf_counter() - started, 3)
+    return entry
+
+@app.post("/extract-batch")
+async def extract_batch_pdfs(
+    question_pdf: Optional[UploadFile] = File(None),
+    answer_pdf: Optional[UploadFile] = File(None),
+    files: List[UploadFile] = File([]),
+    use_ocr: bool = Form(False),
+    ocr_workers: Optional[int] = Form(None),
+    use_cache: bool = Form(True),
+    normalize: bool = Form(False),
+    split_languages: bool = Form(False),
+    answer_key: bool = Form(False)
+):
+    """
+    Extract text from several PDFs concurrently
+    Accepts question_pdf / answer_pdf and/or any number of `files`; every file
+    is returned in "files" with its own result and timing, and a failure in
+    one file does not affect the others. "question" and "answer" mirror the
+    matching entries for existing clients.
+    use_ocr: If True, use OCR for better Tamil text extraction
+    ocr_workers: Processes to OCR pages with in parallel (default OCR_WORKERS, 0 = all cores)
+    use_cache: If False, re-extract even if these PDFs were seen before
+    normalize / split_languages: As for /extract, per file
+    answer_key: If True, answer_pdf is returned as an "answers" map of
+                question number -> option (A-E) instead of its text
+    """
+    uploads = []
+    if question_pdf is not None:
+        uploads.append(("question_pdf", question_pdf))
+    if answer_pdf is not None:
+        uploads.append(("answer_pdf", answer_pdf))
+    uploads.extend(("files", upload) for upload in files)
+    if not uploads:
+        raise HTTPException(status_code=400, detail="No PDF files uploaded")
+    
+    started = time.perf_counter()
+    # The batch shares the extraction budget: it never runs more files at
+    # once than there are extraction workers, and reserves that many slots
+    slots = min(len(uploads), max(EXTRACT_PROCESSES, 1))
+    semaphore = asyncio.Semaphore(slots)
+    async with admission(slots):
+        entries = await asyncio.gather(*[
+            extract_batch_file(upload, field, semaphore, use_ocr, ocr_workers, use_cache, normalize, split_languages,
+                               answer_key)
+            for field, upload in uploads
+        ])
+    
+    results = {
+        "question": None,
+        "answer": None,
+        "files": list(entries),
+        "succeeded": sum(1 for entry in entries if entry["success"]),
+        "failed": sum(1 for entry in entries if not entry["success"]),
+        "total_seconds": round(time.perf_counter() - started, 3)
+    }
+    for entry in entries:
+        if entry["field"] == "question_pdf":
+            results["question"] = entry
+        elif entry["field"] == "answer_pdf":
+            results["answer"] = entry
+    
+    return json_response(results)
 
 if __name__ == "__main__":
     # Use PORT from environment (Render) or default to 5002 (local development)
     port = int(os.environ.get("PORT", 5002))
+    # HOST=127.0.0.1 keeps a local instance (e.g. pdf-loadtest.py) off the network
+    host = os.environ.get("HOST", "0.0.0.0")
     # Run on port 5002 (Node.js backend is on 5001) for local, or $PORT for Render
-    uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
+    uvicorn.run(app, host=host, port=port, log_level="info")
 
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+PDF Extraction Benchmark
+Times every extraction method of pdf-extractor.py on the bundled sample papers
+(doc/, uploads/, upload/temp.pdf) and compares the results with a saved baseline
+
+Each method is run on each document in a fresh child process, so the peak RSS
+reported is that run's own. OCR engines are loaded before the clock starts
+(their load time is reported as load_seconds) and text-layer methods get one
+untimed warm-up pass, so timings match a long-lived daemon or API worker.
+For "full" the warm-up only reads the text layer, so the timed run of a
+scanned paper is not served from the image OCR memo.
+
+--check-zoom instead checks the OCR render zoom estimate against the font
+sizes in the samples' text layers (see check_render_zoom).
+
+Usage:
+  python3 services/pdf-benchmark.py [--methods pymupdf,full] [--repeat 3]
+      [--output results.json] [--baseline baseline.json] [--save-baseline]
+      [--threshold 0.2] [--check-zoom] [pdf or directory ...]
+"""
+
+import sys
+import json
+import os
+import time
+import hashlib
+import platform
+import statistics
+import subprocess
+import importlib.util
+
+SERVICES_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(SERVICES_DIR)
+
+# Sample inputs shipped with the repo
+DEFAULT_INPUTS = [
+    os.path.join(REPO_DIR, "doc"),
+    os.path.join(REPO_DIR, "uploads"),
+    os.path.join(REPO_DIR, "upload", "temp.pdf")
+]
+
+# "full" is extract_text_from_pdf's per-page decision path (text layer,
+# span repair, OCR fallback), the one the API and daemon serve
+METHODS = ["pymupdf", "pdfplumber", "tesseract-ocr", "easyocr", "full"]
+
+DEFAULT_BASELINE = os.path.join(SERVICES_DIR, ".pdf-benchmark", "baseline.json")
+
+# A run is a regression when it is this much slower (or bigger) than the
+# baseline and the difference is above the noise floor
+DEFAULT_THRESHOLD = 0.2
+MIN_SECONDS_DELTA = 0.01
+MIN_RSS_DELTA_MB = 8
+
+BENCHMARK_FORMAT = 1
+
+def load_extractor():
+    """Import pdf-extractor.py the way pdf-api.py does"""
+    spec = importlib.util.spec_from_file_location("pdf_extractor", os.path.join(SERVICES_DIR, "pdf-extractor.py"))
+    module = importlib.util.module_from_spec(spec)
+    # OCR pool workers resolve functions through the module name
+    sys.modules["pdf_extractor"] = module
+    # PyMuPDF writes its import notice straight to fd 1; keep stdout for the results
+    sys.stdout.flush()
+    saved_stdout = os.dup(1)
+    os.dup2(2, 1)
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        os.dup2(saved_stdout, 1)
+        os.close(saved_stdout)
+    return module
+
+def is_pdf_file(path):
+    """Check the magic bytes; uploads/ stores PDFs without an extension"""
+    try:
+        with open(path, "rb") as f:
+            return f.read(5) == b"%PDF-"
+    except OSError:
+        return False
+
+def find_documents(inputs):
+    """Collect the PDFs under inputs, one entry per distinct content
+    
+    Returns [{"name", "path", "sha256", "size", "duplicates"}]; files whose
+    bytes match an earlier one are only listed under its "duplicates".
+    """
+    paths = []
+    for entry in inputs:
+        if os.path.isdir(entry):
+            paths.extend(os.path.join(entry, name) for name in sorted(os.listdir(entry)))
+        elif os.path.exists(entry):
+            paths.append(entry)
+    
+    documents = {}
+    for path in paths:
+        if not os.path.isfile(path) or not is_pdf_file(path):
+            continue
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        name = os.path.relpath(path, REPO_DIR)
+        if digest in documents:
+            documents[digest]["duplicates"].append(name)
+            continue
+        documents[digest] = {
+            "name": name,
+            "path": path,
+            "sha256": digest,
+            "size": os.path.getsize(path),
+            "duplicates": []
+        }
+    return list(documents.values())
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+# ---------------------------------------------------------------------------
+# Single runs (child process)
+#
+# Each runner takes the loaded extractor and a PDF path and returns a list of
+# {"page", "seconds", "chars"} records, or raises.
+# ---------------------------------------------------------------------------
+
+def _page_record(page_num, seconds, text):
+    return {"page": page_num + 1, "seconds": round(seconds, 4), "chars": len(text.strip()) if text else 0}
+
+def run_pymupdf(extractor, path):
+    # The text layer read that every extraction starts with
+    return [
+        _page_record(page_num, page["seconds"], page["text"])
+        for page_num, page in enumerate(extractor.extract_text_layer_pages(path))
+    ]
+
+def run_pdfplumber(extractor, path):
+    # Per-page form of extract_text_with_pdfplumber
+    import pdfplumber
+    records = []
+    with pdfplumber.open(path) as pdf:
+        for page_num, page in enumerate(pdf.pages):
+            started = time.perf_counter()
+            text = page.extract_text()
+            page.flush_cache()
+            records.append(_page_record(page_num, time.perf_counter() - started, text))
+    return records
+
+def run_ocr(extractor, path, method):
+    page_count = extractor.get_page_count(path)
+    records = []
+    for record in extractor.iter_ocr_pages(path, range(page_count), 1, methods=[method]):
+        if record["method"] is None:
+            raise RuntimeError(record["error"] or f"{method} failed")
+        records.append(_page_record(record["page_num"], record["seconds"], record["text"]))
+    return records
+
+def run_full(extractor, path):
+    result = extractor.extract_text_from_pdf(path, use_cache=False)
+    if not result.get("success"):
+        raise RuntimeError(result.get("error", "Extraction failed"))
+    return [
+        {"page": detail["page"], "seconds": detail["seconds"], "chars": detail["chars"], "method": detail["method"]}
+        for detail in result.get("page_details", [])
+    ]
+
+RUNNERS = {"pymupdf": run_pymupdf, "pdfplumber": run_pdfplumber, "full": run_full}
+
+def method_unavailable(extractor, method):
+    """Why a method cannot run here, or None"""
+    if method in ("pymupdf", "full") and not extractor.PYMUPDF_AVAILABLE:
+        return "PyMuPDF not installed"
+    if method == "pdfplumber" and importlib.util.find_spec("pdfplumber") is None:
+        return "pdfplumber not installed"
+    if method in ("tesseract-ocr", "easyocr"):
+        if not extractor.PYMUPDF_AVAILABLE:
+            return "OCR needs PyMuPDF to render pages"
+        if not extractor.is_engine_available(dict(extractor.OCR_METHOD_ORDER)[method]):
+            return f"{method} not installed"
+    return None
+
+def run_once(method, path):
+    """Benchmark one method on one PDF in this process; returns a result dict"""
+    extractor = load_extractor()
+    reason = method_unavailable(extractor, method)
+    if reason:
+        return {"status": "skipped", "reason": reason}
+    
+    load_seconds = 0.0
+    if method in ("tesseract-ocr", "easyocr"):
+        started = time.perf_counter()
+        if extractor.get_ocr_engine(dict(extractor.OCR_METHOD_ORDER)[method]) is None:
+            raise RuntimeError(f"{method} failed to load")
+        load_seconds = time.perf_counter() - started
+    elif method == "full":
+        # Whatever engines the full path may fall back to are loaded up front
+        started = time.perf_counter()
+        extractor.available_ocr_methods()
+        load_seconds = time.perf_counter() - started
+    if method in ("tesseract-ocr", "easyocr"):
+        runner = lambda: run_ocr(extractor, path, method)
+    else:
+        runner = lambda: RUNNERS[method](extractor, path)
+        if method == "full":
+            # Warm up on the text layer only: an OCR pass would fill the image
+            # OCR memo and turn the timed run's scanned pages into lookups
+            run_pymupdf(extractor, path)
+        else:
+            runner()
+    rss_before = peak_rss_mb()
+    
+    started = time.perf_counter()
+    pages = runner()
+    seconds = time.perf_counter() - started
+    
+    return {
+        "status": "ok",
+        "seconds": round(seconds, 4),
+        "load_seconds": round(load_seconds, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "setup_rss_mb": rss_before,
+        "chars": sum(page["chars"] for page in pages),
+        "pages": pages
+    }
+
+# ---------------------------------------------------------------------------
+# Suite (parent process)
+# ---------------------------------------------------------------------------
+
+def run_child(method, path):
+    """Run run_once in a fresh interpreter so peak RSS is per run"""
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", method, path],
+        capture_output=True,
+        text=True,
+        # Results must come from the extraction, not a warm cache
+        env=dict(os.environ, PDF_CACHE_ENABLED="false")
+    )
+    try:
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+    except (ValueError, IndexError):
+        error = proc.stderr.strip().splitlines()[-1:] or [f"exit status {proc.returncode}"]
+        return {"status": "failed", "error": error[0]}
+
+def merge_runs(runs):
+    """Combine repeated runs: medians for timings, maxima for memory"""
+    first = runs[0]
+    if first["status"] != "ok":
+        return first
+    failed = [run for run in runs if run["status"] != "ok"]
+    if failed:
+        return failed[0]
+    
+    pages = []
+    for index, page in enumerate(first["pages"]):
+        merged = dict(page, seconds=round(statistics.median(run["pages"][index]["seconds"] for run in runs), 4))
+        pages.append(merged)
+    page_seconds = sorted(page["seconds"] for page in pages)
+    return {
+        "status": "ok",
+        "seconds": round(statistics.median(run["seconds"] for run in runs), 4),
+        "runs": [run["seconds"] for run in runs],
+        "load_seconds": round(statistics.median(run["load_seconds"] for run in runs), 3),
+        "peak_rss_mb": max(run["peak_rss_mb"] for run in runs),
+        "setup_rss_mb": max(run["setup_rss_mb"] for run in runs),
+        "chars": first["chars"],
+        "page_count": len(pages),
+        "page_seconds": {
+            "median": round(statistics.median(page_seconds), 4) if pages else 0.0,
+            "max": page_seconds[-1] if pages else 0.0
+        },
+        "pages": pages
+    }
+
+def environment_info():
+    extractor = load_extractor()
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "cache_version": extractor.CACHE_VERSION
+    }
+    if extractor.PYMUPDF_AVAILABLE:
+        info["pymupdf"] = extractor.fitz.VersionBind
+    return info
+
+def run_suite(documents, methods, repeat=1):
+    results = []
+    for document in documents:
+        for method in methods:
+            runs = []
+            for _ in range(repeat):
+                run = run_child(method, document["path"])
+                runs.append(run)
+                if run["status"] != "ok":
+                    break
+            result = merge_runs(runs)
+            result.update({"document": document["name"], "sha256": document["sha256"], "method": method})
+            results.append(result)
+            print(f"{method:>14}  {document['name']}: {describe(result)}", file=sys.stderr)
+    
+    return {
+        "format": BENCHMARK_FORMAT,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment_info(),
+        "repeat": repeat,
+        "documents": [{key: value for key, value in document.items() if key != "path"} for document in documents],
+        "results": results
+    }
+
+def describe(result):
+    if result["status"] == "skipped":
+        return f"skipped ({result['reason']})"
+    if result["status"] != "ok":
+        return f"failed ({result['error']})"
+    return (f"{result['seconds']:.3f}s, {result['page_seconds']['median'] * 1000:.1f} ms/page, "
+            f"{result['peak_rss_mb']:.0f} MB peak, {result['chars']} chars")
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """Compare two suite results, matching runs by document hash and method
+    
+    Returns {"regressions", "improvements", "changed_output", "missing"};
+    each entry names the document, method and old/new values.
+    """
+    previous = {
+        (result["sha256"], result["method"]): result
+        for result in baseline.get("results", []) if result["status"] == "ok"
+    }
+    report = {"regressions": [], "improvements": [], "changed_output": [], "missing": []}
+    for result in current["results"]:
+        if result["status"] != "ok":
+            continue
+        old = previous.get((result["sha256"], result["method"]))
+        if old is None:
+            report["missing"].append({"document": result["document"], "method": result["method"]})
+            continue
+        
+        entry = {"document": result["document"], "method": result["method"]}
+        for metric, floor in (("seconds", MIN_SECONDS_DELTA), ("peak_rss_mb", MIN_RSS_DELTA_MB)):
+            delta = result[metric] - old[metric]
+            if abs(delta) <= floor or not old[metric]:
+                continue
+            change = dict(entry, metric=metric, baseline=old[metric], current=result[metric],
+                          ratio=round(result[metric] / old[metric], 3))
+            if delta > old[metric] * threshold:
+                report["regressions"].append(change)
+            elif -delta > old[metric] * threshold:
+                report["improvements"].append(change)
+        if result["chars"] != old["chars"]:
+            report["changed_output"].append(dict(entry, baseline=old["chars"], current=result["chars"]))
+    return report
+
+def print_comparison(report):
+    for title, key in (("Regressions", "regressions"), ("Improvements", "improvements")):
+        for change in report[key]:
+            print(f"{title[:-1]}: {change['method']} {change['document']} {change['metric']} "
+                  f"{change['baseline']} -> {change['current']} (x{change['ratio']})", file=sys.stderr)
+    for change in report["changed_output"]:
+        print(f"Output changed: {change['method']} {change['document']} chars "
+              f"{change['baseline']} -> {change['current']}", file=sys.stderr)
+    if not (report["regressions"] or report["improvements"] or report["changed_output"]):
+        print("No significant changes against the baseline", file=sys.stderr)
+
+# ---------------------------------------------------------------------------
+# Render zoom check
+#
+# Pages without a text layer get their OCR zoom from a prepass that measures
+# text lines in a low-res render. On sample pages whose text layer gives the
+# real font size, the prepass must agree within ZOOM_CHECK_TOLERANCE, and
+# body text must not render above the old fixed zoom (OCR_RENDER_ZOOM)
+# whichever of the two sizes it goes by.
+# ---------------------------------------------------------------------------
+
+ZOOM_CHECK_TOLERANCE = 0.25
+BODY_TEXT_POINTS = (10, 12)
+
+def check_render_zoom(documents):
+    """Check the prepass font size and OCR zoom on pages with a text layer
+
+    Returns {"pages", "problems"}; each problem is a one-line description.
+    """
+    extractor = load_extractor()
+    checked = 0
+    problems = []
+    for document in documents:
+        doc = extractor.fitz.open(document["path"])
+        try:
+            for page in doc:
+                known = extractor._text_layer_glyph_height(page)
+                if not known:
+                    continue
+                checked += 1
+                where = f"{document['name']} page {page.number + 1}"
+                measured = extractor._prepass_glyph_height(page)
+                if not measured or abs(measured / known - 1) > ZOOM_CHECK_TOLERANCE:
+                    problems.append(f"{where}: prepass measured {measured or 0:.2f} pt, text layer has {known:.2f} pt")
+                if not BODY_TEXT_POINTS[0] <= round(known) <= BODY_TEXT_POINTS[1]:
+                    continue
+                for method in extractor.OCR_TARGET_GLYPH_PX:
+                    for source, glyph_height in (("text layer", known), ("prepass", measured)):
+                        zoom = extractor.choose_render_zoom(page, method, glyph_height)
+                        if zoom > extractor.OCR_RENDER_ZOOM:
+                            problems.append(f"{where}: {method} renders {known:.1f} pt text at {zoom}x from the {source}")
+        finally:
+            doc.close()
+    return {"pages": checked, "problems": problems}
+
+def option_value(name, default=None):
+    """Value following a --flag in sys.argv"""
+    if name not in sys.argv:
+        return default
+    index = sys.argv.index(name) + 1
+    if index >= len(sys.argv):
+        print(json.dumps({"error": f"Value required for {name}"}))
+        sys.exit(1)
+    return sys.argv[index]
+
+USAGE = (
+    "Usage: python pdf-benchmark.py [--methods m1,m2] [--repeat N] [--output file] "
+    "[--baseline file] [--save-baseline] [--threshold 0.2] [--check-zoom] [pdf or directory ...]"
+)
+
+if __name__ == "__main__":
+    if "-h" in sys.argv or "--help" in sys.argv:
+        print(json.dumps({"error": USAGE, "methods": METHODS}))
+        sys.exit(0)
+    
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        try:
+            outcome = run_once(sys.argv[2], sys.argv[3])
+        except Exception as e:
+            outcome = {"status": "failed", "error": f"{e.__class__.__name__}: {e}"}
+        # Engine and library chatter goes to stderr; the result is the last stdout line
+        print(json.dumps(outcome, ensure_ascii=False))
+        sys.exit(0)
+    
+    methods = option_value("--methods", ",".join(METHODS)).split(",")
+    unknown = [method for method in methods if method not in METHODS]
+    if unknown:
+        print(json.dumps({"error": f"Unknown methods: {', '.join(unknown)}", "methods": METHODS}))
+        sys.exit(1)
+    repeat = max(int(option_value("--repeat", "1")), 1)
+    threshold = float(option_value("--threshold", str(DEFAULT_THRESHOLD)))
+    output_path = option_value("--output")
+    baseline_path = option_value("--baseline", DEFAULT_BASELINE)
+    
+    # Positional arguments are extra inputs replacing the bundled samples
+    flags_with_values = {"--methods", "--repeat", "--threshold", "--output", "--baseline"}
+    inputs = [
+        arg for index, arg in enumerate(sys.argv[1:], 1)
+        if not arg.startswith("--") and sys.argv[index - 1] not in flags_with_values
+    ]
+    documents = find_documents(inputs or DEFAULT_INPUTS)
+    if not documents:
+        print(json.dumps({"error": "No PDF files found"}))
+        sys.exit(1)
+    
+    if "--check-zoom" in sys.argv:
+        report = check_render_zoom(documents)
+        for problem in report["problems"]:
+            print(problem, file=sys.stderr)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        sys.exit(1 if report["problems"] or not report["pages"] else 0)
+    
+    suite = run_suite(documents, methods, repeat)
+    
+    exit_code = 0
+    if os.path.exists(baseline_path) and "--save-baseline" not in sys.argv:
+        with open(baseline_path, encoding="utf-8") as f:
+            suite["comparison"] = compare(suite, json.load(f), threshold)
+        suite["comparison"]["baseline"] = baseline_path
+        print_comparison(suite["comparison"])
+        if suite["comparison"]["regressions"]:
+            exit_code = 2
+    
+    output = json.dumps(suite, ensure_ascii=False, indent=2)
+    if "--save-baseline" in sys.argv:
+        os.makedirs(os.path.dirname(os.path.abspath(baseline_path)), exist_ok=True)
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"Baseline saved to {baseline_path}", file=sys.stderr)
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    sys.exit(exit_code)
@@ -8,8 +8,23 @@ Uses PyMuPDF (fitz) for text extraction, and OCR (Tesseract/EasyOCR) for image-b
 import sys
 import json
 import base64
-import tempfile
+import bisect
 import os
+import threading
+import time
+import gc
+import atexit
+import multiprocessing
+import hashlib
+import zlib
+import math
+import re
+import queue
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+import importlib.util
+import tempfile
 from io import BytesIO
 
 try:
@@ -17,56 +32,461 @@ try:
     PYMUPDF_AVAILABLE = True
 except ImportError:
     PYMUPDF_AVAILABLE = False
-    try:
-        import pdfplumber
-        PDFPLUMBER_AVAILABLE = True
-    except ImportError:
-        PDFPLUMBER_AVAILABLE = False
+
+# pdfplumber is the fallback without PyMuPDF; it is imported where it is used
+PDFPLUMBER_AVAILABLE = importlib.util.find_spec("pdfplumber") is not None
 
 # OCR libraries
 try:
     import pytesseract
     from PIL import Image
-    TESSERACT_AVAILABLE = True
+    PYTESSERACT_AVAILABLE = True
 except ImportError:
-    TESSERACT_AVAILABLE = False
+    PYTESSERACT_AVAILABLE = False
 
+# tesserocr drives libtesseract in-process (no subprocess or traineddata
+# reload per page); pytesseract is the fallback when it is not installed
 try:
+    import tesserocr
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    TESSEROCR_AVAILABLE = False
+
+TESSERACT_AVAILABLE = TESSEROCR_AVAILABLE or PYTESSERACT_AVAILABLE
+
+# EasyOCR pulls in torch, so only check that it is installed here and import it
+# when the engine is first needed (see get_ocr_engine)
+EASYOCR_AVAILABLE = importlib.util.find_spec("easyocr") is not None
+
+# ---------------------------------------------------------------------------
+# OCR engine registry
+#
+# Engines are loaded on first use instead of at import time, so processes that
+# only ever read text layers never pay for the model load or hold its memory.
+#
+#   OCR_PRELOAD          comma-separated engines to load up front
+#                        ("easyocr", "tesseract", "all"; default: none)
+#   OCR_ENGINE_IDLE_TTL  seconds an engine may sit unused before it is
+#                        unloaded (default 900, 0 disables unloading)
+# ---------------------------------------------------------------------------
+
+OCR_ENGINE_IDLE_TTL = float(os.environ.get("OCR_ENGINE_IDLE_TTL", "900"))
+
+_engines = {}
+_engine_stats = {}
+_engine_lock = threading.RLock()
+_reaper_thread = None
+
+# EasyOCR inference tuning: regions per recognizer batch, pages per detector
+# batch (same-size renders only) and torch intra-op threads (0 = leave
+# torch's default, or 1 inside OCR pool workers)
+EASYOCR_BATCH_SIZE = int(os.environ.get("EASYOCR_BATCH_SIZE", "16"))
+EASYOCR_PAGE_BATCH = int(os.environ.get("EASYOCR_PAGE_BATCH", "4"))
+EASYOCR_TORCH_THREADS = int(os.environ.get("EASYOCR_TORCH_THREADS", "0"))
+
+def torch_threads():
+    """Current torch intra-op thread count, or None if torch isn't loaded"""
+    torch = sys.modules.get("torch")
+    return torch.get_num_threads() if torch is not None else None
+
+# EasyOCR language codes for the Tesseract codes used in language sets
+EASYOCR_LANGUAGE_CODES = {"tam": "ta", "eng": "en"}
+
+def _load_easyocr():
     import easyocr
-    EASYOCR_AVAILABLE = True
-    # Initialize EasyOCR reader once (supports Tamil and English)
-    if EASYOCR_AVAILABLE:
+    if EASYOCR_TORCH_THREADS > 0:
+        sys.modules["torch"].set_num_threads(EASYOCR_TORCH_THREADS)
+    # Readers for other language sets are added on first use by easyocr_reader()
+    return {
+        "module": easyocr,
+        "readers": {("ta", "en"): easyocr.Reader(['ta', 'en'], gpu=False)},  # 'ta' is Tamil
+        "lock": threading.Lock()
+    }
+
+def easyocr_reader(engine, languages):
+    """EasyOCR reader for a language set such as "tam+eng" or "eng" """
+    codes = tuple(EASYOCR_LANGUAGE_CODES[language] for language in languages.split("+"))
+    with engine["lock"]:
+        reader = engine["readers"].get(codes)
+        if reader is None:
+            reader = engine["module"].Reader(list(codes), gpu=False)
+            engine["readers"][codes] = reader
+    return reader
+
+# Initialized tesserocr API handles kept per language set and process
+TESSERACT_POOL_SIZE = int(os.environ.get("TESSERACT_POOL_SIZE", "2"))
+
+def _missing_tesseract_languages(languages):
+    # Script detection can ask for any of OCR_LANGUAGES alone or together
+    return [lang for lang in OCR_LANGUAGES.split("+") if lang not in languages]
+
+def _load_tesseract():
+    # Loading checks that the Tamil and English traineddata are actually
+    # installed; with tesserocr it also sets up the pool that handles are
+    # created in
+    if TESSEROCR_AVAILABLE:
+        tessdata_path, languages = tesserocr.get_languages(os.environ.get("TESSDATA_PREFIX"))
+        missing = _missing_tesseract_languages(languages)
+        if missing:
+            raise RuntimeError(f"Tesseract language data not installed in {tessdata_path}: {', '.join(missing)}")
+        return {
+            "backend": "tesserocr",
+            "languages": languages,
+            "path": tessdata_path,
+            "handles": {},
+            "created": {},
+            "lock": threading.Lock()
+        }
+    # pytesseract shells out per call
+    languages = pytesseract.get_languages(config='')
+    missing = _missing_tesseract_languages(languages)
+    if missing:
+        raise RuntimeError(f"Tesseract language data not installed: {', '.join(missing)}")
+    return {"backend": "pytesseract", "languages": languages}
+
+@contextmanager
+def tesseract_api(engine, lang):
+    """Borrow an initialized tesserocr handle for `lang` from the engine's pool
+
+    Up to TESSERACT_POOL_SIZE handles are created per language set; callers
+    beyond that wait for one to be returned.
+    """
+    with engine["lock"]:
+        handles = engine["handles"].setdefault(lang, queue.LifoQueue())
+        api = None
         try:
-            easyocr_reader = easyocr.Reader(['ta', 'en'], gpu=False)  # 'ta' is Tamil
-        except:
-            easyocr_reader = None
-            EASYOCR_AVAILABLE = False
-except ImportError:
-    EASYOCR_AVAILABLE = False
-    easyocr_reader = None
+            api = handles.get_nowait()
+        except queue.Empty:
+            if engine["created"].get(lang, 0) < TESSERACT_POOL_SIZE:
+                api = tesserocr.PyTessBaseAPI(path=engine["path"], lang=lang, psm=tesserocr.PSM.AUTO)
+                # Count the handle only once it exists: a failed init must not
+                # use up a slot, or later callers would wait on handles.get() forever
+                engine["created"][lang] = engine["created"].get(lang, 0) + 1
+    if api is None:
+        api = handles.get()
+    try:
+        yield api
+    finally:
+        api.Clear()
+        handles.put(api)
+
+ENGINE_LOADERS = {
+    "easyocr": _load_easyocr,
+    "tesseract": _load_tesseract
+}
+
+def is_engine_available(name):
+    """Check whether an OCR engine is installed (without loading it)"""
+    if name == "easyocr":
+        return EASYOCR_AVAILABLE
+    if name == "tesseract":
+        return TESSERACT_AVAILABLE
+    return False
+
+def get_ocr_engine(name):
+    """Return a loaded OCR engine, loading it on first use
+
+    Returns None if the engine is not installed or failed to load.
+    """
+    if not is_engine_available(name):
+        return None
+    
+    with _engine_lock:
+        stats = _engine_stats.setdefault(name, {"loads": 0, "unloads": 0, "load_seconds": None, "error": None})
+        engine = _engines.get(name)
+        if engine is None:
+            if stats["error"]:
+                return None
+            started = time.perf_counter()
+            try:
+                engine = ENGINE_LOADERS[name]()
+            except Exception as e:
+                stats["error"] = str(e)
+                print(f"Warning: could not load OCR engine {name}: {e}", file=sys.stderr)
+                return None
+            stats["load_seconds"] = round(time.perf_counter() - started, 3)
+            stats["loads"] += 1
+            stats["loaded_at"] = time.time()
+            _engines[name] = engine
+            _start_reaper()
+        stats["last_used"] = time.time()
+        return engine
+
+def unload_idle_engines(ttl=None):
+    """Drop engines unused for longer than ttl seconds; returns their names"""
+    ttl = OCR_ENGINE_IDLE_TTL if ttl is None else ttl
+    now = time.time()
+    unloaded = []
+    with _engine_lock:
+        for name in list(_engines):
+            if now - _engine_stats[name].get("last_used", now) >= ttl:
+                del _engines[name]
+                _engine_stats[name]["unloads"] += 1
+                unloaded.append(name)
+    if unloaded:
+        gc.collect()
+        publish_worker_status()
+    return unloaded
+
+def _reap_idle_engines():
+    interval = max(1.0, min(OCR_ENGINE_IDLE_TTL / 2, 60.0))
+    while True:
+        time.sleep(interval)
+        unload_idle_engines()
+
+def _start_reaper():
+    global _reaper_thread
+    if OCR_ENGINE_IDLE_TTL <= 0 or _reaper_thread is not None:
+        return
+    _reaper_thread = threading.Thread(target=_reap_idle_engines, name="ocr-engine-reaper", daemon=True)
+    _reaper_thread.start()
+
+def parse_engine_names(value):
+    """Parse an engine list like "easyocr,tesseract" or "all" """
+    if not value:
+        return []
+    names = [name.strip().lower() for name in value.split(",") if name.strip()]
+    if "all" in names:
+        return list(ENGINE_LOADERS)
+    return [name for name in names if name in ENGINE_LOADERS]
+
+def warmup_engines(names=None):
+    """Load the given engines (default: all installed) and report their status"""
+    if names is None:
+        names = list(ENGINE_LOADERS)
+    for name in names:
+        get_ocr_engine(name)
+    return engine_status()
+
+def preload_engines():
+    """Load the engines listed in OCR_PRELOAD"""
+    names = parse_engine_names(os.environ.get("OCR_PRELOAD", ""))
+    if names:
+        warmup_engines(names)
+    return names
+
+def engine_status():
+    """Report installed/loaded state and load timings for each OCR engine"""
+    now = time.time()
+    status = {}
+    with _engine_lock:
+        for name in ENGINE_LOADERS:
+            stats = _engine_stats.get(name, {})
+            last_used = stats.get("last_used")
+            status[name] = {
+                "available": is_engine_available(name),
+                "loaded": name in _engines,
+                "load_seconds": stats.get("load_seconds"),
+                "loads": stats.get("loads", 0),
+                "unloads": stats.get("unloads", 0),
+                "idle_seconds": round(now - last_used, 1) if last_used else None,
+                "error": stats.get("error")
+            }
+    return status
+
+# ---------------------------------------------------------------------------
+# Per-request limits
+#
+# Documents over these limits fail with a clear error (and "limit_exceeded":
+# true in the result) instead of running the process out of memory.
+#
+#   PDF_MAX_PAGES       pages per document (default: 2000, 0 = unlimited)
+#   PDF_MAX_TEXT_BYTES  UTF-8 bytes of extracted text per document
+#                       (default: 64 MB, 0 = unlimited)
+# ---------------------------------------------------------------------------
+
+PDF_MAX_PAGES = int(os.environ.get("PDF_MAX_PAGES", "2000"))
+PDF_MAX_TEXT_BYTES = int(os.environ.get("PDF_MAX_TEXT_BYTES", str(64 * 1024 * 1024)))
+
+class ExtractionLimitExceeded(RuntimeError):
+    """A document is over PDF_MAX_PAGES or PDF_MAX_TEXT_BYTES"""
+
+def check_page_limit(page_count):
+    if PDF_MAX_PAGES and page_count > PDF_MAX_PAGES:
+        raise ExtractionLimitExceeded(f"PDF has {page_count} pages; the limit is {PDF_MAX_PAGES} (PDF_MAX_PAGES)")
+
+def check_text_limit(text_bytes):
+    if PDF_MAX_TEXT_BYTES and text_bytes > PDF_MAX_TEXT_BYTES:
+        raise ExtractionLimitExceeded(f"Extracted text exceeds {PDF_MAX_TEXT_BYTES} bytes (PDF_MAX_TEXT_BYTES)")
+
+def limit_error(error):
+    """Result dict for a document rejected by a per-request limit"""
+    return {"success": False, "error": str(error), "limit_exceeded": True, "text": ""}
+
+# ---------------------------------------------------------------------------
+# Metrics
+#
+# Per-stage timing histograms and counters, kept per process and exported in
+# Prometheus text format by pdf-api's /metrics, the daemon's
+# {"cmd": "metrics"} and the CLI's --metrics. Recording one value is a dict
+# update under a lock, cheap enough to leave on. Pool workers send what they
+# recorded back with their results (drain_metrics / merge_metrics), so the
+# serving process reports the work done on its behalf.
+#
+#   PDF_METRICS  record metrics (default: true)
+# ---------------------------------------------------------------------------
+
+PDF_METRICS = os.environ.get("PDF_METRICS", "true").lower() != "false"
+
+# Upper bounds of the histogram buckets, in seconds
+METRIC_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRICS = {
+    "pdf_upload_read_seconds": ("histogram", "Time to read (and spool) an uploaded PDF"),
+    "pdf_text_layer_seconds": ("histogram", "PyMuPDF text layer read, per page"),
+    "pdf_page_render_seconds": ("histogram", "Page render for OCR, per page"),
+    "pdf_ocr_seconds": ("histogram", "OCR per page, repaired page or answer-key cell (render included), by engine"),
+    "pdf_json_serialize_seconds": ("histogram", "Serializing a response to JSON"),
+    "pdf_extractions_total": ("counter", "Documents extracted, by resulting method"),
+    "pdf_pages_total": ("counter", "Pages extracted, by method"),
+    "pdf_ocr_fallbacks_total": ("counter", "Pages sent to OCR, by reason (garbled = has_ocr_errors)"),
+    "pdf_ocr_failures_total": ("counter", "OCR runs that failed, by engine"),
+    "pdf_answer_key_seconds": ("histogram", "Reading an answer key (extract_answer_key), per document")
+}
+
+_metric_counters = {}
+_metric_histograms = {}
+_metrics_lock = threading.Lock()
+
+def count_metric(name, amount=1, **labels):
+    """Add to a counter"""
+    if not PDF_METRICS:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        _metric_counters[key] = _metric_counters.get(key, 0) + amount
+
+def observe_metric(name, seconds, **labels):
+    """Record one duration in a histogram"""
+    if not PDF_METRICS:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    bucket = bisect.bisect_left(METRIC_BUCKETS, seconds)
+    with _metrics_lock:
+        histogram = _metric_histograms.get(key)
+        if histogram is None:
+            # Per-bucket counts (the last one is +Inf), sum, count
+            histogram = _metric_histograms[key] = [[0] * (len(METRIC_BUCKETS) + 1), 0.0, 0]
+        histogram[0][bucket] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+
+def drain_metrics():
+    """Return and reset this process's metrics, for merge_metrics in the parent"""
+    global _metric_counters, _metric_histograms
+    with _metrics_lock:
+        snapshot = (_metric_counters, _metric_histograms)
+        _metric_counters, _metric_histograms = {}, {}
+    return snapshot
+
+def merge_metrics(snapshot):
+    """Add metrics drained from a worker process to this process's"""
+    counters, histograms = snapshot
+    with _metrics_lock:
+        for key, value in counters.items():
+            _metric_counters[key] = _metric_counters.get(key, 0) + value
+        for key, (buckets, total, count) in histograms.items():
+            histogram = _metric_histograms.get(key)
+            if histogram is None:
+                _metric_histograms[key] = [list(buckets), total, count]
+                continue
+            histogram[0] = [a + b for a, b in zip(histogram[0], buckets)]
+            histogram[1] += total
+            histogram[2] += count
+
+def _metric_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def render_metrics(gauges=None):
+    """This process's metrics in the Prometheus text exposition format
+
+    gauges: optional {name: (help, value)} of point-in-time values to add,
+    such as the requests in flight.
+    """
+    with _metrics_lock:
+        counters = dict(_metric_counters)
+        histograms = {key: (list(value[0]), value[1], value[2]) for key, value in _metric_histograms.items()}
+    
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_metric_labels(labels)} {value}")
+            continue
+        for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(METRIC_BUCKETS + ("+Inf",), buckets):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_metric_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_metric_labels(labels)} {round(total, 6)}")
+            lines.append(f"{name}_count{_metric_labels(labels)} {count}")
+    for name, (help_text, value) in (gauges or {}).items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
 
-def extract_text_with_pymupdf(pdf_path):
+def is_pdf_path(pdf_source):
+    """True if pdf_source is a filesystem path rather than in-memory data"""
+    return isinstance(pdf_source, (str, os.PathLike))
+
+def pdf_bytes(pdf_source):
+    """Return in-memory PDF data (bytes or a binary file object) as bytes"""
+    if isinstance(pdf_source, (bytes, bytearray)):
+        return pdf_source
+    if isinstance(pdf_source, memoryview):
+        return pdf_source.tobytes()
+    if hasattr(pdf_source, "read"):
+        if hasattr(pdf_source, "seek"):
+            pdf_source.seek(0)
+        return pdf_source.read()
+    raise TypeError(f"Unsupported PDF source: {type(pdf_source).__name__}")
+
+def open_pdf(pdf_source):
+    """Open a PDF with PyMuPDF from a path, bytes or a binary file object"""
+    if is_pdf_path(pdf_source):
+        return fitz.open(pdf_source)
+    return fitz.open(stream=pdf_bytes(pdf_source), filetype="pdf")
+
+def extract_text_with_pymupdf(pdf_source):
     """Extract text using PyMuPDF (fitz) - fastest and best for Unicode"""
     try:
-        doc = fitz.open(pdf_path)
-        text_parts = []
-        
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            # Extract text with proper encoding
-            text = page.get_text("text")
-            if text:
-                text_parts.append(text)
-        
-        doc.close()
+        doc = open_pdf(pdf_source)
+        try:
+            page_count = len(doc)
+            check_page_limit(page_count)
+            text_parts = []
+            text_bytes = 0
+            
+            for page_num in range(page_count):
+                page = doc[page_num]
+                # Extract text with proper encoding
+                text = page.get_text("text")
+                if text:
+                    text_bytes += len(text.encode("utf-8"))
+                    check_text_limit(text_bytes)
+                    text_parts.append(text)
+        finally:
+            doc.close()
         full_text = '\n'.join(text_parts)
         
         return {
             "success": True,
             "text": full_text,
-            "pages": len(doc),
+            "pages": page_count,
             "method": "pymupdf"
         }
+    except ExtractionLimitExceeded as e:
+        return limit_error(e)
     except Exception as e:
         return {
             "success": False,
@@ -74,14 +494,22 @@ def extract_text_with_pymupdf(pdf_path):
             "text": ""
         }
 
-def extract_text_with_pdfplumber(pdf_path):
+def extract_text_with_pdfplumber(pdf_source):
     """Extract text using pdfplumber - good for structured content"""
     try:
+        import pdfplumber
         text_parts = []
-        with pdfplumber.open(pdf_path) as pdf:
+        text_bytes = 0
+        with pdfplumber.open(pdf_source if is_pdf_path(pdf_source) else BytesIO(pdf_bytes(pdf_source))) as pdf:
+            page_count = len(pdf.pages)
+            check_page_limit(page_count)
             for page in pdf.pages:
                 text = page.extract_text()
+                # Parsed layout objects are cached per page; drop them as we go
+                page.flush_cache()
                 if text:
+                    text_bytes += len(text.encode("utf-8"))
+                    check_text_limit(text_bytes)
                     text_parts.append(text)
         
         full_text = '\n'.join(text_parts)
@@ -89,9 +517,11 @@ def extract_text_with_pdfplumber(pdf_path):
         return {
             "success": True,
             "text": full_text,
-            "pages": len(pdf.pages),
+            "pages": page_count,
             "method": "pdfplumber"
         }
+    except ExtractionLimitExceeded as e:
+        return limit_error(e)
     except Exception as e:
         return {
             "success": False,
@@ -99,37 +529,988 @@ def extract_text_with_pdfplumber(pdf_path):
             "text": ""
         }
 
-def extract_text_with_ocr_tesseract(pdf_path):
-    """Extract text using Tesseract OCR with Tamil support"""
-    if not TESSERACT_AVAILABLE:
-        return {"success": False, "error": "Tesseract not available", "text": ""}
+# ---------------------------------------------------------------------------
+# Page rendering for OCR
+#
+# Pages are rendered as 8-bit grayscale without alpha (a third of the memory
+# of RGB) and handed to the OCR engines as views of the pixmap's sample
+# buffer, skipping the PNG encode/decode round trip.
+# ---------------------------------------------------------------------------
+
+OCR_RENDER_ZOOM = 2  # 2x zoom for better quality
+
+def render_page_gray(page, zoom=OCR_RENDER_ZOOM):
+    """Render a page for OCR as a grayscale, alpha-free pixmap, tagged with its dpi"""
+    started = time.perf_counter()
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+    pix.set_dpi(round(72 * zoom), round(72 * zoom))
+    observe_metric("pdf_page_render_seconds", time.perf_counter() - started)
+    return pix
+
+def _pixmap_samples(pix):
+    # samples_mv is a zero-copy view; older PyMuPDF only has the bytes copy
+    return getattr(pix, "samples_mv", None) or pix.samples
+
+def pixmap_to_pil(pix):
+    """Wrap a grayscale pixmap's buffer in a PIL image without copying it"""
+    return Image.frombuffer("L", (pix.width, pix.height), _pixmap_samples(pix), "raw", "L", pix.stride, 1)
+
+def pixmap_to_array(pix):
+    """View a grayscale pixmap's buffer as a (height, width) uint8 array"""
+    import numpy as np
+    rows = np.frombuffer(_pixmap_samples(pix), dtype=np.uint8).reshape(pix.height, pix.stride)
+    return rows[:, :pix.width]
+
+# ---------------------------------------------------------------------------
+# Adaptive render resolution
+#
+# Instead of a fixed 2x zoom, each page is rendered at the lowest zoom that
+# gives its typical glyph the pixel height the engine needs. The glyph height
+# comes from the font sizes in the text layer, or from a cheap low-res render
+# where text lines are measured from the ink profile. Zoom is capped so no
+# page exceeds OCR_MAX_PAGE_PIXELS (default 8 megapixels).
+# `pdf-benchmark.py --check-zoom` checks the estimate against the sample papers.
+# ---------------------------------------------------------------------------
+
+# Glyph (font size) height in pixels each engine needs for reliable Tamil.
+# The fixed 2x render gave 10 pt text 20 px, so body text never needs more.
+OCR_TARGET_GLYPH_PX = {"tesseract-ocr": 20, "easyocr": 18}
+OCR_MIN_ZOOM = 1.0
+OCR_MAX_ZOOM = 4.0
+OCR_MAX_PAGE_PIXELS = int(os.environ.get("OCR_MAX_PAGE_PIXELS", "8000000"))
+# Zoom is rounded to this step so similar pages render to the same size
+# (and can share an EasyOCR batch)
+OCR_ZOOM_STEP = 0.25
+PREPASS_ZOOM = 1.5
+# Pixels darker than this count as ink (scan backgrounds stay well above it)
+PREPASS_INK_LEVEL = 160
+# A text line's ink, top of the vowel marks to bottom of the descenders, is
+# about this share of the font size (measured on the sample papers: 0.85-1.05)
+INK_TO_FONT_SIZE = 0.9
+
+def _text_layer_glyph_height(page):
+    """Character-weighted median font size of the page's text layer, in points"""
+    sizes = []
+    for block in page.get_text("dict").get("blocks", []):
+        for line in block.get("lines", []):
+            for span in line.get("spans", []):
+                chars = len(span.get("text", "").strip())
+                if chars and span.get("size"):
+                    sizes.append((span["size"], chars))
+    if not sizes:
+        return None
+    sizes.sort()
+    half = sum(chars for _, chars in sizes) / 2
+    seen = 0
+    for size, chars in sizes:
+        seen += chars
+        if seen >= half:
+            return size
+
+def _prepass_glyph_height(page):
+    """Estimate font size from text-line ink heights in a low-res render"""
+    pix = page.get_pixmap(matrix=fitz.Matrix(PREPASS_ZOOM, PREPASS_ZOOM), colorspace=fitz.csGRAY, alpha=False)
+    image = pixmap_to_array(pix)
+    # A row belongs to a text line if it has any ink beyond a lone speck;
+    # a stricter test drops the thin tops and tails of the line and halves it
+    inked = (image < PREPASS_INK_LEVEL).sum(axis=1) > 1
+    runs = []
+    run = 0
+    for row_inked in inked:
+        if row_inked:
+            run += 1
+        elif run:
+            runs.append(run)
+            run = 0
+    if run:
+        runs.append(run)
+    # Ignore rules/specks and merged blocks (images, tables)
+    runs = [r for r in runs if 3 <= r <= pix.height // 10]
+    if not runs:
+        return None
+    runs.sort()
+    return runs[len(runs) // 2] / PREPASS_ZOOM / INK_TO_FONT_SIZE
+
+def estimate_glyph_height(page):
+    """Typical glyph height on a page in PDF points, or None if unknown"""
+    try:
+        return _text_layer_glyph_height(page) or _prepass_glyph_height(page)
+    except Exception:
+        return None
+
+def choose_render_zoom(page, method, glyph_height=None):
+    """Zoom that meets the engine's glyph target, within the pixel cap
+
+    glyph_height (points) defaults to estimate_glyph_height(page). Rounded to
+    the nearest OCR_ZOOM_STEP; the targets and estimates are not precise
+    enough for a 10 pt page to need 2.25x rather than 2x.
+    """
+    if glyph_height is None:
+        glyph_height = estimate_glyph_height(page)
+    if glyph_height:
+        zoom = OCR_TARGET_GLYPH_PX.get(method, 20) / glyph_height
+    else:
+        zoom = OCR_RENDER_ZOOM
+    zoom = max(OCR_MIN_ZOOM, min(zoom, OCR_MAX_ZOOM))
+    zoom = round(zoom / OCR_ZOOM_STEP) * OCR_ZOOM_STEP
+    
+    area = page.rect.width * page.rect.height
+    if area > 0:
+        max_zoom = math.sqrt(OCR_MAX_PAGE_PIXELS / area)
+        if zoom > max_zoom:
+            # The pixel cap wins over the glyph target, even below OCR_MIN_ZOOM
+            zoom = max(OCR_ZOOM_STEP, math.floor(max_zoom / OCR_ZOOM_STEP) * OCR_ZOOM_STEP)
+    return zoom
+
+# ---------------------------------------------------------------------------
+# Script detection
+#
+# Tamil + English models together cost clearly more per page than one of
+# them, and many pages (the English half of bilingual papers, answer keys)
+# need only one. Each OCR'd page's language set is picked from a Unicode-range
+# histogram of its text layer. Pages with too little text borrow it from
+# text-layer pages nearby; scanned runs with none OCR one page in
+# SCRIPT_PROBE_PAGES with both languages and let its reading decide the
+# pages after it. Pages set in legacy (non-Unicode) Tamil fonts, whose text
+# layer looks Latin, and pages nothing decides use both.
+#
+#   OCR_SCRIPT_DETECTION  "false" always OCRs with Tamil + English (default: true)
+# ---------------------------------------------------------------------------
+
+OCR_SCRIPT_DETECTION = os.environ.get("OCR_SCRIPT_DETECTION", "true").lower() != "false"
+
+# Tesseract-style language set used when the script is unknown
+OCR_LANGUAGES = "tam+eng"
+
+# Letters needed before the text layer is trusted to decide
+SCRIPT_MIN_LETTERS = 20
+
+# A script with a smaller share of the letters than this is left out
+SCRIPT_MINOR_SHARE = 0.02
+
+# Pages short of letters look this many pages either way for text to go by
+SCRIPT_NEIGHBOUR_PAGES = 2
+
+# On pages with no text nearby, one in this many is OCR'd with both languages
+SCRIPT_PROBE_PAGES = 4
+
+# Legacy Tamil fonts map glyphs onto ASCII, so their text layer reads as Latin
+LEGACY_TAMIL_FONT_HINTS = ("bamini", "tscu", "tscii", "tam-", "vanavil", "kalaham", "elango")
+
+# In UTF-8 every Tamil code point (U+0B80-U+0BFF) starts with one of these
+# byte pairs, so both scripts can be counted on the encoded bytes in C
+_TAMIL_UTF8_PREFIXES = (b'\xe0\xae', b'\xe0\xaf')
+_ASCII_LETTERS = b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+def script_histogram(text):
+    """Count Tamil and Latin letters in a text: {"tam": n, "eng": n}"""
+    if not text:
+        return {"tam": 0, "eng": 0}
+    data = text.encode("utf-8", "surrogatepass")
+    return {
+        "tam": sum(data.count(prefix) for prefix in _TAMIL_UTF8_PREFIXES),
+        "eng": len(data) - len(data.translate(None, _ASCII_LETTERS))
+    }
+
+def _histogram_languages(counts):
+    """"tam", "eng" or "tam+eng" for a script histogram, None if too few letters"""
+    letters = counts["tam"] + counts["eng"]
+    if letters < SCRIPT_MIN_LETTERS:
+        return None
+    if counts["tam"] <= letters * SCRIPT_MINOR_SHARE:
+        return "eng"
+    if counts["eng"] <= letters * SCRIPT_MINOR_SHARE:
+        return "tam"
+    return OCR_LANGUAGES
+
+def choose_ocr_languages(text):
+    """Pick "tam", "eng" or "tam+eng" for OCR from a page's text layer"""
+    if not OCR_SCRIPT_DETECTION:
+        return OCR_LANGUAGES
+    return _histogram_languages(script_histogram(text)) or OCR_LANGUAGES
+
+def _page_script_histogram(page):
+    """Script histogram of a page's text layer, None if set in legacy Tamil fonts"""
+    fonts = " ".join(font[3] for font in page.get_fonts()).lower()
+    if any(hint in fonts for hint in LEGACY_TAMIL_FONT_HINTS):
+        return None
+    return script_histogram(page.get_text("text"))
+
+def text_layer_languages(page):
+    """Language set the text layer calls for, or None if there is too little
+
+    A page short of letters adds the text of the pages around it, nearest
+    first, up to SCRIPT_NEIGHBOUR_PAGES away.
+    """
+    counts = _page_script_histogram(page)
+    doc = page.parent
+    for offset in range(1, SCRIPT_NEIGHBOUR_PAGES + 1):
+        if counts is None:
+            return OCR_LANGUAGES
+        if _histogram_languages(counts) is not None:
+            break
+        for number in (page.number - offset, page.number + offset):
+            if 0 <= number < doc.page_count:
+                nearby = _page_script_histogram(doc[number])
+                if nearby is None:
+                    return OCR_LANGUAGES
+                counts = {script: counts[script] + nearby[script] for script in counts}
+    if counts is None:
+        return OCR_LANGUAGES
+    return _histogram_languages(counts)
+
+def page_ocr_languages(page):
+    """Language set to OCR a PyMuPDF page with"""
+    if not OCR_SCRIPT_DETECTION:
+        return OCR_LANGUAGES
+    return text_layer_languages(page) or OCR_LANGUAGES
+
+def new_script_probe():
+    """Script reading carried across a run of pages by probe_ocr_languages"""
+    return {"reading": None, "borrowed": 0}
+
+def probe_ocr_languages(page, probe):
+    """page_ocr_languages for pages OCR'd in order, reusing earlier readings
+
+    Pages the text layer cannot decide take the single script read off the
+    last probe page; every SCRIPT_PROBE_PAGES-th one is a probe itself, OCR'd
+    with both languages. Returns (languages, probing); pass a probe page's
+    text to record_script_probe.
+    """
+    if not OCR_SCRIPT_DETECTION:
+        return OCR_LANGUAGES, False
+    languages = text_layer_languages(page)
+    if languages is not None:
+        return languages, False
+    if probe["reading"] in ("tam", "eng") and probe["borrowed"] < SCRIPT_PROBE_PAGES - 1:
+        probe["borrowed"] += 1
+        return probe["reading"], False
+    probe["borrowed"] = 0
+    return OCR_LANGUAGES, True
+
+def record_script_probe(probe, text):
+    """Let a probe page's OCR text decide the script of the pages after it"""
+    probe["reading"] = _histogram_languages(script_histogram(text))
+
+def _render_for_ocr(page, method):
+    """Render a page at its chosen zoom; returns (pixmap, meta)"""
+    zoom = choose_render_zoom(page, method)
+    return render_page_gray(page, zoom), {"dpi": round(72 * zoom)}
+
+# Whether tesserocr's SetImageBytes takes the pixmap's buffer as is; builds
+# that insist on bytes get one copy of the samples instead
+_set_image_takes_buffer = True
+
+def _tesserocr_set_image(api, pix):
+    global _set_image_takes_buffer
+    if _set_image_takes_buffer:
+        try:
+            api.SetImageBytes(_pixmap_samples(pix), pix.width, pix.height, 1, pix.stride)
+            return
+        except TypeError:
+            _set_image_takes_buffer = False
+    api.SetImageBytes(pix.samples, pix.width, pix.height, 1, pix.stride)
+
+def _tesseract_image_text(pix, languages=OCR_LANGUAGES):
+    """OCR a grayscale pixmap with Tesseract (default: Tamil + English)
+
+    The pixmap's resolution (pix.xres) is passed on as the source dpi.
+    """
+    engine = get_ocr_engine("tesseract")
+    if engine["backend"] == "tesserocr":
+        # Feed the raw 8-bit samples straight to a resident API handle
+        with tesseract_api(engine, languages) as api:
+            _tesserocr_set_image(api, pix)
+            api.SetSourceResolution(pix.xres)
+            text = api.GetUTF8Text()
+    else:
+        text = pytesseract.image_to_string(pixmap_to_pil(pix), lang=languages)
+    return text.strip() if text else ""
+
+def _ocr_page_tesseract(page, languages=None):
+    """OCR a single PyMuPDF page with Tesseract (Tamil + English)
+
+    languages defaults to page_ocr_languages(page). Returns (text, meta)
+    where meta describes how the page was rendered.
+    """
+    if languages is None:
+        languages = page_ocr_languages(page)
+    pix, meta = _render_for_ocr(page, "tesseract-ocr")
+    meta["languages"] = languages
+    return _tesseract_image_text(pix, languages), meta
+
+# ---------------------------------------------------------------------------
+# Progressive EasyOCR
+#
+# EasyOCR scores every text box. In progressive mode a page is first read at
+# a fraction of its chosen zoom; only boxes scoring below
+# OCR_REFINE_CONFIDENCE are clipped and read again at the full zoom, and the
+# better reading of each box is kept. Clean pages finish on the cheap pass.
+# Each page reports the confidence of every line it returns.
+#
+#   OCR_PROGRESSIVE        "false" reads every page once at full zoom (default: true)
+#   OCR_PROGRESSIVE_SCALE  zoom of the first pass relative to the chosen zoom (default: 0.5)
+#   OCR_REFINE_CONFIDENCE  boxes below this are re-read at full zoom (default: 0.6)
+# ---------------------------------------------------------------------------
+
+OCR_PROGRESSIVE = os.environ.get("OCR_PROGRESSIVE", "true").lower() != "false"
+OCR_PROGRESSIVE_SCALE = float(os.environ.get("OCR_PROGRESSIVE_SCALE", "0.5"))
+OCR_REFINE_CONFIDENCE = float(os.environ.get("OCR_REFINE_CONFIDENCE", "0.6"))
+
+# Boxes still below this after refinement are dropped
+EASYOCR_MIN_CONFIDENCE = 0.3
+
+# Padding around a box that is re-read, in points
+REFINE_CLIP_PADDING = 2
+
+def _easyocr_text(results):
+    """Join EasyOCR (bbox, text, confidence) results, dropping low confidence"""
+    return '\n'.join(text for (bbox, text, confidence) in results if confidence > EASYOCR_MIN_CONFIDENCE)
+
+def _easyocr_meta(meta, batched_pages):
+    return dict(meta, batch_size=EASYOCR_BATCH_SIZE, batched_pages=batched_pages, torch_threads=torch_threads())
+
+def _easyocr_image_text(pix, languages=OCR_LANGUAGES):
+    """OCR a grayscale pixmap with EasyOCR"""
+    reader = easyocr_reader(get_ocr_engine("easyocr"), languages)
+    # EasyOCR accepts a 2-D grayscale array directly; text regions are
+    # recognized EASYOCR_BATCH_SIZE at a time
+    results = reader.readtext(pixmap_to_array(pix), batch_size=EASYOCR_BATCH_SIZE)
+    return _easyocr_text(results)
+
+def _easyocr_zooms(page):
+    """(first pass zoom, full zoom) for reading a page with EasyOCR"""
+    zoom = choose_render_zoom(page, "easyocr")
+    if not OCR_PROGRESSIVE:
+        return zoom, zoom
+    first = math.floor(zoom * OCR_PROGRESSIVE_SCALE / OCR_ZOOM_STEP) * OCR_ZOOM_STEP
+    return max(OCR_ZOOM_STEP, min(first, zoom)), zoom
+
+def _refine_easyocr_page(reader, page, results, zoom, full_zoom):
+    """Re-read a page's low-confidence boxes at full_zoom
+
+    results come from a render at `zoom`. Returns (text, meta) with the kept
+    lines' confidences in meta["line_confidences"].
+    """
+    lines = []
+    refined = 0
+    matrix = fitz.Matrix(full_zoom, full_zoom)
+    x0, y0 = page.rect.x0, page.rect.y0
+    for bbox, text, confidence in results:
+        if full_zoom > zoom and confidence < OCR_REFINE_CONFIDENCE:
+            # Box corners are pixels of the first-pass render; map back to points
+            xs = [x0 + point[0] / zoom for point in bbox]
+            ys = [y0 + point[1] / zoom for point in bbox]
+            clip = fitz.Rect(
+                min(xs) - REFINE_CLIP_PADDING, min(ys) - REFINE_CLIP_PADDING,
+                max(xs) + REFINE_CLIP_PADDING, max(ys) + REFINE_CLIP_PADDING
+            ) & page.rect
+            if not clip.is_empty:
+                pix = page.get_pixmap(matrix=matrix, clip=clip, colorspace=fitz.csGRAY, alpha=False)
+                crop = reader.readtext(pixmap_to_array(pix), batch_size=EASYOCR_BATCH_SIZE)
+                if crop:
+                    crop_confidence = sum(box[2] for box in crop) / len(crop)
+                    if crop_confidence > confidence:
+                        text = " ".join(box[1] for box in crop)
+                        confidence = crop_confidence
+                        refined += 1
+        if confidence > EASYOCR_MIN_CONFIDENCE:
+            lines.append((text, round(float(confidence), 3)))
     
+    meta = {"dpi": round(72 * zoom), "line_confidences": [confidence for text, confidence in lines]}
+    if OCR_PROGRESSIVE:
+        meta["refine_dpi"] = round(72 * full_zoom)
+        meta["refined_lines"] = refined
+    return '\n'.join(text for text, confidence in lines), meta
+
+def _ocr_page_easyocr(page, languages=None):
+    """OCR a single PyMuPDF page with EasyOCR
+
+    languages defaults to page_ocr_languages(page). Returns (text, meta)
+    where meta describes how the page was rendered and the confidence of
+    each returned line.
+    """
+    if languages is None:
+        languages = page_ocr_languages(page)
+    reader = easyocr_reader(get_ocr_engine("easyocr"), languages)
+    zoom, full_zoom = _easyocr_zooms(page)
+    pix = render_page_gray(page, zoom)
+    results = reader.readtext(pixmap_to_array(pix), batch_size=EASYOCR_BATCH_SIZE)
+    text, meta = _refine_easyocr_page(reader, page, results, zoom, full_zoom)
+    meta["languages"] = languages
+    return text, _easyocr_meta(meta, 1)
+
+def _ocr_pages_easyocr(pages, languages=None):
+    """OCR several PyMuPDF pages with EasyOCR, detecting text in shared batches
+
+    Pages rendered at the same size and OCR'd with the same languages go
+    through readtext_batched together, so the text detector runs once per
+    group; recognition still runs image by image (EASYOCR_BATCH_SIZE regions
+    at a time), as readtext_batched only batches detection. Low-confidence
+    boxes are then refined page by page. languages lists each page's
+    language set (default: page_ocr_languages). Returns a list of
+    (text, meta) in page order.
+    """
+    engine = get_ocr_engine("easyocr")
+    if languages is None:
+        languages = [page_ocr_languages(page) for page in pages]
+    rendered = []
+    for page, page_languages in zip(pages, languages):
+        zoom, full_zoom = _easyocr_zooms(page)
+        pix = render_page_gray(page, zoom)
+        # The array is a view of the pixmap's buffer; copy it to outlive the pixmap
+        rendered.append((pixmap_to_array(pix).copy(), page_languages, zoom, full_zoom))
+    
+    groups = {}
+    for index, (image, languages, zoom, full_zoom) in enumerate(rendered):
+        groups.setdefault((image.shape, languages), []).append(index)
+    
+    outputs = [None] * len(rendered)
+    for (shape, languages), indexes in groups.items():
+        reader = easyocr_reader(engine, languages)
+        images = [rendered[index][0] for index in indexes]
+        if len(images) > 1:
+            batch_results = reader.readtext_batched(images, batch_size=EASYOCR_BATCH_SIZE)
+        else:
+            batch_results = [reader.readtext(images[0], batch_size=EASYOCR_BATCH_SIZE)]
+        for index, results in zip(indexes, batch_results):
+            image, languages, zoom, full_zoom = rendered[index]
+            text, meta = _refine_easyocr_page(reader, pages[index], results, zoom, full_zoom)
+            meta["languages"] = languages
+            outputs[index] = (text, _easyocr_meta(meta, len(images)))
+    return outputs
+
+# Full-page OCR, as fn(page, languages=None) -> (text, meta)
+OCR_PAGE_FUNCTIONS = {
+    "tesseract-ocr": _ocr_page_tesseract,
+    "easyocr": _ocr_page_easyocr
+}
+
+# OCR of an already rendered pixmap, as fn(pix, languages) -> text; the
+# pixmap's resolution (set_dpi) is the dpi it was rendered at
+OCR_IMAGE_FUNCTIONS = {
+    "tesseract-ocr": _tesseract_image_text,
+    "easyocr": _easyocr_image_text
+}
+
+# Methods that can OCR several pages in one call, as fn(pages, languages=None)
+# -> [(text, meta)], and how many pages at once
+OCR_BATCH_FUNCTIONS = {
+    "easyocr": (_ocr_pages_easyocr, EASYOCR_PAGE_BATCH)
+}
+
+# ---------------------------------------------------------------------------
+# Embedded image OCR memo
+#
+# Scanned exam papers repeat the same images on every page (logos, watermark
+# banners, instruction blocks). Pages without a text layer are therefore OCR'd
+# image by image, and each image's text is memoized by xref within a document
+# and by a hash of its pixels across pages and documents. The pixel memo is an
+# LRU bounded per process.
+#
+#   OCR_IMAGE_MEMO       "false" OCRs image pages as whole renders (default: true)
+#   OCR_IMAGE_MEMO_SIZE  image texts kept in the pixel memo (default: 512)
+# ---------------------------------------------------------------------------
+
+OCR_IMAGE_MEMO = os.environ.get("OCR_IMAGE_MEMO", "true").lower() != "false"
+OCR_IMAGE_MEMO_SIZE = int(os.environ.get("OCR_IMAGE_MEMO_SIZE", "512"))
+
+# Images smaller than this (in pixels, either side) are bullets and rules
+IMAGE_MIN_OCR_PX = 32
+
+_image_memo = OrderedDict()
+_image_memo_counters = {"hits": 0, "misses": 0, "evictions": 0}
+_image_memo_lock = threading.Lock()
+
+def _image_memo_get(key):
+    with _image_memo_lock:
+        text = _image_memo.get(key)
+        if text is None:
+            _image_memo_counters["misses"] += 1
+            return None
+        _image_memo.move_to_end(key)
+        _image_memo_counters["hits"] += 1
+        return text
+
+def _image_memo_put(key, text):
+    with _image_memo_lock:
+        _image_memo[key] = text
+        _image_memo.move_to_end(key)
+        while len(_image_memo) > OCR_IMAGE_MEMO_SIZE:
+            _image_memo.popitem(last=False)
+            _image_memo_counters["evictions"] += 1
+
+def image_memo_stats():
+    """Hit/miss counters and size of this process's image OCR memo"""
+    with _image_memo_lock:
+        stats = dict(_image_memo_counters)
+        stats["entries"] = len(_image_memo)
+    stats["enabled"] = OCR_IMAGE_MEMO
+    stats["max_entries"] = OCR_IMAGE_MEMO_SIZE
+    return stats
+
+def _plain_image_placement(page, info):
+    """Whether an image is drawn upright, unmasked and whole on the page
+
+    Only then does the decoded image look like its area of the render.
+    """
+    a, b, c, d = info["transform"][:4]
+    if b or c or a <= 0 or d <= 0 or info.get("has-mask"):
+        return False
+    return page.rect.contains(fitz.Rect(info["bbox"]))
+
+def page_image_regions(page):
+    """Embedded images to OCR a page by, or None to OCR the full render
+
+    Only pages with no text layer and no vector drawings qualify, with every
+    image placed upright and unrotated, without soft masks, clipping or
+    neighbouring strips; anything else only shows correctly in the render.
+    Returns image info dicts in reading order.
+    """
+    if not OCR_IMAGE_MEMO or page.rotation or page.get_text("text").strip():
+        return None
+    infos = page.get_image_info(xrefs=True)
+    if not infos or not all(info.get("xref") and _plain_image_placement(page, info) for info in infos):
+        return None
+    rects = [fitz.Rect(info["bbox"]) for info in infos]
+    for item in page.get_drawings(extended=True):
+        # A clip around whole images is harmless; paths and cut-off images are not
+        if item.get("type") != "clip":
+            return None
+        scissor = fitz.Rect(item["scissor"])
+        if not all(scissor.contains(rect) for rect in rects):
+            return None
+    # Images touching each other are strips or tiles of one picture
+    for i, rect in enumerate(rects):
+        grown = rect + (-1, -1, 1, 1)
+        if any(grown.intersects(other) for other in rects[i + 1:]):
+            return None
+    images = [info for info in infos if min(info["width"], info["height"]) >= IMAGE_MIN_OCR_PX]
+    if not images:
+        return None
+    return sorted(images, key=lambda info: (round(info["bbox"][1]), info["bbox"][0]))
+
+def _image_pixmap(doc, xref):
+    """Decode an embedded image as a grayscale pixmap within OCR_MAX_PAGE_PIXELS"""
+    pix = fitz.Pixmap(doc, xref)
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    if pix.n != 1:
+        pix = fitz.Pixmap(fitz.csGRAY, pix)
+    shrink = 0
+    while pix.width * pix.height > OCR_MAX_PAGE_PIXELS * (4 ** shrink):
+        shrink += 1
+    if shrink:
+        pix.shrink(shrink)
+    return pix
+
+def ocr_page_images(page, images, method, xref_memo, languages=None):
+    """OCR a page by its embedded images, reusing memoized image texts
+
+    xref_memo maps (xref, languages) already OCR'd in this document to
+    their text; languages defaults to page_ocr_languages(page).
+    Returns (text, meta) with the page text in image reading order.
+    """
+    ocr_image = OCR_IMAGE_FUNCTIONS[method]
+    if languages is None:
+        languages = page_ocr_languages(page)
+    texts = []
+    hits = 0
+    dpi = None
+    for info in images:
+        xref = info["xref"]
+        text = xref_memo.get((xref, languages))
+        if text is None:
+            pix = _image_pixmap(page.parent, xref)
+            key = (method, languages, hashlib.sha256(_pixmap_samples(pix)).hexdigest())
+            text = _image_memo_get(key)
+            if text is None:
+                width = info["bbox"][2] - info["bbox"][0]
+                image_dpi = round(72 * pix.width / width) if width > 0 else 300
+                dpi = max(dpi or 0, image_dpi)
+                pix.set_dpi(image_dpi, image_dpi)
+                text = ocr_image(pix, languages)
+                _image_memo_put(key, text)
+            else:
+                hits += 1
+            xref_memo[(xref, languages)] = text
+        else:
+            hits += 1
+        if text:
+            texts.append(text)
+    meta = {"images": len(images), "image_memo_hits": hits, "languages": languages}
+    if dpi is not None:
+        meta["dpi"] = dpi
+    return '\n'.join(texts), meta
+
+# ---------------------------------------------------------------------------
+# Page-parallel OCR
+#
+# Pages are split into contiguous ranges and handed to a shared process pool.
+# Each worker opens the document itself, OCRs its range and keeps its OCR
+# engine loaded for later requests. The pool is created on first use and
+# sized to the machine (OCR_MAX_WORKERS, default: CPU count); OCR_WORKERS sets
+# the default parallelism per request (default 1, 0 = all cores).
+# ---------------------------------------------------------------------------
+
+OCR_MAX_WORKERS = int(os.environ.get("OCR_MAX_WORKERS", "0")) or (os.cpu_count() or 1)
+
+_ocr_pool = None
+_ocr_pool_lock = threading.Lock()
+
+def _reset_process_state():
+    """Recreate locks and helper threads that a forked child cannot inherit"""
+    global _engine_lock, _reaper_thread, _ocr_pool, _ocr_pool_lock, _cache_lock, _daemon_lock, _image_memo_lock
+    global _metrics_lock, _status_board
+    _engine_lock = threading.RLock()
+    # Only the server's extraction workers publish their state (init_extraction_worker)
+    _status_board = None
+    _metrics_lock = threading.Lock()
+    # Start from zero so drain_metrics never reports the parent's numbers again
+    drain_metrics()
+    _image_memo_lock = threading.Lock()
+    _ocr_pool_lock = threading.Lock()
+    _cache_lock = threading.Lock()
+    _daemon_lock = threading.Lock()
+    _reaper_thread = None
+    # The parent's pool object is meaningless here; create our own on demand
+    _ocr_pool = None
+    # tesserocr handles (and their pool lock) must not be shared across fork
+    if _engines.get("tesseract", {}).get("backend") == "tesserocr":
+        del _engines["tesseract"]
+    if _engines:
+        _start_reaper()
+
+def _init_ocr_worker():
+    """Initializer for OCR pool workers forked from the parent"""
+    _reset_process_state()
+    # One worker per core already; keep torch from oversubscribing the CPU
+    # unless EASYOCR_TORCH_THREADS asks for more
+    threads = EASYOCR_TORCH_THREADS if EASYOCR_TORCH_THREADS > 0 else 1
+    os.environ.setdefault("OMP_NUM_THREADS", str(threads))
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+
+# Shared dict (a multiprocessing Manager proxy) the server's extraction
+# workers publish their engine and image memo state to, keyed by pid
+_status_board = None
+
+def init_extraction_worker(status_board=None):
+    """Initializer for server processes that run whole extractions
+
+    Loads the OCR_PRELOAD engines once so they stay resident in the worker,
+    and publishes this worker's state to status_board when given.
+    """
+    global _status_board
+    _reset_process_state()
+    _status_board = status_board
+    preload_engines()
+    publish_worker_status()
+
+def publish_worker_status():
+    """Put this extraction worker's engine and image memo state on the board"""
+    if _status_board is None:
+        return
     try:
-        import fitz
-        doc = fitz.open(pdf_path)
-        text_parts = []
-        
-        for page_num in range(len(doc)):
+        _status_board[os.getpid()] = {"engines": engine_status(), "image_memo": image_memo_stats()}
+    except Exception as e:
+        print(f"Warning: could not publish worker status: {e}", file=sys.stderr)
+
+def finish_worker_task():
+    """End of a pool task: publish this worker's state, return its drained metrics"""
+    publish_worker_status()
+    return drain_metrics()
+
+def warmup_in_worker(names, barrier=None, timeout=None):
+    """warmup_engines in an extraction worker; returns (pid, engine status)
+
+    The server sends one task per worker, each waiting on a shared barrier
+    first, so no worker takes two while another is left cold. A worker
+    still busy after timeout seconds breaks the barrier and may be missed.
+    """
+    if barrier is not None:
+        try:
+            barrier.wait(timeout)
+        except threading.BrokenBarrierError:
+            pass
+    status = warmup_engines(names)
+    publish_worker_status()
+    return os.getpid(), status
+
+def _get_ocr_pool():
+    """Return the shared OCR process pool, or None where fork is unavailable"""
+    global _ocr_pool
+    from concurrent.futures import ProcessPoolExecutor
+    
+    # Workers resolve page functions from this module by name, which only
+    # works when the children are forked from an already-loaded parent
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            _ocr_pool = ProcessPoolExecutor(
+                max_workers=OCR_MAX_WORKERS,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_init_ocr_worker
+            )
+            atexit.register(_reset_ocr_pool)
+        return _ocr_pool
+
+def _reset_ocr_pool():
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is not None:
+            _ocr_pool.shutdown(wait=False, cancel_futures=True)
+            _ocr_pool = None
+
+def resolve_ocr_workers(ocr_workers=None):
+    """Resolve a requested OCR parallelism level to a worker count"""
+    if ocr_workers is None or ocr_workers == "":
+        ocr_workers = os.environ.get("OCR_WORKERS", "1")
+    if str(ocr_workers).lower() == "auto":
+        ocr_workers = 0
+    ocr_workers = int(ocr_workers)
+    if ocr_workers <= 0:
+        ocr_workers = OCR_MAX_WORKERS
+    return max(1, min(ocr_workers, OCR_MAX_WORKERS))
+
+# Engines in order of preference for Tamil, as (method, engine) pairs
+OCR_METHOD_ORDER = (("easyocr", "easyocr"), ("tesseract-ocr", "tesseract"))
+
+# Page ranges per worker: smaller ranges let results stream out sooner
+OCR_CHUNKS_PER_WORKER = 4
+
+def available_ocr_methods():
+    """OCR methods whose engine can be loaded, in order of preference"""
+    return [method for method, engine in OCR_METHOD_ORDER if get_ocr_engine(engine) is not None]
+
+def installed_ocr_methods():
+    """OCR methods whose engine is installed, without loading any"""
+    return [method for method, engine in OCR_METHOD_ORDER if is_engine_available(engine)]
+
+def _ocr_page_range(method, pdf_source, page_numbers, probe=None):
+    """Pool worker: OCR the given pages of a document it opens itself
+
+    probe carries the script read off earlier pages (new_script_probe) when
+    a document is OCR'd range by range in one process.
+    Returns a list of (text, seconds, meta) tuples in page_numbers order.
+    """
+    ocr_page = OCR_PAGE_FUNCTIONS[method]
+    ocr_batch, batch_pages = OCR_BATCH_FUNCTIONS.get(method, (None, 1))
+    doc = open_pdf(pdf_source)
+    try:
+        results = {}
+        xref_memo = {}
+        render_pages = []
+        if probe is None:
+            probe = new_script_probe()
+        for page_num in page_numbers:
             page = doc[page_num]
-            # Render page to image
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x zoom for better quality
-            img_data = pix.tobytes("png")
-            img = Image.open(BytesIO(img_data))
-            
-            # Run OCR with Tamil and English
-            text = pytesseract.image_to_string(img, lang='tam+eng')  # Tamil + English
-            if text:
-                text_parts.append(text.strip())
+            images = page_image_regions(page)
+            if images is None:
+                render_pages.append(page_num)
+                continue
+            languages, probing = probe_ocr_languages(page, probe)
+            started = time.perf_counter()
+            text, meta = ocr_page_images(page, images, method, xref_memo, languages)
+            results[page_num] = (text, time.perf_counter() - started, meta)
+            if probing:
+                record_script_probe(probe, text)
         
+        if ocr_batch is not None and batch_pages > 1:
+            for start in range(0, len(render_pages), batch_pages):
+                group = render_pages[start:start + batch_pages]
+                pages = [doc[page_num] for page_num in group]
+                choices = [probe_ocr_languages(page, probe) for page in pages]
+                started = time.perf_counter()
+                outputs = ocr_batch(pages, [languages for languages, probing in choices])
+                # Batched pages share their inference time evenly
+                seconds = (time.perf_counter() - started) / len(group)
+                for page_num, (text, meta), (languages, probing) in zip(group, outputs, choices):
+                    results[page_num] = (text, seconds, meta)
+                    if probing:
+                        record_script_probe(probe, text)
+        else:
+            for page_num in render_pages:
+                page = doc[page_num]
+                languages, probing = probe_ocr_languages(page, probe)
+                started = time.perf_counter()
+                text, meta = ocr_page(page, languages)
+                results[page_num] = (text, time.perf_counter() - started, meta)
+                if probing:
+                    record_script_probe(probe, text)
+        for text, seconds, meta in results.values():
+            observe_metric("pdf_ocr_seconds", seconds, engine=method, scope="page")
+        return [results[page_num] for page_num in page_numbers]
+    finally:
         doc.close()
-        full_text = '\n'.join(text_parts)
-        
-        return {
-            "success": True,
-            "text": full_text,
-            "pages": len(doc),
-            "method": "tesseract-ocr"
-        }
+
+def _ocr_page_range_worker(method, pdf_source, page_numbers):
+    """_ocr_page_range in a pool worker, with the metrics it recorded"""
+    return _ocr_page_range(method, pdf_source, page_numbers), drain_metrics()
+
+def _split_pages(page_numbers, parts):
+    """Split page_numbers into at most `parts` contiguous chunks"""
+    parts = max(1, min(parts, len(page_numbers)))
+    size, extra = divmod(len(page_numbers), parts)
+    chunks = []
+    start = 0
+    for index in range(parts):
+        stop = start + size + (1 if index < extra else 0)
+        chunks.append(page_numbers[start:stop])
+        start = stop
+    return chunks
+
+# In-memory PDFs are written here once for the pool workers to open by path;
+# /dev/shm keeps the copy in memory where it exists
+OCR_SPOOL_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+def _spool_for_workers(pdf_source):
+    """Path pool workers can open pdf_source from; returns (path, spooled)
+
+    In-memory PDFs are written to a temp file (which the caller removes) so
+    the bytes are not pickled into every chunk task.
+    """
+    if is_pdf_path(pdf_source):
+        return pdf_source, False
+    fd, path = tempfile.mkstemp(suffix=".pdf", prefix="pdf-ocr-", dir=OCR_SPOOL_DIR)
+    with os.fdopen(fd, "wb") as f:
+        f.write(pdf_bytes(pdf_source))
+    return path, True
+
+def effective_ocr_workers(workers, page_count):
+    """Number of processes that will actually OCR page_count pages"""
+    if workers > 1 and page_count > 1 and "fork" in multiprocessing.get_all_start_methods():
+        return min(workers, page_count)
+    return 1
+
+# Page OCR error on hosts without any OCR engine; unlike engine failures it
+# is not worth retrying, so such results are cached (see cache_put)
+NO_OCR_ENGINE_ERROR = "No OCR engine installed"
+
+def iter_ocr_pages(pdf_source, page_numbers, workers=1, methods=None):
+    """OCR the given pages, yielding one record per page in page_numbers order
+
+    Records are {"page_num", "method", "text", "seconds", "meta", "error"};
+    method is None if no engine could OCR the page, and meta holds per-page
+    OCR details such as the render dpi. With workers > 1 contiguous page
+    ranges are OCR'd in the shared process pool and yielded as soon as every
+    earlier range is done. A range that fails is retried sequentially with
+    the next engine in `methods` (default: every available engine).
+    """
+    page_numbers = list(page_numbers)
+    if methods is None:
+        methods = available_ocr_methods()
+    if not methods:
+        error = "No OCR engine available" if installed_ocr_methods() else NO_OCR_ENGINE_ERROR
+        for page_num in page_numbers:
+            yield {"page_num": page_num, "method": None, "text": "", "seconds": 0.0, "meta": {}, "error": error}
+        return
+    
+    futures = None
+    spool_path = None
+    if effective_ocr_workers(workers, len(page_numbers)) > 1:
+        pool = _get_ocr_pool()
+        chunks = _split_pages(page_numbers, workers * OCR_CHUNKS_PER_WORKER)
+        worker_source, spooled = _spool_for_workers(pdf_source)
+        if spooled:
+            spool_path = worker_source
+        futures = [pool.submit(_ocr_page_range_worker, methods[0], worker_source, chunk) for chunk in chunks]
+    else:
+        # One page at a time streams best, except for engines that can batch
+        # pages (EASYOCR_PAGE_BATCH): give them whole groups
+        batch_pages = OCR_BATCH_FUNCTIONS.get(methods[0], (None, 1))[1]
+        chunks = [page_numbers[start:start + batch_pages] for start in range(0, len(page_numbers), batch_pages)]
+    
+    probe = new_script_probe()
+    try:
+        for index, chunk in enumerate(chunks):
+            results, method, error = None, None, None
+            remaining = methods
+            if futures:
+                try:
+                    results, worker_metrics = futures[index].result()
+                    method = methods[0]
+                    merge_metrics(worker_metrics)
+                except Exception as e:
+                    from concurrent.futures.process import BrokenProcessPool
+                    count_metric("pdf_ocr_failures_total", engine=methods[0])
+                    error = str(e)
+                    remaining = methods[1:]
+                    if isinstance(e, BrokenProcessPool):
+                        # A worker died (usually out of memory): rebuild the pool
+                        # next time and finish this document sequentially
+                        print(f"Warning: OCR pool failed ({e}), continuing sequentially", file=sys.stderr)
+                        _reset_ocr_pool()
+                        futures = None
+                        remaining = methods
+            if results is None:
+                for candidate in remaining:
+                    try:
+                        results, method = _ocr_page_range(candidate, pdf_source, chunk, probe), candidate
+                        break
+                    except Exception as e:
+                        count_metric("pdf_ocr_failures_total", engine=candidate)
+                        error = f"{candidate}: {str(e)}"
+                        print(f"Warning: {candidate} failed on pages {chunk[0] + 1}-{chunk[-1] + 1}: {e}", file=sys.stderr)
+            
+            if results is None:
+                for page_num in chunk:
+                    yield {"page_num": page_num, "method": None, "text": "", "seconds": 0.0, "meta": {}, "error": error}
+            else:
+                for page_num, (text, seconds, meta) in zip(chunk, results):
+                    yield {"page_num": page_num, "method": method, "text": text, "seconds": seconds, "meta": meta, "error": None}
+    finally:
+        # Consumer stopped early (e.g. a streaming client disconnected)
+        for future in futures or []:
+            future.cancel()
+        if spool_path is not None:
+            try:
+                os.unlink(spool_path)
+            except OSError:
+                pass
+
+def ocr_pages(method, pdf_source, page_numbers, workers=1):
+    """OCR the given pages with one specific method
+
+    Returns (page_texts, workers_used) with page_texts in page_numbers order.
+    Raises RuntimeError if the method fails.
+    """
+    page_numbers = list(page_numbers)
+    page_texts = []
+    for record in iter_ocr_pages(pdf_source, page_numbers, workers, methods=[method]):
+        if record["method"] is None:
+            raise RuntimeError(record["error"] or f"{method} failed")
+        page_texts.append(record["text"])
+    return page_texts, effective_ocr_workers(workers, len(page_numbers))
+
+def _extract_text_with_ocr(method, pdf_source, ocr_workers=None):
+    """Shared driver for the OCR extractors"""
+    doc = open_pdf(pdf_source)
+    page_count = len(doc)
+    doc.close()
+    check_page_limit(page_count)
+    
+    page_texts, workers_used = ocr_pages(method, pdf_source, range(page_count), resolve_ocr_workers(ocr_workers))
+    full_text = '\n'.join(text for text in page_texts if text)
+    
+    return {
+        "success": True,
+        "text": full_text,
+        "pages": page_count,
+        "method": method,
+        "ocr_workers": workers_used
+    }
+
+def extract_text_with_ocr_tesseract(pdf_source, ocr_workers=None):
+    """Extract text using Tesseract OCR with Tamil support"""
+    if get_ocr_engine("tesseract") is None:
+        return {"success": False, "error": "Tesseract not available", "text": ""}
+    
+    try:
+        return _extract_text_with_ocr("tesseract-ocr", pdf_source, ocr_workers)
+    except ExtractionLimitExceeded as e:
+        return limit_error(e)
     except Exception as e:
         return {
             "success": False,
@@ -137,43 +1518,15 @@ def extract_text_with_ocr_tesseract(pdf_path):
             "text": ""
         }
 
-def extract_text_with_ocr_easyocr(pdf_path):
+def extract_text_with_ocr_easyocr(pdf_source, ocr_workers=None):
     """Extract text using EasyOCR with Tamil support"""
-    if not EASYOCR_AVAILABLE or easyocr_reader is None:
+    if get_ocr_engine("easyocr") is None:
         return {"success": False, "error": "EasyOCR not available", "text": ""}
     
     try:
-        import fitz
-        doc = fitz.open(pdf_path)
-        text_parts = []
-        
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            # Render page to image
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x zoom for better quality
-            img_data = pix.tobytes("png")
-            
-            # Run EasyOCR
-            results = easyocr_reader.readtext(img_data)
-            
-            # Combine all detected text
-            page_text = []
-            for (bbox, text, confidence) in results:
-                if confidence > 0.3:  # Filter low confidence
-                    page_text.append(text)
-            
-            if page_text:
-                text_parts.append('\n'.join(page_text))
-        
-        doc.close()
-        full_text = '\n'.join(text_parts)
-        
-        return {
-            "success": True,
-            "text": full_text,
-            "pages": len(doc),
-            "method": "easyocr"
-        }
+        return _extract_text_with_ocr("easyocr", pdf_source, ocr_workers)
+    except ExtractionLimitExceeded as e:
+        return limit_error(e)
     except Exception as e:
         return {
             "success": False,
@@ -183,128 +1536,1483 @@ def extract_text_with_ocr_easyocr(pdf_path):
 
 def has_tamil_text(text):
     """Check if text contains Tamil characters"""
-    if not text:
-        return False
     # Tamil Unicode range: 0B80-0BFF
-    return any('\u0B80' <= char <= '\u0BFF' for char in text)
+    return script_histogram(text)["tam"] > 0
+
+# Uncommon characters that are often OCR mistakes or broken font mappings
+OCR_ERROR_GLYPHS = '஥஧஭஦஫஬ஶஷ'
+_OCR_ERROR_RE = re.compile(f"[{OCR_ERROR_GLYPHS}]")
 
 def has_ocr_errors(text):
     """Check if text likely has OCR errors (uncommon Tamil characters)"""
     if not text:
         return False
-    # Check for uncommon characters that are often OCR mistakes
-    uncommon_chars = ['஥', '஧', '஭', '஦', '஫', '஬', 'ஶ', 'ஷ']
-    return any(char in text for char in uncommon_chars)
+    return _OCR_ERROR_RE.search(text) is not None
+
+# ---------------------------------------------------------------------------
+# Text normalization
+#
+# The cleanup route/BatchUpload.js runs on every line (normalizeTamilText,
+# normalizeSuperscripts, normalizeMathSymbols, extractEnglishAndTamil) can be
+# done once here, per page, when a request asks for it with `normalize`.
+# Character fixes are str.translate tables and multi-character fixes are
+# single precompiled regexes with a lookup, so each page is scanned a fixed
+# number of times however many rules there are.
+#
+# Only fixes that are safe on already clean text are applied: Tamil code
+# points that are unassigned in Unicode (broken font mappings) and the known
+# misread words from utils/tamilOCRCorrection.js. Context guesses such as
+# "ச before a consonant is க" and question-parsing artifacts stay in Node.
+# ---------------------------------------------------------------------------
+
+# Invisible characters removed and exotic spaces turned into plain spaces
+_INVISIBLE_TABLE = {
+    **dict.fromkeys(range(0x2000, 0x2010), ' '),
+    **dict.fromkeys(range(0x2028, 0x2030), ' '),
+    **dict.fromkeys(range(0x2060, 0x2070), None),
+    0x200B: None, 0x200C: None, 0x200D: None, 0xFEFF: None, 0x00A0: ' '
+}
+
+# Unassigned Tamil code points produced by broken fonts, and what they stand for
+_TAMIL_GLYPH_TABLE = str.maketrans({
+    '஥': 'ந', '஧': 'ப', '஭': 'ல', '஬': 'ல', '஦': 'ழ', '஫': 'ற'
+})
+
+# Mathematical italic Greek letters from math fonts, as plain Greek
+_MATH_SYMBOL_TABLE = str.maketrans({
+    '𝜎': 'σ', '𝜏': 'τ', '𝜀': 'ε', '𝛾': 'γ'
+})
+
+# Hangul syllables that math fonts with a broken mapping put in place of
+# Greek letters (normalizeMathSymbols). Only a lone syllable among other
+# text is taken for one; Korean words are runs of syllables.
+_GARBLED_GREEK = {'휀': 'ε', '훾': 'γ'}
+_GARBLED_GREEK_RE = re.compile(
+    "(?<![\uAC00-\uD7A3])([" + "".join(_GARBLED_GREEK) + "])(?![\uAC00-\uD7A3])"
+)
+
+_NORMALIZE_TABLE = {**_INVISIBLE_TABLE, **_TAMIL_GLYPH_TABLE, **_MATH_SYMBOL_TABLE}
+
+# Whole words OCR commonly gets wrong (utils/tamilOCRCorrection.js), matched
+# before the glyph table rewrites their broken characters
+TAMIL_WORD_CORRECTIONS = {
+    'சகானம்புத்தூர்': 'கோயம்புத்தூர்',
+    'ஈசபாடு': 'ஈரோடு',
+    'நற்றும்': 'மற்றும்',
+    'நண்ட஬ம்': 'நிலப்பகுதி',
+    'தமிழ்஥ாட்டின்': 'தமிழ்நாட்டின்',
+    '஧ள்஭த்தாக்கு': 'பள்ளத்தாக்கு',
+    'எ஦': 'என',
+    'அலமக்கப்஧டுகி஫து': 'அழைக்கப்படுகிறது',
+    'காபணம்': 'காரணம்',
+    'பின்யரும்': 'பின்வரும்',
+    'நாநி஬ம்': 'நிலப்பகுதி',
+    'சசாட்டா஥ாக்பூர்': 'சத்தீஸ்கர்',
+    'ததாழிற்சால஬': 'தொழிற்சாலை',
+    '஧குதியின்': 'பகுதியின்',
+    'கீழ்யபாதது': 'கீழ்ப்பட்டது',
+    'யலகப்஧டுத்தப்஧டும்': 'வளிமண்டலத்தில்',
+    'யளிநண்டலச': 'வளிமண்டல',
+    'சுமற்சி': 'சுழற்சி',
+    'பல்கயறு': 'வெவ்வேறு',
+    'அலவுகளிழால்': 'அளவுகளில்',
+    'காற்றுச்சுழிகலால்': 'காற்றுச்சுழல்களால்'
+}
+_TAMIL_WORD_RE = re.compile(
+    r"(?<![\w\u0B80-\u0BFF])("
+    + "|".join(sorted(map(re.escape, TAMIL_WORD_CORRECTIONS), key=len, reverse=True))
+    + r")(?![\w\u0B80-\u0BFF])"
+)
+
+# Virama typed before a vowel sign, and a consonant split from its vowel sign
+_VOWEL_ORDER_RE = re.compile('\u0BCD([\u0BBE-\u0BC2])')
+_SPLIT_VOWEL_SIGN_RE = re.compile('([\u0B95-\u0BB9])[ \t]+([\u0BBE-\u0BCD])')
+
+# x^2 .. x^6 as superscripts (normalizeSuperscripts)
+_SUPERSCRIPTS = {'2': '²', '3': '³', '4': '⁴', '5': '⁵', '6': '⁶'}
+_SUPERSCRIPT_RE = re.compile(r'(\w)\^([2-6])')
+
+_SPACES_RE = re.compile(r'[ \t\f\v]+')
+
+def normalize_text(text):
+    """Clean extracted text: invisible characters, broken Tamil glyphs and
+    misread words, vowel sign order, superscripts and math symbols
+
+    Line breaks are kept; runs of spaces collapse and lines are stripped.
+    """
+    if not text:
+        return ""
+    text = _TAMIL_WORD_RE.sub(lambda match: TAMIL_WORD_CORRECTIONS[match.group(1)], text)
+    text = text.translate(_NORMALIZE_TABLE)
+    text = _GARBLED_GREEK_RE.sub(lambda match: _GARBLED_GREEK[match.group(1)], text)
+    text = _VOWEL_ORDER_RE.sub('\\1\u0BCD', text)
+    text = _SPLIT_VOWEL_SIGN_RE.sub(r'\1\2', text)
+    text = _SUPERSCRIPT_RE.sub(lambda match: match.group(1) + _SUPERSCRIPTS[match.group(2)], text)
+    return '\n'.join(_SPACES_RE.sub(' ', line).strip() for line in text.split('\n'))
+
+# Runs of Tamil (with the spaces inside them) and of English text
+_SCRIPT_RUN_RE = re.compile(
+    r"(?P<tamil>[\u0B80-\u0BFF]+(?:\s+[\u0B80-\u0BFF]+)*)"
+    r"|(?P<english>[A-Za-z0-9(\[{'\"](?:[A-Za-z0-9\s(),.\-:;!?'\"\[\]{}]*[A-Za-z0-9)\]}.?!'\"])?)"
+)
+
+def split_tamil_english(line):
+    """Split a bilingual line into {"english", "tamil"} (extractEnglishAndTamil)"""
+    english = []
+    tamil = []
+    for match in _SCRIPT_RUN_RE.finditer(line):
+        if match.lastgroup == "tamil":
+            tamil.append(match.group())
+        else:
+            english.append(match.group())
+    return {
+        "english": _SPACES_RE.sub(' ', ' '.join(english)).strip(),
+        "tamil": _SPACES_RE.sub(' ', ' '.join(tamil)).strip()
+    }
+
+def normalize_page(text, split_languages=False):
+    """Normalized form of a page's text for the `normalize` option
+
+    Returns {"text"}, plus "lines" as [{"english", "tamil"}] per non-empty
+    line when split_languages is set.
+    """
+    normalized = {"text": normalize_text(text)}
+    if split_languages:
+        normalized["lines"] = [split_tamil_english(line) for line in normalized["text"].split('\n') if line]
+    return normalized
+
+def normalize_result(result, split_languages=False):
+    """Add "normalized_text" (and "normalized_lines") to a result or page record
+
+    Normalization runs after the cache, so cached results stay raw and one
+    entry serves both forms.
+    """
+    if not result.get("text"):
+        return result
+    started = time.perf_counter()
+    normalized = normalize_page(result["text"], split_languages)
+    result["normalized_text"] = normalized["text"]
+    if split_languages:
+        result["normalized_lines"] = normalized["lines"]
+    result["normalize_seconds"] = round(time.perf_counter() - started, 4)
+    return result
+
+# ---------------------------------------------------------------------------
+# Span-level OCR repair
+#
+# A garbled page is usually a good text layer with a few broken words. Rather
+# than OCR the whole page, the words with suspicious glyphs are located with
+# get_text("words"), each line's run of them is clipped and OCR'd on its own,
+# and the result is spliced back into the text layer.
+#
+#   OCR_SPAN_REPAIR          "false" OCRs garbled pages in full (default: true)
+#   OCR_REPAIR_MAX_FRACTION  share of suspicious words above which the whole
+#                            page is OCR'd instead (default: 0.3)
+# ---------------------------------------------------------------------------
+
+OCR_SPAN_REPAIR = os.environ.get("OCR_SPAN_REPAIR", "true").lower() != "false"
+OCR_REPAIR_MAX_FRACTION = float(os.environ.get("OCR_REPAIR_MAX_FRACTION", "0.3"))
+
+# Padding around a clipped span, in points
+REPAIR_CLIP_PADDING = 2
+
+def plan_span_repair(page):
+    """Find the spans of a page's text layer that need OCR
+
+    Returns (lines, spans), where lines holds each text line as a list of
+    (rect, word) in reading order and spans lists (line_index, first, last,
+    clip) runs of suspicious words. Returns None if the page has no words or
+    too many suspicious ones to repair piecemeal.
+    """
+    lines = []
+    line_index = {}
+    suspicious = 0
+    for x0, y0, x1, y1, word, block_no, line_no, word_no in page.get_text("words"):
+        key = (block_no, line_no)
+        if key not in line_index:
+            line_index[key] = len(lines)
+            lines.append([])
+        lines[line_index[key]].append((fitz.Rect(x0, y0, x1, y1), word))
+        if has_ocr_errors(word):
+            suspicious += 1
+    
+    word_count = sum(len(line) for line in lines)
+    if not suspicious or suspicious > word_count * OCR_REPAIR_MAX_FRACTION:
+        return None
+    
+    spans = []
+    for index, line in enumerate(lines):
+        flagged = [position for position, (rect, word) in enumerate(line) if has_ocr_errors(word)]
+        if not flagged:
+            continue
+        first, last = flagged[0], flagged[-1]
+        clip = fitz.Rect(line[first][0])
+        for rect, word in line[first + 1:last + 1]:
+            clip |= rect
+        clip = (clip + (-REPAIR_CLIP_PADDING, -REPAIR_CLIP_PADDING, REPAIR_CLIP_PADDING, REPAIR_CLIP_PADDING)) & page.rect
+        spans.append((index, first, last, clip))
+    return lines, spans
+
+def repair_page_spans(page, plan, method):
+    """OCR the planned spans of a page and splice them into its text layer
+
+    Returns (text, meta); meta records the render dpi and how many spans
+    were replaced. Spans where OCR finds nothing keep the text layer words.
+    """
+    lines, spans = plan
+    ocr_image = OCR_IMAGE_FUNCTIONS[method]
+    languages = page_ocr_languages(page)
+    zoom = choose_render_zoom(page, method)
+    matrix = fitz.Matrix(zoom, zoom)
+    repaired = 0
+    for index, first, last, clip in spans:
+        pix = page.get_pixmap(matrix=matrix, clip=clip, colorspace=fitz.csGRAY, alpha=False)
+        pix.set_dpi(round(72 * zoom), round(72 * zoom))
+        text = " ".join(ocr_image(pix, languages).split())
+        if text:
+            lines[index][first:last + 1] = [(clip, text)]
+            repaired += 1
+    
+    text = "".join(" ".join(word for rect, word in line) + "\n" for line in lines)
+    return text, {
+        "dpi": round(72 * zoom),
+        "languages": languages,
+        "repaired_spans": repaired,
+        "suspicious_spans": len(spans)
+    }
+
+# ---------------------------------------------------------------------------
+# Extraction result cache
+#
+# Results are stored in SQLite keyed by the SHA-256 of the PDF bytes plus the
+# options that affect the output, so re-uploads of the same paper skip
+# extraction entirely. Entries are zlib-compressed JSON; once the cache grows
+# past PDF_CACHE_MAX_BYTES the least recently used entries are evicted.
+#
+#   PDF_CACHE_ENABLED    "false" disables the cache (default: true)
+#   PDF_CACHE_DIR        directory for cache.sqlite3 (default: services/.pdf-cache)
+#   PDF_CACHE_MAX_BYTES  compressed size budget (default: 256 MB)
+# ---------------------------------------------------------------------------
+
+# Bump when extraction output changes so stale entries are not served
+CACHE_VERSION = 10
+
+PDF_CACHE_ENABLED = os.environ.get("PDF_CACHE_ENABLED", "true").lower() != "false"
+PDF_CACHE_DIR = os.environ.get("PDF_CACHE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".pdf-cache")
+PDF_CACHE_MAX_BYTES = int(os.environ.get("PDF_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+_cache_counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "errors": 0}
+_cache_lock = threading.Lock()
+_cache_ready = False
+
+def _cache_connect():
+    global _cache_ready
+    import sqlite3
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(PDF_CACHE_DIR, "cache.sqlite3"), timeout=10)
+    if not _cache_ready:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)")
+        conn.commit()
+        _cache_ready = True
+    return conn
+
+def sha256_source(pdf_source):
+    """SHA-256 hex digest of a PDF path (read in chunks) or in-memory PDF"""
+    if not is_pdf_path(pdf_source):
+        return hashlib.sha256(pdf_bytes(pdf_source)).hexdigest()
+    digest = hashlib.sha256()
+    with open(pdf_source, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def make_cache_key(digest, **options):
+    """Cache key for a PDF digest and the options that affect the result"""
+    return f"v{CACHE_VERSION}:{digest}:{json.dumps(options, sort_keys=True)}"
+
+def _count(counter, amount=1):
+    with _cache_lock:
+        _cache_counters[counter] += amount
+
+def cache_get(key):
+    """Return the cached result for key, or None"""
+    if not PDF_CACHE_ENABLED:
+        return None
+    try:
+        conn = _cache_connect()
+        try:
+            row = conn.execute("SELECT data FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                _count("misses")
+                return None
+            conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+        finally:
+            conn.close()
+        _count("hits")
+        return json.loads(zlib.decompress(row[0]).decode("utf-8"))
+    except Exception as e:
+        _count("errors")
+        print(f"Warning: PDF cache read failed: {e}", file=sys.stderr)
+        return None
 
-def extract_text_from_pdf(pdf_path, use_ocr=False):
+def cache_put(key, result):
+    """Store a successful result and evict LRU entries over the size budget
+
+    Results with pages whose OCR engine failed or could not load are not
+    stored, so they are retried next time; pages that failed only because
+    no engine is installed are what this host will always return, and the
+    key records the installed engines. Answer keys with unread questions
+    or pages are not stored either.
+    """
+    if not PDF_CACHE_ENABLED or not result.get("success"):
+        return
+    if any(detail.get("ocr_error") not in (None, NO_OCR_ENGINE_ERROR) for detail in result.get("page_details", [])):
+        return
+    if result.get("unread") or result.get("unread_pages"):
+        return
+    try:
+        data = zlib.compress(json.dumps(result, ensure_ascii=False).encode("utf-8"), 6)
+        if len(data) > PDF_CACHE_MAX_BYTES:
+            return
+        now = time.time()
+        conn = _cache_connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, data, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data), now, now)
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            evicted = 0
+            if total > PDF_CACHE_MAX_BYTES:
+                for old_key, size in conn.execute("SELECT key, size FROM results ORDER BY last_access").fetchall():
+                    if total <= PDF_CACHE_MAX_BYTES:
+                        break
+                    conn.execute("DELETE FROM results WHERE key = ?", (old_key,))
+                    total -= size
+                    evicted += 1
+            conn.commit()
+        finally:
+            conn.close()
+        _count("stores")
+        if evicted:
+            _count("evictions", evicted)
+    except Exception as e:
+        _count("errors")
+        print(f"Warning: PDF cache write failed: {e}", file=sys.stderr)
+
+def cache_stats():
+    """Hit/miss counters for this process plus the cache's current size"""
+    with _cache_lock:
+        stats = dict(_cache_counters)
+    stats["enabled"] = PDF_CACHE_ENABLED
+    stats["max_bytes"] = PDF_CACHE_MAX_BYTES
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+    if PDF_CACHE_ENABLED:
+        try:
+            conn = _cache_connect()
+            try:
+                entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+            finally:
+                conn.close()
+            stats["entries"] = entries
+            stats["bytes"] = size
+        except Exception as e:
+            stats["error"] = str(e)
+    return stats
+
+def cache_lookup(pdf_source, use_ocr=False):
+    """Look up extract_text_from_pdf's cached result for a PDF
+
+    Returns (key, result); key is None when the cache is disabled and result
+    is None on a miss. Store a fresh result with cache_put(key, result).
+    """
+    if not PDF_CACHE_ENABLED or (is_pdf_path(pdf_source) and not os.path.exists(pdf_source)):
+        return None, None
+    key = make_cache_key(sha256_source(pdf_source), use_ocr=bool(use_ocr))
+    cached = cache_get(key)
+    if cached is not None:
+        cached["cached"] = True
+    return key, cached
+
+def _cached_extraction(digest, extract, **options):
+    """Serve an extraction from the cache, or run extract() and store it"""
+    key = make_cache_key(digest, **options)
+    cached = cache_get(key)
+    if cached is not None:
+        cached["cached"] = True
+        return cached
+    result = extract()
+    cache_put(key, result)
+    return result
+
+# Pages with images and less text than this are treated as scanned pages
+IMAGE_PAGE_MIN_CHARS = 20
+
+def extract_text_layer_pages(pdf_source):
+    """Read the text layer of every page with PyMuPDF
+
+    Returns a list of {"text", "has_images", "seconds"} dicts, one per page.
+    """
+    doc = open_pdf(pdf_source)
+    try:
+        check_page_limit(len(doc))
+        pages = []
+        for page in doc:
+            started = time.perf_counter()
+            text = page.get_text("text")
+            has_images = bool(page.get_images(full=False))
+            seconds = time.perf_counter() - started
+            observe_metric("pdf_text_layer_seconds", seconds)
+            pages.append({"text": text, "has_images": has_images, "seconds": seconds})
+        return pages
+    finally:
+        doc.close()
+
+def get_page_count(pdf_source):
+    """Number of pages in a PDF, or None if it cannot be opened"""
+    try:
+        if not is_pdf_path(pdf_source):
+            pdf_source = pdf_bytes(pdf_source)
+        if PYMUPDF_AVAILABLE:
+            doc = open_pdf(pdf_source)
+            try:
+                return len(doc)
+            finally:
+                doc.close()
+        if PDFPLUMBER_AVAILABLE:
+            import pdfplumber
+            with pdfplumber.open(pdf_source if is_pdf_path(pdf_source) else BytesIO(pdf_bytes(pdf_source))) as pdf:
+                return len(pdf.pages)
+    except Exception:
+        pass
+    return None
+
+def classify_page(text, has_images):
+    """Decide whether a page's text layer can be used as-is
+
+    Returns "clean", or the reason the page needs OCR: "empty", "image"
+    (scanned page without a usable text layer) or "garbled" (Tamil glyphs
+    that are typical of a broken font encoding).
+    """
+    stripped = text.strip() if text else ""
+    if not stripped:
+        return "image" if has_images else "empty"
+    if has_ocr_errors(stripped):
+        return "garbled"
+    if has_images and len(stripped) < IMAGE_PAGE_MIN_CHARS:
+        return "image"
+    return "clean"
+
+def iter_extract_pages(pdf_source, use_ocr=False, ocr_workers=None):
+    """Extract a PDF page by page, yielding one record per page in order
+
+    The text layer is used for every page where it is usable; only pages that
+    are empty, image-only or garbled are OCR'd. Garbled pages with a few
+    broken words get just those spans OCR'd (see plan_span_repair). Records
+    are {"page", "method", "reason", "text", "chars", "seconds"}, plus
+    "ocr_error" for a page that needed OCR and could not get it.
+    Raises if the text layer cannot be read, or ExtractionLimitExceeded once
+    the document is over a per-request limit.
+    """
+    layer_pages = extract_text_layer_pages(pdf_source)
+    reasons = [
+        "forced" if use_ocr else classify_page(page["text"], page["has_images"])
+        for page in layer_pages
+    ]
+    
+    doc = None
+    repair_plans = {}
+    repair_method = None
+    if OCR_SPAN_REPAIR and "garbled" in reasons:
+        methods = available_ocr_methods()
+        if methods:
+            repair_method = methods[0]
+            doc = open_pdf(pdf_source)
+            for page_num, reason in enumerate(reasons):
+                if reason == "garbled":
+                    plan = plan_span_repair(doc[page_num])
+                    if plan is not None:
+                        repair_plans[page_num] = plan
+    
+    for reason in reasons:
+        if reason != "clean":
+            count_metric("pdf_ocr_fallbacks_total", reason=reason)
+    
+    ocr_page_numbers = [
+        page_num for page_num, reason in enumerate(reasons)
+        if reason != "clean" and page_num not in repair_plans
+    ]
+    ocr_records = iter_ocr_pages(pdf_source, ocr_page_numbers, resolve_ocr_workers(ocr_workers))
+    
+    text_bytes = 0
+    try:
+        for page_num, page in enumerate(layer_pages):
+            record = {
+                "page": page_num + 1,
+                "method": "pymupdf",
+                "reason": reasons[page_num],
+                "text": page["text"],
+                "seconds": page["seconds"]
+            }
+            if page_num in repair_plans:
+                started = time.perf_counter()
+                try:
+                    text, meta = repair_page_spans(doc[page_num], repair_plans[page_num], repair_method)
+                    if meta["repaired_spans"]:
+                        record["method"] = repair_method
+                        record["text"] = text
+                    record.update(meta)
+                except Exception as e:
+                    # Keep the text layer, as when full-page OCR fails
+                    count_metric("pdf_ocr_failures_total", engine=repair_method)
+                    print(f"Warning: span repair failed on page {page_num + 1}: {e}", file=sys.stderr)
+                    record["ocr_error"] = f"{repair_method}: {str(e)}"
+                repair_seconds = time.perf_counter() - started
+                observe_metric("pdf_ocr_seconds", repair_seconds, engine=repair_method, scope="spans")
+                record["seconds"] += repair_seconds
+            elif reasons[page_num] != "clean":
+                ocr = next(ocr_records)
+                record["seconds"] += ocr["seconds"]
+                # Keep the text layer if OCR failed or found nothing on a garbled page
+                if ocr["method"] and (ocr["text"] or not page["text"].strip()):
+                    record["method"] = ocr["method"]
+                    record["text"] = ocr["text"]
+                    record.update(ocr["meta"])
+                if ocr["error"]:
+                    # The page needed OCR and got none: say so in page_details
+                    record["ocr_error"] = ocr["error"]
+            record["chars"] = len(record["text"].strip()) if record["text"] else 0
+            record["seconds"] = round(record["seconds"], 4)
+            # The layer text is in the record now; don't hold it twice
+            page["text"] = None
+            if record["text"]:
+                text_bytes += len(record["text"].encode("utf-8"))
+                check_text_limit(text_bytes)
+            count_metric("pdf_pages_total", method=record["method"])
+            yield record
+    finally:
+        ocr_records.close()
+        if doc is not None:
+            doc.close()
+
+def summarize_pages(page_records, ocr_workers=None):
+    """Build the extract_text_from_pdf result from per-page records"""
+    page_details = []
+    methods = []
+    for record in page_records:
+        page_details.append({key: value for key, value in record.items() if key not in ("text", "type")})
+        if record["method"] not in methods:
+            methods.append(record["method"])
+    
+    ocr_page_count = sum(1 for detail in page_details if detail["method"] != "pymupdf")
+    result = {
+        "success": True,
+        "pages": len(page_details),
+        "method": "+".join(methods) if methods else "pymupdf",
+        "ocr_pages": ocr_page_count,
+        "page_details": page_details
+    }
+    if ocr_page_count:
+        result["ocr_workers"] = effective_ocr_workers(resolve_ocr_workers(ocr_workers), ocr_page_count)
+    ocr_failed_pages = sum(1 for detail in page_details if detail.get("ocr_error"))
+    if ocr_failed_pages:
+        result["ocr_failed_pages"] = ocr_failed_pages
+    return result
+
+def extract_text_from_pdf(pdf_source, use_ocr=False, ocr_workers=None, use_cache=True,
+                          normalize=False, split_languages=False):
     """Extract text from PDF using best available method
     
+    Pages are extracted one at a time (see iter_extract_pages) and merged in
+    order; `page_details` in the result records the method per page. Results
+    are cached by content hash, so a re-upload of the same PDF returns the
+    stored result with "cached": true.
+    
     Args:
-        pdf_path: Path to PDF file
+        pdf_source: Path to PDF file, or the PDF as bytes / a binary file object
         use_ocr: If True, use OCR even if text layer exists (for image-based PDFs)
+        ocr_workers: Processes to OCR pages with (None = OCR_WORKERS, 0 = all cores)
+        use_cache: If False, skip the result cache
+        normalize: Also return "normalized_text" (see normalize_text)
+        split_languages: With normalize, also return "normalized_lines" as
+            [{"english", "tamil"}] per line
+    """
+    result = _extract_cached(pdf_source, use_ocr, ocr_workers, use_cache)
+    count_extraction(result)
+    if normalize and result.get("success"):
+        normalize_result(result, split_languages)
+    return result
+
+def extract_text_in_worker(pdf_source, use_ocr=False, ocr_workers=None, use_cache=True, profile_id=None):
+    """extract_text_from_pdf for pool workers: returns (result, drained metrics)
+
+    With a profile_id the extraction is profiled instead (see extract_text_profiled).
     """
-    if not os.path.exists(pdf_path):
+    if profile_id:
+        return extract_text_profiled(pdf_source, use_ocr, profile_id), finish_worker_task()
+    return extract_text_from_pdf(pdf_source, use_ocr, ocr_workers, use_cache), finish_worker_task()
+
+def stream_records_in_worker(record_queue, pdf_source, **options):
+    """iter_extract_records for pool workers
+
+    Puts every record on record_queue, then None; returns the drained metrics.
+    """
+    try:
+        for record in iter_extract_records(pdf_source, **options):
+            record_queue.put(record)
+    finally:
+        record_queue.put(None)
+    return finish_worker_task()
+
+def count_extraction(result):
+    """Count a finished extraction in pdf_extractions_total"""
+    method = result.get("method", "unknown") if result.get("success") else "failed"
+    count_metric("pdf_extractions_total", method=method, cached=str(bool(result.get("cached"))).lower())
+
+def _extract_cached(pdf_source, use_ocr, ocr_workers, use_cache):
+    """extract_text_from_pdf without normalization"""
+    if is_pdf_path(pdf_source):
+        if not os.path.exists(pdf_source):
+            return {
+                "success": False,
+                "error": f"PDF file not found: {pdf_source}",
+                "text": ""
+            }
+    else:
+        # Read file objects once; everything below works on the bytes
+        pdf_source = pdf_bytes(pdf_source)
+    
+    if use_cache and PDF_CACHE_ENABLED:
+        return _cached_extraction(
+            sha256_source(pdf_source),
+            lambda: _extract_text_from_pdf(pdf_source, use_ocr, ocr_workers),
+            use_ocr=bool(use_ocr),
+            ocr_engines=installed_ocr_methods()
+        )
+    return _extract_text_from_pdf(pdf_source, use_ocr, ocr_workers)
+
+def _extract_text_from_pdf(pdf_source, use_ocr, ocr_workers):
+    """Uncached body of extract_text_from_pdf"""
+    if not PYMUPDF_AVAILABLE:
+        # OCR needs PyMuPDF to render pages, so this is text-layer only
+        if PDFPLUMBER_AVAILABLE:
+            return extract_text_with_pdfplumber(pdf_source)
         return {
             "success": False,
-            "error": f"PDF file not found: {pdf_path}",
+            "error": "No extraction method available. Install: pip install pymupdf pytesseract pillow easyocr",
             "text": ""
         }
     
-    # Step 1: Try text extraction first (fastest)
-    text_result = None
-    if PYMUPDF_AVAILABLE:
-        text_result = extract_text_with_pymupdf(pdf_path)
-    elif PDFPLUMBER_AVAILABLE:
-        text_result = extract_text_with_pdfplumber(pdf_path)
-    
-    # Step 2: Check if text extraction worked and has Tamil
-    if text_result and text_result.get("success"):
-        extracted_text = text_result.get("text", "")
-        
-        # If text has Tamil and doesn't seem to have OCR errors, use it
-        if has_tamil_text(extracted_text) and not has_ocr_errors(extracted_text):
-            return text_result
-        
-        # If text has Tamil but has OCR errors, or if use_ocr is True, try OCR
-        if (has_tamil_text(extracted_text) and has_ocr_errors(extracted_text)) or use_ocr:
-            # Try EasyOCR first (better for Tamil)
-            if EASYOCR_AVAILABLE:
-                ocr_result = extract_text_with_ocr_easyocr(pdf_path)
-                if ocr_result.get("success"):
-                    return ocr_result
-            
-            # Try Tesseract as fallback
-            if TESSERACT_AVAILABLE:
-                ocr_result = extract_text_with_ocr_tesseract(pdf_path)
-                if ocr_result.get("success"):
-                    return ocr_result
-        
-        # If no Tamil or no OCR errors, return text extraction result
-        return text_result
+    page_records = []
+    text_parts = []
+    try:
+        for record in iter_extract_pages(pdf_source, use_ocr=use_ocr, ocr_workers=ocr_workers):
+            # Keep the page text only once, in the parts that get joined
+            text = record.pop("text")
+            if text:
+                text_parts.append(text)
+            page_records.append(record)
+    except ExtractionLimitExceeded as e:
+        return limit_error(e)
+    except Exception as e:
+        layer_error = f"PyMuPDF error: {str(e)}"
+        # Unreadable text layer, try OCR on the whole document
+        for ocr_extract in (extract_text_with_ocr_easyocr, extract_text_with_ocr_tesseract):
+            ocr_result = ocr_extract(pdf_source, ocr_workers)
+            if ocr_result.get("success"):
+                return ocr_result
+        return {"success": False, "error": layer_error, "text": ""}
     
-    # Step 3: If text extraction failed or returned empty, try OCR
-    if EASYOCR_AVAILABLE:
-        ocr_result = extract_text_with_ocr_easyocr(pdf_path)
-        if ocr_result.get("success"):
-            return ocr_result
+    result = summarize_pages(page_records, ocr_workers)
+    result["text"] = '\n'.join(text_parts)
+    return result
+
+def iter_extract_records(pdf_source, use_ocr=False, ocr_workers=None, use_cache=True,
+                         normalize=False, split_languages=False):
+    """Streaming form of extract_text_from_pdf
+
+    Yields {"type": "page", ...} for each page as soon as it is ready, then a
+    {"type": "summary", ...} record without the full text. On a cache hit
+    only the summary is sent, and it carries the cached "text". Errors are
+    reported as {"type": "error", "error": ...}. With normalize, page records
+    (and a cached summary) carry "normalized_text" too.
+    """
+    if is_pdf_path(pdf_source):
+        if not os.path.exists(pdf_source):
+            yield {"type": "error", "error": f"PDF file not found: {pdf_source}"}
+            return
+    else:
+        pdf_source = pdf_bytes(pdf_source)
+    if not PYMUPDF_AVAILABLE:
+        yield {"type": "error", "error": "Streaming extraction requires PyMuPDF. Install: pip install pymupdf"}
+        return
     
-    if TESSERACT_AVAILABLE:
-        ocr_result = extract_text_with_ocr_tesseract(pdf_path)
-        if ocr_result.get("success"):
-            return ocr_result
+    cache_key = None
+    if use_cache and PDF_CACHE_ENABLED:
+        cache_key = make_cache_key(sha256_source(pdf_source), use_ocr=bool(use_ocr))
+        cached = cache_get(cache_key)
+        if cached is not None:
+            cached.update({"type": "summary", "cached": True})
+            count_extraction(cached)
+            if normalize:
+                normalize_result(cached, split_languages)
+            yield cached
+            return
     
-    # Step 4: Return text result if available (even if empty)
-    if text_result:
-        return text_result
+    started = time.perf_counter()
+    page_records = []
+    # Page texts are only kept when they have to be cached
+    text_parts = [] if cache_key else None
+    try:
+        for record in iter_extract_pages(pdf_source, use_ocr=use_ocr, ocr_workers=ocr_workers):
+            page_record = dict(record, type="page")
+            if normalize:
+                normalize_result(page_record, split_languages)
+            yield page_record
+            text = record.pop("text")
+            if text and text_parts is not None:
+                text_parts.append(text)
+            page_records.append(record)
+    except ExtractionLimitExceeded as e:
+        count_extraction({"success": False})
+        yield {"type": "error", "error": str(e), "limit_exceeded": True, "pages_completed": len(page_records)}
+        return
+    except Exception as e:
+        count_extraction({"success": False})
+        yield {"type": "error", "error": f"Extraction error: {str(e)}", "pages_completed": len(page_records)}
+        return
     
-    return {
-        "success": False,
-        "error": "No extraction method available. Install: pip install pymupdf pytesseract pillow easyocr",
-        "text": ""
-    }
+    summary = summarize_pages(page_records, ocr_workers)
+    count_extraction(summary)
+    if cache_key:
+        result = dict(summary, text='\n'.join(text_parts))
+        cache_put(cache_key, result)
+    summary.update({"type": "summary", "seconds": round(time.perf_counter() - started, 3)})
+    yield summary
+
+def extract_text_from_bytes(pdf_data, use_ocr=False, ocr_workers=None, use_cache=True,
+                            normalize=False, split_languages=False):
+    """Extract text from raw PDF bytes, entirely in memory"""
+    try:
+        return extract_text_from_pdf(pdf_data, use_ocr=use_ocr, ocr_workers=ocr_workers, use_cache=use_cache,
+                                     normalize=normalize, split_languages=split_languages)
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"PDF bytes error: {str(e)}",
+            "text": ""
+        }
 
-def extract_text_from_base64(pdf_base64):
+def extract_text_from_base64(pdf_base64, use_ocr=False):
     """Extract text from base64 encoded PDF"""
     try:
         # Decode base64 PDF
         pdf_data = base64.b64decode(pdf_base64)
-        
-        # Save to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-            tmp.write(pdf_data)
-            tmp_path = tmp.name
-        
-        # Extract text
-        result = extract_text_from_pdf(tmp_path)
-        
-        # Clean up
-        os.unlink(tmp_path)
-        
-        return result
     except Exception as e:
         return {
             "success": False,
             "error": f"Base64 decode error: {str(e)}",
             "text": ""
         }
+    return extract_text_from_bytes(pdf_data, use_ocr=use_ocr)
+
+# ---------------------------------------------------------------------------
+# Answer keys
+#
+# Answer PDFs only need to yield {question number: option}, so rather than
+# extracting (and OCRing) their full text they are read structurally, page by
+# page, cheapest source first:
+#
+#   highlight  options marked with a coloured fill or highlight annotation
+#              in an otherwise ordinary question paper
+#   text       text lines made up only of "<no> <option>" pairs
+#              ("1. A", "2) (B)", "3 - C", "4 Ans: D", several per line)
+#   table      rows or columns of question-number / option cells found by
+#              find_tables(); only run on pages with ruling lines
+#
+# OCR is used only for what cannot be read this way: table cells whose
+# option is empty or garbled, and pages with no text layer at all. Options
+# are A-E (E being "Answer not known" / the fifth assertion-reason choice).
+#
+#   ANSWER_KEY_OCR  "false" never OCRs, unread cells are just reported
+#                   (default: true)
+# ---------------------------------------------------------------------------
+
+ANSWER_KEY_OCR = os.environ.get("ANSWER_KEY_OCR", "true").lower() != "false"
+
+ANSWER_OPTIONS = "ABCDE"
+
+# Largest question number accepted, and how far a question paper's
+# numbering may jump (a smaller or far larger "12." is a list item)
+ANSWER_MAX_QUESTION = 500
+ANSWER_QUESTION_GAP = 10
+
+# Render zoom for OCRing a table cell, and the slack (in points) allowed
+# when matching a highlight to the option label it starts at
+ANSWER_CELL_ZOOM = 3
+ANSWER_LABEL_SLACK = 4
+
+_QUESTION_WORD_RE = re.compile(r"(?:Q\.?\s*)?(\d{1,3})[.)]", re.IGNORECASE)
+_OPTION_WORD_RE = re.compile(r"\(([A-E])\)", re.IGNORECASE)
+_QUESTION_CELL_RE = re.compile(r"(?:Q\.?\s*)?(\d{1,3})\s*[.):]?", re.IGNORECASE)
+_OPTION_CELL_RE = re.compile(r"\(?([A-E])\)?\s*[.)]?", re.IGNORECASE)
+_ANSWER_PAIR = r"(?:Q\.?\s*)?(\d{1,3})\s*[.):\-]?\s*(?:Ans(?:wer)?\s*[.:\-]?\s*)?\(?([A-E])\)?"
+_ANSWER_PAIR_RE = re.compile(_ANSWER_PAIR, re.IGNORECASE)
+_ANSWER_LINE_RE = re.compile(rf"(?:{_ANSWER_PAIR}\s*[,;|]?\s*)+", re.IGNORECASE)
+
+def _is_highlight_colour(colour):
+    """True for a saturated fill colour (white, black and greys are layout)"""
+    if not colour or len(colour) != 3:
+        return False
+    return max(colour) - min(colour) > 0.25
+
+def page_highlights(page):
+    """Rects of a page's coloured fills and highlight annotations"""
+    rects = [item["rect"] for item in page.get_drawings() if _is_highlight_colour(item.get("fill"))]
+    for annot in page.annots(types=[fitz.PDF_ANNOT_HIGHLIGHT]) or ():
+        vertices = annot.vertices or []
+        if vertices:
+            # One quad (4 points) per highlighted line
+            for index in range(0, len(vertices) - 3, 4):
+                rects.append(fitz.Quad(vertices[index:index + 4]).rect)
+        else:
+            rects.append(annot.rect)
+    return rects
+
+def _accept_question(number, current):
+    if not 0 < number <= ANSWER_MAX_QUESTION:
+        return False
+    return current is None or current < number <= current + ANSWER_QUESTION_GAP
+
+def answer_key_labels(page, current=None):
+    """Option labels of a question paper page, in reading order
+
+    Returns (labels, current): labels is a list of (rect, option, question)
+    with question the number of the question the label belongs to (None
+    before the first one), current the question in effect at the page end.
+    """
+    labels = []
+    lines = {}
+    for x0, y0, x1, y1, word, block_no, line_no, word_no in page.get_text("words"):
+        first = (block_no, line_no) not in lines
+        lines[(block_no, line_no)] = True
+        if first:
+            match = _QUESTION_WORD_RE.match(word)
+            if match and _accept_question(int(match.group(1)), current):
+                current = int(match.group(1))
+                continue
+        match = _OPTION_WORD_RE.match(word)
+        if match:
+            labels.append((fitz.Rect(x0, y0, x1, y1), match.group(1).upper(), current))
+    return labels, current
+
+def _highlighted_label(rect, labels):
+    """The option label a highlight rect marks, or None"""
+    middle = (rect.y0 + rect.y1) / 2
+    same_line = [label for label in labels if label[0].y0 <= middle <= label[0].y1 or rect.y0 <= (label[0].y0 + label[0].y1) / 2 <= rect.y1]
+    # The rightmost label starting at or before the highlight: the option
+    # whose label (or text) is covered
+    before = [label for label in same_line if label[0].x0 <= rect.x0 + ANSWER_LABEL_SLACK]
+    if before:
+        return max(before, key=lambda label: label[0].x0)
+    inside = [label for label in same_line if label[0].x0 < rect.x1]
+    if inside:
+        return min(inside, key=lambda label: label[0].x0)
+    if same_line:
+        return None
+    # A highlighted second (translation) line: the closest label above it
+    above = [label for label in labels if label[0].y1 <= rect.y0 + ANSWER_LABEL_SLACK and label[0].x0 <= rect.x1]
+    return max(above, key=lambda label: label[0].y1) if above else None
+
+def parse_answer_line(line):
+    """{question: option} for a text line made up only of answer pairs"""
+    line = line.strip()
+    if not line or not _ANSWER_LINE_RE.fullmatch(line):
+        return {}
+    return {int(number): option.upper() for number, option in _ANSWER_PAIR_RE.findall(line)}
+
+def _text_line_answers(text):
+    answers = {}
+    for line in text.splitlines():
+        answers.update(parse_answer_line(line))
+    return answers
+
+def _word_line_answers(page):
+    lines = {}
+    for x0, y0, x1, y1, word, block_no, line_no, word_no in page.get_text("words"):
+        lines.setdefault((block_no, line_no), []).append(word)
+    answers = {}
+    for words in lines.values():
+        answers.update(parse_answer_line(" ".join(words)))
+    return answers
+
+def _parse_option_cell(text):
+    match = _OPTION_CELL_RE.fullmatch((text or "").strip())
+    return match.group(1).upper() if match else None
+
+def _parse_question_cell(text):
+    match = _QUESTION_CELL_RE.fullmatch((text or "").strip())
+    if match and 0 < int(match.group(1)) <= ANSWER_MAX_QUESTION:
+        return int(match.group(1))
+    return None
+
+def _ocr_cell(page, rect, method):
+    """OCR one table cell; returns its text, or "" """
+    pix = page.get_pixmap(matrix=fitz.Matrix(ANSWER_CELL_ZOOM, ANSWER_CELL_ZOOM), clip=rect & page.rect,
+                          colorspace=fitz.csGRAY, alpha=False)
+    pix.set_dpi(round(72 * ANSWER_CELL_ZOOM), round(72 * ANSWER_CELL_ZOOM))
+    started = time.perf_counter()
+    try:
+        return OCR_IMAGE_FUNCTIONS[method](pix, "eng")
+    except Exception as e:
+        count_metric("pdf_ocr_failures_total", engine=method)
+        print(f"Warning: answer key cell OCR failed: {e}", file=sys.stderr)
+        return ""
+    finally:
+        observe_metric("pdf_ocr_seconds", time.perf_counter() - started, engine=method, scope="cell")
+
+def _table_answers(page, ocr_method):
+    """Answers from the page's tables; returns (answers, ocr_cells, unread)
+
+    Cells are paired question -> option along rows, or down columns when
+    the numbers run that way. Option cells that are empty or unreadable are
+    OCR'd with ocr_method (when given); those still unread are listed.
+    """
+    answers = {}
+    ocr_cells = 0
+    unread = []
+    for table in page.find_tables().tables:
+        texts = table.extract()
+        rects = [[fitz.Rect(cell) if cell else None for cell in row.cells] for row in table.rows]
+        for grid, boxes in ((texts, rects), (list(zip(*texts)), list(zip(*rects)))):
+            found = False
+            for row, row_boxes in zip(grid, boxes):
+                for index in range(len(row) - 1):
+                    number = _parse_question_cell(row[index])
+                    if number is None or _parse_question_cell(row[index + 1]) is not None:
+                        continue
+                    option = _parse_option_cell(row[index + 1])
+                    if option is None and ocr_method and row_boxes[index + 1] is not None:
+                        ocr_cells += 1
+                        option = _parse_option_cell(_ocr_cell(page, row_boxes[index + 1], ocr_method))
+                    if option is None:
+                        unread.append(number)
+                    else:
+                        answers[number] = option
+                    found = True
+            if found:
+                break
+    return answers, ocr_cells, unread
+
+def _has_ruling_lines(page):
+    """True if a page draws stroked lines or rects (candidate table grid)"""
+    return any(item.get("color") is not None and item["type"] in ("s", "fs") for item in page.get_drawings())
+
+def _ocr_page_answers(page, ocr_method):
+    """Answers read from an OCR'd page, or None if OCR failed"""
+    started = time.perf_counter()
+    try:
+        text, meta = OCR_PAGE_FUNCTIONS[ocr_method](page)
+    except Exception as e:
+        count_metric("pdf_ocr_failures_total", engine=ocr_method)
+        print(f"Warning: answer key page OCR failed: {e}", file=sys.stderr)
+        return None
+    observe_metric("pdf_ocr_seconds", time.perf_counter() - started, engine=ocr_method, scope="page")
+    return _text_line_answers(text)
+
+def extract_answer_key(pdf_source, use_cache=True):
+    """Read an answer PDF as a {question number: option} map
+
+    Returns {"success", "answers", "answer_count", "method", "pages",
+    "sources", ...}; "answers" is keyed by question number (as a string,
+    in question order). "unread" lists questions whose table cell could not
+    be read even with OCR and "unread_pages" pages without a text layer
+    that could not be OCR'd; "conflicts" lists questions marked twice.
+    Fails with "No answer key found" when nothing could be read. Keys with
+    anything unread are not cached.
+    """
+    if is_pdf_path(pdf_source):
+        if not os.path.exists(pdf_source):
+            return {"success": False, "error": f"PDF file not found: {pdf_source}", "answers": {}}
+    else:
+        pdf_source = pdf_bytes(pdf_source)
+    if not PYMUPDF_AVAILABLE:
+        return {"success": False, "error": "Answer keys need PyMuPDF", "answers": {}}
+    
+    if use_cache and PDF_CACHE_ENABLED:
+        return _cached_extraction(
+            sha256_source(pdf_source),
+            lambda: _extract_answer_key(pdf_source),
+            answer_key=True,
+            answer_key_ocr=ANSWER_KEY_OCR,
+            ocr_engines=installed_ocr_methods()
+        )
+    return _extract_answer_key(pdf_source)
+
+def _extract_answer_key(pdf_source):
+    """Uncached body of extract_answer_key"""
+    started = time.perf_counter()
+    answers = {}
+    sources = {"highlight": 0, "text": 0, "table": 0, "ocr": 0}
+    conflicts = []
+    unread = []
+    unread_pages = []
+    ocr_cells = 0
+    ocr_method = None
+    if ANSWER_KEY_OCR:
+        methods = available_ocr_methods()
+        ocr_method = methods[0] if methods else None
+    
+    def add(page_answers, source):
+        for number, option in page_answers.items():
+            if number in answers:
+                if answers[number] != option:
+                    conflicts.append({"question": number, "kept": answers[number], "ignored": option, "source": source})
+                continue
+            answers[number] = option
+            sources[source] += 1
+    
+    try:
+        doc = open_pdf(pdf_source)
+    except Exception as e:
+        return {"success": False, "error": f"PyMuPDF error: {str(e)}", "answers": {}}
+    try:
+        check_page_limit(len(doc))
+        current = None
+        for page_number, page in enumerate(doc, start=1):
+            labels, current = answer_key_labels(page, current)
+            marked = {}
+            for rect in page_highlights(page):
+                label = _highlighted_label(rect, labels)
+                if label is not None and label[2] is not None:
+                    # Several fills (label, text, second line) mark one option
+                    marked.setdefault(label[2], label[1])
+            if marked:
+                add(marked, "highlight")
+                continue
+            
+            if not page.get_text("text").strip():
+                page_answers = None
+                if page.get_images(full=False) and ocr_method:
+                    page_answers = _ocr_page_answers(page, ocr_method)
+                if page_answers is not None:
+                    add(page_answers, "ocr")
+                elif page.get_images(full=False):
+                    unread_pages.append(page_number)
+                continue
+            
+            add(_word_line_answers(page), "text")
+            if _has_ruling_lines(page):
+                table_answers, cells, table_unread = _table_answers(page, ocr_method)
+                ocr_cells += cells
+                add(table_answers, "table")
+                unread.extend(number for number in table_unread if number not in answers)
+        page_count = len(doc)
+    except ExtractionLimitExceeded as e:
+        return limit_error(e)
+    finally:
+        doc.close()
+    
+    seconds = time.perf_counter() - started
+    observe_metric("pdf_answer_key_seconds", seconds)
+    if not answers:
+        return {
+            "success": False,
+            "error": "No answer key found",
+            "answers": {},
+            "pages": page_count,
+            "unread": unread,
+            "unread_pages": unread_pages
+        }
+    return {
+        "success": True,
+        "answers": {str(number): answers[number] for number in sorted(answers)},
+        "answer_count": len(answers),
+        "method": max(sources, key=sources.get),
+        "sources": {source: count for source, count in sources.items() if count},
+        "pages": page_count,
+        "ocr_cells": ocr_cells,
+        "unread": sorted(set(unread)),
+        "unread_pages": unread_pages,
+        "conflicts": conflicts,
+        "seconds": round(seconds, 3)
+    }
+
+def extract_answer_key_in_worker(pdf_source, use_cache=True):
+    """extract_answer_key for pool workers: returns (result, drained metrics)"""
+    return extract_answer_key(pdf_source, use_cache), finish_worker_task()
+
+# ---------------------------------------------------------------------------
+# Profiling
+#
+# A single extraction can be run under cProfile to see where a slow paper
+# spends its time. Profiled runs skip the cache and OCR in this process
+# (no OCR pool), so the profile covers everything from extract_text_from_pdf
+# down to the OCR engines. Each one is stored as <id>.prof (pstats format,
+# for `python -m pstats` or snakeviz) next to <id>.json, which holds the
+# per-page trace and the most expensive functions. Nothing here runs unless
+# a profile is asked for.
+#
+#   PDF_PROFILE       profile CLI extractions (default: false)
+#   PDF_PROFILE_DIR   where profiles are kept (default: services/.pdf-profiles)
+#   PDF_PROFILE_KEEP  profiles kept before the oldest are deleted (default: 50)
+# ---------------------------------------------------------------------------
+
+PDF_PROFILE = os.environ.get("PDF_PROFILE", "false").lower() == "true"
+PDF_PROFILE_DIR = os.environ.get("PDF_PROFILE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".pdf-profiles")
+PDF_PROFILE_KEEP = int(os.environ.get("PDF_PROFILE_KEEP", "50"))
+
+# Functions listed in a profile's summary, by cumulative time
+PROFILE_TOP_FUNCTIONS = 40
+
+_PROFILE_ID_RE = re.compile(r"[0-9a-f]{32}")
+
+def new_profile_id():
+    return uuid.uuid4().hex
+
+def profile_path(profile_id, suffix=".json"):
+    """Path of a stored profile file, or None for a malformed id"""
+    if not _PROFILE_ID_RE.fullmatch(profile_id or ""):
+        return None
+    return os.path.join(PDF_PROFILE_DIR, profile_id + suffix)
+
+def extract_text_profiled(pdf_source, use_ocr=False, profile_id=None):
+    """Run extract_text_from_pdf under cProfile and store the profile
+
+    Returns the extraction result with "profile_id" set; the stored summary
+    is available from load_profile(profile_id).
+    """
+    import cProfile
+    profile_id = profile_id or new_profile_id()
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    profiler.enable()
+    try:
+        result = extract_text_from_pdf(pdf_source, use_ocr=use_ocr, ocr_workers=1, use_cache=False)
+    finally:
+        profiler.disable()
+    seconds = time.perf_counter() - started
+    try:
+        save_profile(profile_id, profiler, result, seconds)
+        result["profile_id"] = profile_id
+    except OSError as e:
+        print(f"Warning: could not store profile {profile_id}: {e}", file=sys.stderr)
+    return result
+
+def save_profile(profile_id, profiler, result, seconds):
+    import pstats
+    os.makedirs(PDF_PROFILE_DIR, exist_ok=True)
+    profiler.dump_stats(profile_path(profile_id, ".prof"))
+    
+    stats = pstats.Stats(profiler)
+    functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+    summary = {
+        "id": profile_id,
+        "created_at": time.time(),
+        "seconds": round(seconds, 4),
+        "success": result.get("success", False),
+        "method": result.get("method"),
+        "pages": result.get("pages"),
+        "error": result.get("error"),
+        # Per-page method, reason and timing, as in the result's page_details
+        "trace": result.get("page_details", []),
+        "top_functions": [
+            {
+                "function": f"{os.path.basename(filename)}:{line}({name})",
+                "calls": calls,
+                "total_seconds": round(total, 6),
+                "cumulative_seconds": round(cumulative, 6)
+            }
+            for (filename, line, name), (_, calls, total, cumulative, _) in functions[:PROFILE_TOP_FUNCTIONS]
+        ]
+    }
+    with open(profile_path(profile_id), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False)
+    prune_profiles()
+
+def prune_profiles():
+    """Delete all but the PDF_PROFILE_KEEP newest profiles"""
+    try:
+        summaries = [entry for entry in os.scandir(PDF_PROFILE_DIR) if entry.name.endswith(".json")]
+    except OSError:
+        return
+    summaries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in summaries[max(PDF_PROFILE_KEEP, 1):]:
+        profile_id = entry.name[:-len(".json")]
+        for suffix in (".json", ".prof"):
+            try:
+                os.remove(os.path.join(PDF_PROFILE_DIR, profile_id + suffix))
+            except OSError:
+                pass
+
+def load_profile(profile_id):
+    """Stored summary of a profile, or None if there is no such profile"""
+    path = profile_path(profile_id)
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+# ---------------------------------------------------------------------------
+# Daemon mode
+#
+# A long-lived worker keeps PyMuPDF and the OCR models resident so each upload
+# only pays for the extraction itself. Requests are JSON lines:
+#
+#   {"id": 1, "path": "/tmp/paper.pdf", "use_ocr": false, "ocr_workers": 4}
+#   {"id": 2, "length": 183422, "use_ocr": true}\n<183422 raw PDF bytes>
+#   {"id": 3, "cmd": "ping"}
+#   {"id": 4, "cmd": "warmup", "engines": "easyocr"}
+#   {"id": 5, "path": "/tmp/paper.pdf", "stream": true}
+#   {"id": 6, "path": "/tmp/paper.pdf", "normalize": true, "split_languages": true}
+#   {"id": 7, "cmd": "metrics"}
+#   {"id": 8, "path": "/tmp/paper.pdf", "profile": true}
+#   {"id": 9, "cmd": "profile", "profile_id": "<id from request 8>"}
+#   {"id": 10, "cmd": "answer_key", "path": "/tmp/answers.pdf"}
+#   {"cmd": "shutdown"}
+#
+# Every request gets exactly one JSON line back, tagged with the same id, as
+# soon as its extraction finishes. Streaming requests instead get one line
+# per page followed by a "summary" (or "error") line.
+# ---------------------------------------------------------------------------
+
+_daemon_lock = threading.Lock()
+
+def handle_daemon_request(request, pdf_data=None):
+    """Run a single daemon request and return the response dict"""
+    request_id = request.get("id")
+    cmd = request.get("cmd", "extract")
+    
+    if cmd == "ping":
+        response = {
+            "success": True,
+            "pymupdf_available": PYMUPDF_AVAILABLE,
+            "tesseract_available": TESSERACT_AVAILABLE,
+            "easyocr_available": EASYOCR_AVAILABLE,
+            "engines": engine_status(),
+            "cache": cache_stats(),
+            "image_memo": image_memo_stats()
+        }
+    elif cmd == "profile":
+        profile = load_profile(request.get("profile_id"))
+        if profile is None:
+            response = {"success": False, "error": "Profile not found"}
+        else:
+            response = {"success": True, "profile": profile}
+    elif cmd == "metrics":
+        response = {"success": True, "metrics": render_metrics()}
+    elif cmd == "warmup":
+        response = {"success": True, "engines": warmup_engines(parse_engine_names(request.get("engines", "all")))}
+    elif cmd == "answer_key":
+        use_cache = bool(request.get("use_cache", True))
+        with _daemon_lock:
+            if pdf_data is not None or request.get("path"):
+                response = extract_answer_key(pdf_data if pdf_data is not None else request["path"], use_cache=use_cache)
+            else:
+                response = {"success": False, "error": "Request needs 'path' or 'length'", "answers": {}}
+    elif cmd == "extract":
+        use_ocr = bool(request.get("use_ocr", False))
+        ocr_workers = request.get("ocr_workers")
+        use_cache = bool(request.get("use_cache", True))
+        normalize = bool(request.get("normalize", False))
+        split_languages = bool(request.get("split_languages", False))
+        with _daemon_lock:
+            if request.get("profile") and (pdf_data is not None or request.get("path")):
+                response = extract_text_profiled(pdf_data if pdf_data is not None else request["path"], use_ocr)
+                if normalize and response.get("success"):
+                    normalize_result(response, split_languages)
+            elif pdf_data is not None:
+                response = extract_text_from_bytes(pdf_data, use_ocr=use_ocr, ocr_workers=ocr_workers, use_cache=use_cache,
+                                                   normalize=normalize, split_languages=split_languages)
+            elif request.get("path"):
+                response = extract_text_from_pdf(request["path"], use_ocr=use_ocr, ocr_workers=ocr_workers, use_cache=use_cache,
+                                                 normalize=normalize, split_languages=split_languages)
+            else:
+                response = {"success": False, "error": "Request needs 'path' or 'length'", "text": ""}
+    else:
+        response = {"success": False, "error": f"Unknown command: {cmd}", "text": ""}
+    
+    response["id"] = request_id
+    return response
+
+def stream_daemon_request(request, pdf_data=None):
+    """Yield per-page records for a {"stream": true} extract request
+
+    Every record carries the request id; the last one has type "summary" or "error".
+    """
+    request_id = request.get("id")
+    use_ocr = bool(request.get("use_ocr", False))
+    ocr_workers = request.get("ocr_workers")
+    use_cache = bool(request.get("use_cache", True))
+    normalize = bool(request.get("normalize", False))
+    split_languages = bool(request.get("split_languages", False))
+    try:
+        with _daemon_lock:
+            pdf_source = pdf_data if pdf_data is not None else request.get("path")
+            if not pdf_source:
+                yield {"id": request_id, "type": "error", "error": "Request needs 'path' or 'length'"}
+                return
+            for record in iter_extract_records(pdf_source, use_ocr=use_ocr, ocr_workers=ocr_workers, use_cache=use_cache,
+                                               normalize=normalize, split_languages=split_languages):
+                record["id"] = request_id
+                yield record
+    except Exception as e:
+        yield {"id": request_id, "type": "error", "error": f"Daemon error: {str(e)}"}
+
+def serve_requests(rfile, wfile):
+    """Serve JSON-lines requests from a binary reader until EOF or shutdown
+
+    Returns True if a shutdown command was received.
+    """
+    while True:
+        line = rfile.readline()
+        if not line:
+            return False
+        line = line.strip()
+        if not line:
+            continue
+        
+        request = None
+        try:
+            request = json.loads(line.decode("utf-8"))
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+            length = request.get("length")
+            if length is not None and (isinstance(length, bool) or not isinstance(length, int) or length < 0):
+                raise ValueError("'length' must be a non-negative integer")
+        except ValueError as e:
+            # Answer the bad line and keep serving: other callers share this daemon
+            request_id = request.get("id") if isinstance(request, dict) else None
+            response = {"id": request_id, "success": False, "error": f"Invalid request: {str(e)}", "text": ""}
+            wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+            wfile.flush()
+            continue
+        
+        if request.get("cmd") == "shutdown":
+            return True
+        
+        pdf_data = None
+        if length is not None:
+            pdf_data = rfile.read(length)
+            if len(pdf_data) != length:
+                # Truncated payload: the stream is no longer in sync
+                return False
+        
+        if request.get("stream"):
+            for record in stream_daemon_request(request, pdf_data):
+                wfile.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+                wfile.flush()
+            continue
+        
+        try:
+            response = handle_daemon_request(request, pdf_data)
+        except Exception as e:
+            response = {"id": request.get("id"), "success": False, "error": f"Daemon error: {str(e)}", "text": ""}
+        
+        started = time.perf_counter()
+        payload = json.dumps(response, ensure_ascii=False).encode("utf-8")
+        observe_metric("pdf_json_serialize_seconds", time.perf_counter() - started)
+        wfile.write(payload + b"\n")
+        wfile.flush()
+
+def run_stdio_daemon():
+    """Serve requests on stdin/stdout"""
+    preload_engines()
+    out = sys.stdout.buffer
+    # Keep stray library output (model download progress etc.) off the protocol stream
+    sys.stdout = sys.stderr
+    serve_requests(sys.stdin.buffer, out)
+
+def run_socket_daemon(socket_path):
+    """Serve requests on a Unix domain socket, one thread per connection"""
+    import socketserver
+    
+    class RequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            if serve_requests(self.rfile, self.wfile):
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+    
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+    
+    preload_engines()
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    
+    with Server(socket_path, RequestHandler) as server:
+        print(f"PDF extractor listening on {socket_path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        finally:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+USAGE = (
+    "Usage: python pdf-extractor.py <pdf_path> [--ocr] [--workers N] [--no-cache] [--normalize] [--split-languages] [--metrics] "
+    "OR python pdf-extractor.py <pdf_path> --answer-key [--no-cache] "
+    "OR python pdf-extractor.py --stdin [--ocr] [--workers N] [--no-cache] < file.pdf "
+    "OR python pdf-extractor.py --daemon [--socket <path>]"
+)
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print(json.dumps({
-            "error": "Usage: python pdf-extractor.py <pdf_path> [--ocr] OR python pdf-extractor.py --base64 <base64_string> [--ocr]"
-        }))
-        sys.exit(1)
+    if len(sys.argv) < 2 or sys.argv[1] in ("-h", "--help"):
+        print(json.dumps({"error": USAGE}))
+        sys.exit(1 if len(sys.argv) < 2 else 0)
     
     use_ocr = "--ocr" in sys.argv
-    
-    if sys.argv[1] == "--base64":
-        if len(sys.argv) < 3:
-            print(json.dumps({"error": "Base64 string required"}))
+    use_cache = "--no-cache" not in sys.argv
+    split_languages = "--split-languages" in sys.argv
+    normalize = "--normalize" in sys.argv or split_languages
+    ocr_workers = None
+    if "--workers" in sys.argv:
+        workers_index = sys.argv.index("--workers") + 1
+        if workers_index >= len(sys.argv):
+            print(json.dumps({"error": "Worker count required (a number, or 'auto' for all cores)"}))
             sys.exit(1)
-        result = extract_text_from_base64(sys.argv[2])
+        ocr_workers = sys.argv[workers_index]
+    
+    if sys.argv[1] == "--daemon":
+        if "--socket" in sys.argv:
+            socket_index = sys.argv.index("--socket") + 1
+            if socket_index >= len(sys.argv):
+                print(json.dumps({"error": "Socket path required"}))
+                sys.exit(1)
+            run_socket_daemon(sys.argv[socket_index])
+        else:
+            run_stdio_daemon()
+        sys.exit(0)
+    
+    if "--answer-key" in sys.argv:
+        pdf_source = sys.stdin.buffer.read() if sys.argv[1] in ("--stdin", "-") else sys.argv[1]
+        result = extract_answer_key(pdf_source, use_cache=use_cache)
+    elif PDF_PROFILE:
+        pdf_source = sys.stdin.buffer.read() if sys.argv[1] in ("--stdin", "-") else sys.argv[1]
+        result = extract_text_profiled(pdf_source, use_ocr)
+        if normalize and result.get("success"):
+            normalize_result(result, split_languages)
+        if result.get("profile_id"):
+            print(f"Profile: {profile_path(result['profile_id'], '.prof')}", file=sys.stderr)
+    elif sys.argv[1] in ("--stdin", "-"):
+        # Raw PDF bytes on stdin (avoids argv size limits of the old --base64 mode)
+        result = extract_text_from_bytes(sys.stdin.buffer.read(), use_ocr=use_ocr, ocr_workers=ocr_workers, use_cache=use_cache,
+                                         normalize=normalize, split_languages=split_languages)
     else:
         pdf_path = sys.argv[1]
-        result = extract_text_from_pdf(pdf_path, use_ocr=use_ocr)
+        result = extract_text_from_pdf(pdf_path, use_ocr=use_ocr, ocr_workers=ocr_workers, use_cache=use_cache,
+                                       normalize=normalize, split_languages=split_languages)
     
-    print(json.dumps(result, ensure_ascii=False))
-
+    started = time.perf_counter()
+    output = json.dumps(result, ensure_ascii=False)
+    observe_metric("pdf_json_serialize_seconds", time.perf_counter() - started)
+    print(output)
+    if "--metrics" in sys.argv:
+        # Stats dump for one-off runs; stdout stays the JSON result
+        print(render_metrics(), file=sys.stderr, end="")
@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+PDF API Load Test
+Starts pdf-api.py on a local port, generates synthetic Tamil/English PDFs and
+drives /extract or /extract-batch at a fixed concurrency, reporting
+throughput, latency percentiles, error rate and server memory over time
+
+Everything runs on 127.0.0.1 with no network access. The synthetic papers are
+assembled from the sample papers in doc/ and upload/ (see make_pdf), so they
+carry real Tamil fonts and the same text-layer problems as real uploads.
+Every generated PDF is distinct, so the result cache does not hide the work,
+and every scanned page image differs in one pixel, so the workers' image OCR
+memo (keyed by pixel hash) does not either.
+
+Server settings (EXTRACT_PROCESSES, EXTRACT_QUEUE_DEPTH, OCR_WORKERS, ...)
+are taken from the environment, so different settings are compared by
+running the tool once per setting.
+
+Usage:
+  python3 services/pdf-loadtest.py [--pages 10] [--kinds text,garbled,image]
+      [--endpoint extract|batch|both] [--concurrency 1,2,4,8] [--requests 40]
+      [--use-cache] [--output report.json]
+"""
+
+import sys
+import json
+import os
+import time
+import math
+import random
+import socket
+import threading
+import statistics
+import subprocess
+import http.client
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+SERVICES_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(SERVICES_DIR)
+
+# Papers the synthetic pages are cut from
+SOURCE_PDFS = [
+    os.path.join(REPO_DIR, "doc", "CIVIL MODEL 4.7.25.pdf"),
+    os.path.join(REPO_DIR, "doc", "GS model 3.7.25.pdf"),
+    os.path.join(REPO_DIR, "upload", "temp.pdf")
+]
+
+# text: clean text layer, garbled: text layer with broken Tamil glyphs
+# (has_ocr_errors), image: scanned pages without a text layer
+PDF_KINDS = ("text", "garbled", "image")
+
+# Resolution of the page images in "image" PDFs
+IMAGE_DPI = 150
+
+SERVER_START_TIMEOUT = 120
+MEMORY_SAMPLE_SECONDS = 0.5
+
+def load_extractor():
+    """Import pdf-extractor.py (used to classify source pages)"""
+    spec = importlib.util.spec_from_file_location("pdf_extractor", os.path.join(SERVICES_DIR, "pdf-extractor.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["pdf_extractor"] = module
+    # PyMuPDF writes its import notice straight to fd 1; keep stdout for the report
+    sys.stdout.flush()
+    saved_stdout = os.dup(1)
+    os.dup2(2, 1)
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        os.dup2(saved_stdout, 1)
+        os.close(saved_stdout)
+    return module
+
+# ---------------------------------------------------------------------------
+# Synthetic PDFs
+# ---------------------------------------------------------------------------
+
+def source_pages():
+    """Sample pages grouped by kind: {"text": [(doc, page_num)], "garbled": [...]}
+    
+    Pages are classified the way iter_extract_pages does, so "garbled" pages
+    are exactly the ones the service would repair or OCR.
+    """
+    extractor = load_extractor()
+    import fitz
+    pages = {"text": [], "garbled": []}
+    for path in SOURCE_PDFS:
+        if not os.path.exists(path):
+            continue
+        doc = fitz.open(path)
+        for page_num, page in enumerate(extractor.extract_text_layer_pages(path)):
+            reason = extractor.classify_page(page["text"], page["has_images"])
+            if reason == "clean":
+                pages["text"].append((doc, page_num))
+            elif reason == "garbled":
+                pages["garbled"].append((doc, page_num))
+    # Scanned pages are renders of any sample page
+    pages["image"] = pages["text"] + pages["garbled"]
+    return pages
+
+def make_pdf(kind, page_count, sources, rng, image_cache):
+    """Build a synthetic paper of page_count pages; returns the PDF bytes
+    
+    Text and garbled pages are the sample pages placed as-is, keeping their
+    text layer and embedded Tamil fonts; image pages are grayscale renders
+    with no text layer. A random document id makes every PDF distinct, so
+    the result cache does not short-circuit the test, and each image page
+    gets one random pixel changed so the image OCR memo cannot either.
+    """
+    import fitz
+    pool = sources[kind]
+    if not pool:
+        raise RuntimeError(f"No sample pages for {kind} PDFs")
+    doc = fitz.open()
+    for _ in range(page_count):
+        src, page_num = rng.choice(pool)
+        rect = src[page_num].rect
+        page = doc.new_page(width=rect.width, height=rect.height)
+        if kind == "image":
+            key = (id(src), page_num)
+            if key not in image_cache:
+                zoom = IMAGE_DPI / 72
+                image_cache[key] = src[page_num].get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+            pix = fitz.Pixmap(image_cache[key], 0)
+            x, y = rng.randrange(pix.width), rng.randrange(pix.height)
+            pix.set_pixel(x, y, ((pix.pixel(x, y)[0] + rng.randrange(1, 256)) % 256,))
+            page.insert_image(page.rect, stream=pix.tobytes("png"))
+        else:
+            page.show_pdf_page(page.rect, src, page_num)
+    doc.set_metadata({"title": f"Synthetic {kind} paper", "subject": "%032x" % rng.getrandbits(128)})
+    data = doc.tobytes(garbage=1, deflate=True)
+    doc.close()
+    return data
+
+# ---------------------------------------------------------------------------
+# Server
+# ---------------------------------------------------------------------------
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(port):
+    """Start pdf-api.py on 127.0.0.1:port and wait until /health answers"""
+    env = dict(os.environ, HOST="127.0.0.1", PORT=str(port))
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(SERVICES_DIR, "pdf-api.py")],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + SERVER_START_TIMEOUT
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"pdf-api.py exited with status {proc.returncode}")
+        try:
+            status, _ = request(port, "GET", "/health")
+            if status == 200:
+                return proc
+        except OSError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("pdf-api.py did not start in time")
+
+def stop_server(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+def process_tree_rss_mb(pid):
+    """RSS of a process and all its descendants (Linux /proc), in MB
+    
+    Returns (rss_mb, process_count); the extraction and OCR pools are
+    child processes of the server, so they are included.
+    """
+    total_kb = 0
+    count = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+            count += 1
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return round(total_kb / 1024, 1), count
+
+def start_memory_sampler(pid):
+    """Sample the server's process-tree RSS every MEMORY_SAMPLE_SECONDS
+
+    Returns (samples, stop); samples fills with {"t", "rss_mb", "processes"}
+    until stop() is called.
+    """
+    samples = []
+    stopped = threading.Event()
+    started = time.perf_counter()
+    
+    def sample():
+        while not stopped.is_set():
+            rss_mb, processes = process_tree_rss_mb(pid)
+            samples.append({"t": round(time.perf_counter() - started, 2), "rss_mb": rss_mb, "processes": processes})
+            stopped.wait(MEMORY_SAMPLE_SECONDS)
+    
+    thread = threading.Thread(target=sample, name="memory-sampler", daemon=True)
+    thread.start()
+    
+    def stop():
+        stopped.set()
+        thread.join()
+    
+    return samples, stop
+
+# ---------------------------------------------------------------------------
+# Client
+# ---------------------------------------------------------------------------
+
+def encode_multipart(fields, files):
+    """multipart/form-data body for {name: value} fields and [(name, filename, bytes)] files"""
+    boundary = "----pdf-loadtest-%032x" % random.getrandbits(128)
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode("utf-8")
+        )
+    for name, filename, data in files:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: application/pdf\r\n\r\n'.encode("utf-8") + data + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+_connections = threading.local()
+
+def request(port, method, path, body=None, content_type=None, timeout=600):
+    """Send one request over this thread's keep-alive connection; returns (status, body)"""
+    conn = getattr(_connections, "conn", None)
+    if conn is None:
+        conn = _connections.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    headers = {"Content-Type": content_type} if content_type else {}
+    try:
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        return response.status, response.read()
+    except (OSError, http.client.HTTPException):
+        # Reconnect on the next request
+        conn.close()
+        _connections.conn = None
+        raise
+
+def run_request(port, endpoint, pdfs, fields):
+    """One timed call; returns {"endpoint", "status", "seconds", "pages", "error"}"""
+    if endpoint == "batch":
+        files = [("question_pdf", "question.pdf", pdfs[0][1]), ("answer_pdf", "answer.pdf", pdfs[1][1])]
+        pages = pdfs[0][0] + pdfs[1][0]
+        path = "/extract-batch"
+    else:
+        files = [("file", "paper.pdf", pdfs[0][1])]
+        pages = pdfs[0][0]
+        path = "/extract"
+    body, content_type = encode_multipart(fields, files)
+    
+    started = time.perf_counter()
+    try:
+        status, payload = request(port, "POST", path, body, content_type)
+        error = None
+        if status != 200:
+            error = payload[:200].decode("utf-8", "replace")
+        elif endpoint == "batch":
+            failed = json.loads(payload).get("failed", 0)
+            if failed:
+                error = f"{failed} file(s) failed"
+    except Exception as e:
+        status, error = None, f"{e.__class__.__name__}: {e}"
+    return {
+        "endpoint": endpoint,
+        "status": status,
+        "seconds": time.perf_counter() - started,
+        "pages": pages,
+        "error": error
+    }
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = math.ceil(fraction * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+def run_level(port, pid, concurrency, total_requests, endpoints, corpus, fields):
+    """Run total_requests calls with `concurrency` in flight; returns the level report"""
+    calls = []
+    for index in range(total_requests):
+        endpoint = endpoints[index % len(endpoints)]
+        if endpoint == "batch":
+            pdfs = [corpus[(2 * index) % len(corpus)], corpus[(2 * index + 1) % len(corpus)]]
+        else:
+            pdfs = [corpus[index % len(corpus)]]
+        calls.append((endpoint, pdfs))
+    
+    memory, stop_sampler = start_memory_sampler(pid)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda call: run_request(port, call[0], call[1], fields), calls))
+    elapsed = time.perf_counter() - started
+    stop_sampler()
+    
+    latencies = sorted(result["seconds"] for result in results)
+    ok = [result for result in results if result["error"] is None]
+    errors = {}
+    for result in results:
+        if result["error"] is not None:
+            key = str(result["status"] or "connection")
+            errors[key] = errors.get(key, 0) + 1
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "succeeded": len(ok),
+        "error_rate": round(1 - len(ok) / len(results), 4) if results else 0.0,
+        "errors": errors,
+        "sample_errors": sorted({result["error"] for result in results if result["error"]})[:5],
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else 0.0,
+        "pages_per_second": round(sum(result["pages"] for result in ok) / elapsed, 2) if elapsed else 0.0,
+        "latency": {
+            "mean": round(statistics.mean(latencies), 4) if latencies else None,
+            "p50": round(percentile(latencies, 0.50), 4) if latencies else None,
+            "p95": round(percentile(latencies, 0.95), 4) if latencies else None,
+            "p99": round(percentile(latencies, 0.99), 4) if latencies else None,
+            "max": round(latencies[-1], 4) if latencies else None
+        },
+        "memory": {
+            "peak_rss_mb": max((sample["rss_mb"] for sample in memory), default=None),
+            "samples": memory
+        }
+    }
+
+def describe(level):
+    latency = level["latency"]
+    return (f"concurrency {level['concurrency']:>3}: {level['throughput_rps']:.2f} req/s, "
+            f"{level['pages_per_second']:.1f} pages/s, p50 {latency['p50']}s p95 {latency['p95']}s "
+            f"p99 {latency['p99']}s, errors {level['error_rate']:.1%}, peak RSS {level['memory']['peak_rss_mb']} MB")
+
+def option_value(name, default=None):
+    """Value following a --flag in sys.argv"""
+    if name not in sys.argv:
+        return default
+    index = sys.argv.index(name) + 1
+    if index >= len(sys.argv):
+        print(json.dumps({"error": f"Value required for {name}"}))
+        sys.exit(1)
+    return sys.argv[index]
+
+USAGE = (
+    "Usage: python pdf-loadtest.py [--pages N] [--kinds text,garbled,image] [--documents N] "
+    "[--endpoint extract|batch|both] [--concurrency 1,2,4] [--requests N] [--use-ocr] [--use-cache] "
+    "[--port N] [--seed N] [--output file]"
+)
+
+if __name__ == "__main__":
+    if "-h" in sys.argv or "--help" in sys.argv:
+        print(json.dumps({"error": USAGE}))
+        sys.exit(0)
+    
+    page_count = int(option_value("--pages", "10"))
+    kinds = option_value("--kinds", ",".join(PDF_KINDS)).split(",")
+    if any(kind not in PDF_KINDS for kind in kinds):
+        print(json.dumps({"error": f"--kinds must be a list of {', '.join(PDF_KINDS)}"}))
+        sys.exit(1)
+    endpoint = option_value("--endpoint", "extract")
+    if endpoint not in ("extract", "batch", "both"):
+        print(json.dumps({"error": "--endpoint must be extract, batch or both"}))
+        sys.exit(1)
+    endpoints = ["extract", "batch"] if endpoint == "both" else [endpoint]
+    levels = [int(value) for value in option_value("--concurrency", "1,2,4").split(",")]
+    total_requests = int(option_value("--requests", "20"))
+    # Distinct PDFs per kind; requests cycle through them
+    document_count = int(option_value("--documents", "4"))
+    rng = random.Random(int(option_value("--seed", "1")))
+    fields = {
+        "use_ocr": "true" if "--use-ocr" in sys.argv else "false",
+        # Every level must do the work, not replay the previous level's results
+        "use_cache": "true" if "--use-cache" in sys.argv else "false"
+    }
+    
+    print(f"Generating {document_count * len(kinds)} PDFs of {page_count} pages ({', '.join(kinds)})", file=sys.stderr)
+    sources = source_pages()
+    image_cache = {}
+    corpus = []
+    for index in range(document_count):
+        for kind in kinds:
+            corpus.append((page_count, make_pdf(kind, page_count, sources, rng, image_cache)))
+    rng.shuffle(corpus)
+    
+    port = int(option_value("--port", "0")) or free_port()
+    started = time.perf_counter()
+    server = start_server(port)
+    startup_seconds = round(time.perf_counter() - started, 2)
+    print(f"pdf-api.py ready on 127.0.0.1:{port} after {startup_seconds}s", file=sys.stderr)
+    
+    report = {
+        "pages_per_pdf": page_count,
+        "kinds": kinds,
+        "endpoints": endpoints,
+        "pdf_bytes": sum(len(data) for _, data in corpus),
+        "options": fields,
+        "server_startup_seconds": startup_seconds,
+        "server_env": {
+            key: os.environ[key] for key in sorted(os.environ)
+            if key.startswith(("EXTRACT_", "OCR_", "EASYOCR_", "JOB_", "PDF_", "TESSERACT_", "UPLOAD_"))
+        },
+        "levels": []
+    }
+    try:
+        for concurrency in levels:
+            level = run_level(port, server.pid, concurrency, total_requests, endpoints, corpus, fields)
+            report["levels"].append(level)
+            print(describe(level), file=sys.stderr)
+    finally:
+        stop_server(server)
+    
+    # The saturation point: the level after which throughput stops growing by 10%
+    best = None
+    for level in report["levels"]:
+        if best is None or level["throughput_rps"] > best["throughput_rps"] * 1.1:
+            best = level
+    if best is not None:
+        report["saturation_concurrency"] = best["concurrency"]
+        print(f"Throughput stops improving beyond concurrency {best['concurrency']}", file=sys.stderr)
+    
+    output = json.dumps(report, indent=2)
+    output_path = option_value("--output")
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
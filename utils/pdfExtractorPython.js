@@ -4,12 +4,11 @@
  * Falls back to Node.js pdf-parse if Python is unavailable
  */
 
-import { exec } from 'child_process';
+import { exec, spawn } from 'child_process';
 import { promisify } from 'util';
 import fs from 'fs/promises';
 import path from 'path';
 import { fileURLToPath } from 'url';
-import tmp from 'tmp';
 import pdfParse from 'pdf-parse/lib/pdf-parse.js';
 
 const execAsync = promisify(exec);
@@ -60,10 +59,182 @@ async function getPythonCommand() {
   }
 }
 
+// Long-lived `pdf-extractor.py --daemon` process shared by all uploads.
+// Keeps the Python interpreter, PyMuPDF and the OCR models loaded between requests.
+// Set PDF_EXTRACTOR_DAEMON=false to spawn a fresh process per upload instead.
+let extractorDaemon = null;
+
+function isDaemonEnabled() {
+  return (process.env.PDF_EXTRACTOR_DAEMON || 'true').toLowerCase() !== 'false';
+}
+
+// A daemon request that takes longer than this is treated as a hung daemon:
+// that request is rejected and the daemon is restarted. The daemon answers in
+// order, so the clock starts when a request reaches the head of the queue
+function getDaemonTimeoutMs() {
+  const timeout = parseInt(process.env.PDF_EXTRACTOR_TIMEOUT_MS || '600000', 10);
+  return Number.isFinite(timeout) && timeout > 0 ? timeout : 600000;
+}
+
+/**
+ * Get (or start) the persistent Python extractor process
+ */
+function getExtractorDaemon(pythonCmd, pythonScript) {
+  if (extractorDaemon && !extractorDaemon.closed) {
+    return extractorDaemon;
+  }
+
+  const child = spawn(pythonCmd, [pythonScript, '--daemon'], {
+    stdio: ['pipe', 'pipe', 'pipe']
+  });
+  const daemon = { child, pending: new Map(), nextId: 1, closed: false, buffer: '', pythonCmd, pythonScript };
+
+  const fail = (error) => {
+    if (daemon.closed) return;
+    daemon.closed = true;
+    for (const { reject, timer } of daemon.pending.values()) {
+      clearTimeout(timer);
+      reject(error);
+    }
+    daemon.pending.clear();
+    if (extractorDaemon === daemon) {
+      extractorDaemon = null;
+    }
+  };
+
+  child.stdout.setEncoding('utf8');
+  child.stdout.on('data', (chunk) => {
+    daemon.buffer += chunk;
+    let newline;
+    while ((newline = daemon.buffer.indexOf('\n')) !== -1) {
+      const line = daemon.buffer.slice(0, newline).trim();
+      daemon.buffer = daemon.buffer.slice(newline + 1);
+      if (!line) continue;
+
+      let message;
+      try {
+        message = JSON.parse(line);
+      } catch (parseError) {
+        console.warn('Python PDF extractor daemon sent invalid JSON:', line.slice(0, 200));
+        continue;
+      }
+
+      const entry = daemon.pending.get(message.id);
+      if (entry) {
+        daemon.pending.delete(message.id);
+        clearTimeout(entry.timer);
+        entry.resolve(message);
+        startHeadTimer(daemon);
+      }
+    }
+  });
+
+  child.stderr.on('data', (data) => {
+    const stderr = data.toString();
+    if (!stderr.includes('Warning')) {
+      console.warn('Python PDF extractor stderr:', stderr);
+    }
+  });
+
+  daemon.fail = fail;
+  child.on('error', fail);
+  child.stdin.on('error', fail);
+  child.on('exit', (code) => fail(new Error(`Python PDF extractor daemon exited with code ${code}`)));
+
+  extractorDaemon = daemon;
+  return daemon;
+}
+
+/**
+ * Time the request at the head of the daemon's queue, if it isn't already
+ */
+function startHeadTimer(daemon) {
+  const head = daemon.pending.values().next().value;
+  if (!head || head.timer) return;
+  const timeoutMs = getDaemonTimeoutMs();
+  head.timer = setTimeout(() => restartHungDaemon(daemon, head, timeoutMs), timeoutMs);
+}
+
+/**
+ * Reject the request the daemon is stuck on and move the rest of its queue to a fresh daemon
+ */
+function restartHungDaemon(daemon, head, timeoutMs) {
+  const queued = [...daemon.pending.values()].filter((entry) => entry !== head);
+  daemon.pending.clear();
+  daemon.fail(new Error('Python PDF extractor daemon restarted'));
+  daemon.child.kill('SIGKILL');
+  head.reject(new Error(`Python PDF extractor daemon did not answer within ${timeoutMs} ms`));
+
+  for (const entry of queued) {
+    entry.timer = null;
+    sendToDaemon(getExtractorDaemon(daemon.pythonCmd, daemon.pythonScript), entry);
+  }
+}
+
+/**
+ * Queue one request on the daemon: a JSON header line followed by the raw PDF bytes
+ */
+function sendToDaemon(daemon, entry) {
+  const id = daemon.nextId++;
+  daemon.pending.set(id, entry);
+  startHeadTimer(daemon);
+
+  const header = JSON.stringify({
+    id,
+    length: entry.pdfBuffer.length,
+    use_ocr: Boolean(entry.options.useOcr),
+    ocr_workers: entry.options.ocrWorkers ?? null
+  });
+  daemon.child.stdin.write(header + '\n');
+  daemon.child.stdin.write(entry.pdfBuffer);
+}
+
+/**
+ * Send one PDF to the daemon and wait for its answer
+ */
+function requestFromDaemon(daemon, pdfBuffer, options = {}) {
+  return new Promise((resolve, reject) => {
+    sendToDaemon(daemon, { resolve, reject, pdfBuffer, options, timer: null });
+  });
+}
+
+/**
+ * Run a one-off extractor process, piping the PDF bytes over stdin
+ */
+function runExtractorOnce(pythonCmd, pythonScript, pdfBuffer, options = {}) {
+  return new Promise((resolve, reject) => {
+    const args = [pythonScript, '--stdin'];
+    if (options.useOcr) args.push('--ocr');
+    if (options.ocrWorkers != null) args.push('--workers', String(options.ocrWorkers));
+
+    const child = spawn(pythonCmd, args, { stdio: ['pipe', 'pipe', 'pipe'] });
+    let stdout = '';
+    let stderr = '';
+    child.stdout.setEncoding('utf8');
+    child.stdout.on('data', (data) => { stdout += data; });
+    child.stderr.on('data', (data) => { stderr += data.toString(); });
+    child.on('error', reject);
+    child.on('close', (code) => {
+      if (stderr && !stderr.includes('Warning')) {
+        console.warn('Python PDF extractor stderr:', stderr);
+      }
+      try {
+        resolve(JSON.parse(stdout));
+      } catch (parseError) {
+        reject(new Error(`Python PDF extractor exited with code ${code}: ${stderr || parseError.message}`));
+      }
+    });
+    child.stdin.on('error', reject);
+    child.stdin.end(pdfBuffer);
+  });
+}
+
 /**
  * Extract text from PDF using Python service
  * @param {Buffer} pdfBuffer - PDF file buffer
  * @param {Object} options - Extraction options
+ * @param {boolean} options.useOcr - Force OCR even if a text layer exists
+ * @param {number} options.ocrWorkers - Processes to OCR pages with (0 = all cores)
  * @returns {Promise<{success: boolean, text: string, method: string, error?: string}>}
  */
 export async function extractTextWithPython(pdfBuffer, options = {}) {
@@ -82,66 +253,43 @@ export async function extractTextWithPython(pdfBuffer, options = {}) {
       };
     }
     
-    // Save buffer to temporary file
-    const tmpFile = await new Promise((resolve, reject) => {
-      tmp.file({ prefix: 'pdf-extract-', postfix: '.pdf', keep: false }, (err, filePath, fd, cleanupCallback) => {
-        if (err) reject(err);
-        else resolve({ path: filePath, cleanup: cleanupCallback });
-      });
-    });
+    // Get Python command (python3 or python for Windows)
+    const pythonCmd = await getPythonCommand();
+    if (!pythonCmd) {
+      return {
+        success: false,
+        text: '',
+        method: 'none',
+        error: 'Python not found. Install Python 3.8+ and ensure it\'s in PATH'
+      };
+    }
     
-    try {
-      // Write PDF buffer to temp file
-      await fs.writeFile(tmpFile.path, pdfBuffer);
-      
-      // Get Python command (python3 or python for Windows)
-      const pythonCmd = await getPythonCommand();
-      if (!pythonCmd) {
-        return {
-          success: false,
-          text: '',
-          method: 'none',
-          error: 'Python not found. Install Python 3.8+ and ensure it\'s in PATH'
-        };
-      }
-      
-      // Call Python script
-      const { stdout, stderr } = await execAsync(`"${pythonCmd}" "${pythonScript}" "${tmpFile.path}"`);
-      
-      if (stderr && !stderr.includes('Warning')) {
-        console.warn('Python PDF extractor stderr:', stderr);
-      }
-      
-      const result = JSON.parse(stdout);
-      
-      if (result.success) {
-        return {
-          success: true,
-          text: result.text || '',
-          method: result.method || 'python',
-          pages: result.pages || 0
-        };
-      } else {
-        return {
-          success: false,
-          text: '',
-          method: 'python',
-          error: result.error || 'Python extraction failed'
-        };
-      }
-    } finally {
-      // Clean up temp file
+    let result;
+    if (isDaemonEnabled()) {
       try {
-        tmpFile.cleanup();
-      } catch (cleanupError) {
-        console.warn('Failed to cleanup temp file:', cleanupError);
-        // Try to delete manually if cleanup callback fails
-        try {
-          await fs.unlink(tmpFile.path);
-        } catch (unlinkError) {
-          // Ignore unlink errors
-        }
+        result = await requestFromDaemon(getExtractorDaemon(pythonCmd, pythonScript), pdfBuffer, options);
+      } catch (daemonError) {
+        console.warn('Python PDF extractor daemon failed, running one-off extraction:', daemonError.message);
+        result = await runExtractorOnce(pythonCmd, pythonScript, pdfBuffer, options);
       }
+    } else {
+      result = await runExtractorOnce(pythonCmd, pythonScript, pdfBuffer, options);
+    }
+    
+    if (result.success) {
+      return {
+        success: true,
+        text: result.text || '',
+        method: result.method || 'python',
+        pages: result.pages || 0
+      };
+    } else {
+      return {
+        success: false,
+        text: '',
+        method: 'python',
+        error: result.error || 'Python extraction failed'
+      };
     }
   } catch (error) {
     console.error('Python PDF extractor wrapper error:', error);